@@ -0,0 +1,145 @@
+# artifacts.py
+# 后端产物存储：测试日志归档、MemInfo 结果等统一存放，元数据索引在存储中 (见 Database.*_artifact)
+#   - 索引按 (server_id, test_type, run_id) 查询，每条记录指向一个内容块
+#   - 内容按 sha256 去重：ARTIFACT_DIR/blobs/<sha 前两位>/<sha>，相同内容只存一份，多条记录共用
+#     同一运行 (服务器 + 类型 + run_id) 已登记过相同内容时沿用原记录，不再新增 (如重复下载同一份 MemInfo 结果)
+#   - 写入时边写边算 sha256，先写 tmp/ 下的 .part 文件，提交后才落盘并登记索引 (传输中断不会留下残缺产物)
+#   - 保留策略：超过 ARTIFACT_MAX_AGE_DAYS 的记录删除；总大小超过 ARTIFACT_MAX_BYTES 时从最旧的开始删除
+import datetime
+import hashlib
+import os
+import time
+import uuid
+from typing import List
+from config import ARTIFACT_DIR, ARTIFACT_MAX_BYTES, ARTIFACT_MAX_AGE_DAYS
+from database import db
+from logger import logger
+
+BLOB_DIR = os.path.join(ARTIFACT_DIR, "blobs")
+TMP_DIR = os.path.join(ARTIFACT_DIR, "tmp")
+# 未被索引引用的内容块/临时文件超过该时长才回收 (避免误删其它 worker 正在提交的产物)
+ORPHAN_GRACE = 3600
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256)
+
+# --- 1. 写入 ---
+class ArtifactWriter:
+    def __init__(self, server_id: str, test_type: str, run_id: str, name: str):
+        self.meta = {
+            "artifact_id": uuid.uuid4().hex[:12], "server_id": server_id, "test_type": test_type,
+            "run_id": run_id, "name": name, "size": 0, "sha256": "",
+        }
+        os.makedirs(TMP_DIR, exist_ok=True)
+        self._tmp = os.path.join(TMP_DIR, f"{self.meta['artifact_id']}.part")
+        self._file = open(self._tmp, "wb")
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.meta["size"] += len(chunk)
+
+    def commit(self, **extra) -> dict:
+        self._file.close()
+        sha = self._hash.hexdigest()
+        path = blob_path(sha)
+        dedup = os.path.exists(path)
+        if dedup:
+            os.remove(self._tmp)
+            os.utime(path)  # 刷新 mtime，避免被孤儿回收误删
+            m = self.meta
+            for existing in db.list_artifacts(m["server_id"], m["test_type"], m["run_id"]):
+                if existing["sha256"] == sha: return existing
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp, path)
+        now = time.time()
+        self.meta.update(extra, sha256=sha, path=path, dedup=dedup, created_ts=now,
+                         created=datetime.datetime.fromtimestamp(now).strftime(TIME_FMT))
+        db.save_artifact(self.meta)
+        return self.meta
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if not self._file.closed: self.abort()
+
+# --- 2. 查询与删除 ---
+def query(server_id: str = "", test_type: str = "", run_id: str = "") -> List[dict]:
+    """按创建时间倒序 (走有序集合索引，见 Database.list_artifacts)"""
+    return db.list_artifacts(server_id, test_type, run_id)
+
+def _remove_blob_if_unused(sha256: str, referenced: set, grace: float = 0) -> int:
+    """grace: 最近被写入/去重引用过的内容块暂不删除 (可能刚被新记录引用)，留给孤儿回收"""
+    if sha256 in referenced: return 0
+    path = blob_path(sha256)
+    try:
+        if grace and time.time() - os.path.getmtime(path) < grace: return 0
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
+
+def delete(server_id: str, artifact_id: str) -> bool:
+    meta = db.get_artifact(server_id, artifact_id)
+    if not meta: return False
+    db.delete_artifact(meta)
+    _remove_blob_if_unused(meta["sha256"], {a["sha256"] for a in db.list_artifacts()})
+    return True
+
+# --- 3. 保留策略 (Leader 定时执行) ---
+def enforce_retention() -> dict:
+    index = db.list_artifacts()  # 新的在前
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=ARTIFACT_MAX_AGE_DAYS)).strftime(TIME_FMT)
+    keep = [a for a in index if not ARTIFACT_MAX_AGE_DAYS or a["created"] >= cutoff]
+    expired = index[len(keep):]  # 已按时间倒序，过期记录在末尾
+
+    # 按内容块计算真实占用 (去重后)，超限时从最旧的记录开始删除
+    refs = {}
+    for a in keep: refs[a["sha256"]] = refs.get(a["sha256"], 0) + 1
+    sizes = {a["sha256"]: a["size"] for a in keep}
+    total = sum(sizes.values())
+    while ARTIFACT_MAX_BYTES and total > ARTIFACT_MAX_BYTES and keep:
+        victim = keep.pop()
+        expired.append(victim)
+        refs[victim["sha256"]] -= 1
+        if not refs[victim["sha256"]]: total -= sizes[victim["sha256"]]
+
+    referenced = {a["sha256"] for a in keep}
+    freed = 0
+    for a in expired:
+        db.delete_artifact(a)
+        freed += _remove_blob_if_unused(a["sha256"], referenced, grace=ORPHAN_GRACE)
+    freed += _sweep_orphans({a["sha256"] for a in keep})
+    if expired or freed:
+        logger.info(f"[Artifacts] 保留策略: 删除 {len(expired)} 条记录，释放 {freed / 1048576:.1f} MiB，"
+                    f"剩余 {len(keep)} 条 / {total / 1048576:.1f} MiB")
+    return {"deleted": len(expired), "freed_bytes": freed, "remaining": len(keep), "total_bytes": total}
+
+def _sweep_orphans(referenced: set) -> int:
+    """回收未被索引引用的内容块与残留的 .part 文件"""
+    freed, now = 0, time.time()
+    for folder in (BLOB_DIR, TMP_DIR):
+        for root, _, files in os.walk(folder):
+            for name in files:
+                if name in referenced: continue
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) < ORPHAN_GRACE: continue
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    freed += size
+                except OSError:
+                    pass
+    return freed
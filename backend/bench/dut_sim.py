@@ -0,0 +1,78 @@
+# bench/dut_sim.py
+# 模拟机群：每台 DUT 按 monitor_daemon.sh 的节奏 (默认 30 秒) 向后端上报 Webhook
+# 在线 DUT 使用 127.0.0.0/8 回环地址 (ping 立即可达，SSH 落到本地桩)，
+# 离线 DUT 使用 TEST-NET-1 (192.0.2.0/24，不可路由，ping 超时)
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+REBOOT_PHASES = ["冷重启进行中 (Cold)", "热重启进行中 (Warm)", "压力重启进行中 (Stress)"]
+
+def dut_ip(index: int, online: bool = True) -> str:
+    if not online: return f"192.0.2.{index % 254 + 1}"
+    return f"127.{(index >> 16) & 255}.{(index >> 8) & 255}.{(index & 255) or 1}"
+
+def fleet_servers(count: int, offline_ratio: float = 0.0, prefix: str = "BENCH") -> list:
+    """生成 /servers/add 的请求体列表，前 offline_ratio 比例的机器离线"""
+    offline = int(count * offline_ratio)
+    servers = []
+    for i in range(count):
+        ip = dut_ip(i + 1, online=i >= offline)
+        servers.append({"server_id": f"{prefix}-{i:04d}", "bmc_ip": ip, "os_ip": ip, "description": "bench"})
+    return servers
+
+class DutFleet:
+    """
+    以最少线程模拟大量 DUT：一个调度线程按到期时间出队，上报交给线程池发送。
+    每台 DUT 的首次上报在一个周期内随机错开，避免同时打到后端。
+    """
+    def __init__(self, base_url: str, server_ids: list, interval: float = 30.0, workers: int = 32):
+        self.url = base_url.rstrip("/") + "/report/webhook"
+        self.server_ids = server_ids
+        self.interval = interval
+        self.loops = {sid: 0 for sid in server_ids}
+        self.sent = self.errors = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._session = requests.Session()
+        self._session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def payload(self, server_id: str) -> dict:
+        loop = self.loops[server_id]
+        # 每次上报有 1/4 概率进入下一轮，loop_ts 随之更新
+        if random.random() < 0.25: self.loops[server_id] = loop = loop + 1
+        return {"server_id": server_id, "task_type": "reboot", "status": "Running",
+                "phase": REBOOT_PHASES[loop % 3], "loop": str(loop), "loop_ts": time.time()}
+
+    def _send(self, server_id: str):
+        try:
+            ok = self._session.post(self.url, json=self.payload(server_id), timeout=10).ok
+        except requests.RequestException:
+            ok = False
+        with self._lock:
+            self.sent += 1
+            if not ok: self.errors += 1
+
+    def _run(self):
+        now = time.time()
+        due = [(now + random.uniform(0, self.interval), sid) for sid in self.server_ids]
+        heapq.heapify(due)
+        while not self._stop.is_set():
+            at, sid = due[0]
+            if self._stop.wait(max(0.0, at - time.time())): break
+            heapq.heapreplace(due, (at + self.interval, sid))
+            self._pool.submit(self._send, sid)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dut-fleet", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,177 @@
+# bench/loadtest.py
+# 压测驱动：注册模拟机群 -> (可选) 启动 SSH 桩与 DUT 上报 -> 逐个场景按并发压测 -> 输出基线
+#
+# 用法 (后端需已启动，config.SSH_PORT 与 --ssh-port 一致):
+#   python bench/loadtest.py --url http://127.0.0.1:8000 --servers 500 --concurrency 32 \
+#       --scenarios refresh,webhook,deploy,start,stop --ssh-stub --out baseline.json
+#   python bench/loadtest.py ... --baseline baseline.json   # 与基线对比，退化时退出码为 1
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dut_sim import DutFleet, fleet_servers
+
+# --- 1. 场景定义: 名称 -> (方法, 路径模板, 请求体生成) ---
+def _webhook_body(sid):
+    return {"server_id": sid, "task_type": "reboot", "status": "Running",
+            "phase": "热重启进行中 (Warm)", "loop": str(random.randint(1, 1000)), "loop_ts": time.time()}
+
+SCENARIOS = {
+    "refresh": ("POST", "/monitor/refresh", None),
+    "list":    ("GET", "/servers?mode=reboot&page_size=50", None),
+    "webhook": ("POST", "/report/webhook", _webhook_body),
+    "deploy":  ("POST", "/servers/{sid}/deploy", None),
+    "start":   ("POST", "/servers/{sid}/start_test", None),
+    "stop":    ("POST", "/servers/{sid}/stop_test", None),
+}
+
+# --- 2. 统计工具 ---
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values: return 0.0
+    # nearest-rank
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+REDIS_COUNT_RE = re.compile(r'^monitor_redis_op_seconds_count\{[^}]*\} ([0-9.e+]+)$', re.M)
+
+def redis_ops(session, base_url: str) -> float:
+    """后端 /metrics 中所有 Redis 命令计数之和 (含定时任务与 DUT 上报产生的命令)"""
+    try:
+        text = session.get(base_url + "/metrics", timeout=10).text
+    except requests.RequestException:
+        return 0.0
+    return sum(float(v) for v in REDIS_COUNT_RE.findall(text))
+
+# --- 3. 单场景压测 ---
+def run_scenario(session, base_url, name, server_ids, concurrency, total):
+    method, path, body_fn = SCENARIOS[name]
+    latencies, errors, conflicts, lock = [], [0], [0], threading.Lock()
+
+    def one(i):
+        sid = server_ids[i % len(server_ids)]
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, base_url + path.format(sid=sid),
+                                   json=body_fn(sid) if body_fn else None, timeout=120)
+            # 业务失败 (200 + success=false) 也计为错误
+            ok = resp.ok and not (resp.headers.get("content-type", "").startswith("application/json")
+                                  and isinstance(resp.json(), dict) and resp.json().get("success") is False)
+            # 409: 同一服务器上其它 worker 正在执行操作 (协调器拒绝)，单独统计
+            conflict = resp.status_code == 409
+        except requests.RequestException:
+            ok, conflict = False, False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if conflict: conflicts[0] += 1
+            elif not ok: errors[0] += 1
+
+    ops_before = redis_ops(session, base_url)
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall
+    # /metrics 抓取本身不访问 Redis，差值即本场景期间的命令数
+    ops = redis_ops(session, base_url) - ops_before
+
+    latencies.sort()
+    return {
+        "requests": total, "errors": errors[0], "conflicts": conflicts[0], "concurrency": concurrency,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "redis_ops_per_req": round(ops / total, 2) if total else 0.0,
+    }
+
+# --- 4. 基线对比 ---
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base: continue
+        for key, worse_if_higher in (("p50_ms", True), ("p99_ms", True), ("redis_ops_per_req", True), ("throughput_rps", False)):
+            old, new = base.get(key), cur.get(key)
+            if not old: continue
+            change = (new - old) / old
+            if (change > tolerance) if worse_if_higher else (change < -tolerance):
+                regressions.append(f"{name}.{key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def print_table(results: dict):
+    cols = ("requests", "errors", "conflicts", "throughput_rps", "p50_ms", "p99_ms", "max_ms", "redis_ops_per_req")
+    print(f"{'scenario':<10}" + "".join(f"{c:>18}" for c in cols))
+    for name, res in results.items():
+        print(f"{name:<10}" + "".join(f"{res[c]:>18}" for c in cols))
+
+def main():
+    parser = argparse.ArgumentParser(description="后端压测 (模拟 DUT 机群)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--servers", type=int, default=500, help="模拟的服务器数量")
+    parser.add_argument("--offline-ratio", type=float, default=0.0, help="离线 (ping 不可达) 服务器比例")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=0, help="每个场景的请求数，默认等于服务器数 (refresh 为 20)")
+    parser.add_argument("--scenarios", default="refresh,list,webhook,deploy,start,stop")
+    parser.add_argument("--dut-interval", type=float, default=30.0, help="DUT 后台上报周期 (秒)，0 表示不模拟上报")
+    parser.add_argument("--ssh-stub", action="store_true", help="在本进程内启动 SSH 桩")
+    parser.add_argument("--ssh-port", type=int, default=2222)
+    parser.add_argument("--ssh-latency", type=float, default=0.05)
+    parser.add_argument("--ssh-fail-rate", type=float, default=0.0)
+    parser.add_argument("--out", help="结果写入 JSON 文件 (作为回归基线)")
+    parser.add_argument("--baseline", help="与已有基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    parser.add_argument("--keep", action="store_true", help="结束后不删除模拟服务器")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency, 10)))
+
+    stub = None
+    if args.ssh_stub:
+        from ssh_stub import SSHStub
+        stub = SSHStub(port=args.ssh_port, latency=args.ssh_latency, fail_rate=args.ssh_fail_rate).start()
+
+    servers = fleet_servers(args.servers, args.offline_ratio)
+    server_ids = [s["server_id"] for s in servers]
+    for s in servers: session.post(base_url + "/servers/add", json=s, timeout=10).raise_for_status()
+    print(f"已注册 {len(servers)} 台模拟服务器")
+
+    fleet = DutFleet(base_url, server_ids, args.dut_interval).start() if args.dut_interval > 0 else None
+    results = {}
+    try:
+        for name in [n.strip() for n in args.scenarios.split(",") if n.strip()]:
+            if name not in SCENARIOS: parser.error(f"未知场景: {name}")
+            total = args.requests or (20 if name == "refresh" else len(server_ids))
+            print(f"场景 {name}: {total} 个请求, 并发 {args.concurrency} ...")
+            results[name] = run_scenario(session, base_url, name, server_ids, args.concurrency, total)
+    finally:
+        if fleet: fleet.stop()
+        if stub: stub.stop()
+        if not args.keep:
+            for sid in server_ids: session.delete(f"{base_url}/servers/delete/{sid}", timeout=10)
+
+    print_table(results)
+    if fleet: print(f"DUT 后台上报: {fleet.sent} 次, 失败 {fleet.errors} 次")
+    report = {"servers": args.servers, "offline_ratio": args.offline_ratio, "ssh_latency": args.ssh_latency,
+              "ssh_fail_rate": args.ssh_fail_rate, "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "scenarios": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions: print(f"退化: {line}")
+        if regressions: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
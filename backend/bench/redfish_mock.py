@@ -0,0 +1,139 @@
+# bench/redfish_mock.py
+# 本地 Redfish 模拟器：一个 HTTP 端口模拟整个机群的 BMC (按 Host 头区分，配合 dut_sim 的 127.x 地址)
+# 每台 BMC 按固定周期循环 "关机 -> 上电自检 (POST 码递进) -> 引导 OS -> OS 运行"，
+# 支持会话登录 (X-Auth-Token)、会话过期与按 BMC 限速 (超过时返回 429)
+#
+# 用法 (在 backend 目录下运行):
+#   python bench/redfish_mock.py --port 8443 --cycle 60
+#   config.py 中设置 REDFISH_SCHEME = "http", REDFISH_PORT = 8443
+import argparse
+import json
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYSTEM_URI = "/redfish/v1/Systems/system"
+# 一个重启周期内的阶段：(占周期比例, PowerState, BootProgress.LastState)
+PHASES = [
+    (0.10, "Off", "None"),
+    (0.05, "On", "SystemHardwareInitializationComplete"),
+    (0.15, "On", "MemoryInitializationStarted"),
+    (0.10, "On", "PCIResourceConfigStarted"),
+    (0.05, "On", "OSBootStarted"),
+    (0.55, "On", "OSRunning"),
+]
+POST_CODES = {"SystemHardwareInitializationComplete": "0x19", "MemoryInitializationStarted": "0xB1",
+              "PCIResourceConfigStarted": "0x92"}
+
+class Fleet:
+    def __init__(self, cycle: float, session_ttl: float, rate_limit: float, stuck: set):
+        self.cycle, self.session_ttl, self.rate_limit, self.stuck = cycle, session_ttl, rate_limit, stuck
+        self.start = time.time()
+        self.sessions = {}   # token -> (host, 过期时间)
+        self.hits = {}       # host -> (当前秒, 本秒请求数) (限速)
+        self.stats = {"requests": 0, "logins": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def state(self, host: str):
+        """按主机名散列错开相位，stuck 中的主机停在内存初始化"""
+        if host in self.stuck: return "On", "MemoryInitializationStarted"
+        t = ((time.time() - self.start) / self.cycle + zlib.crc32(host.encode()) % 1000 / 1000) % 1.0
+        for ratio, power, progress in PHASES:
+            if t < ratio: return power, progress
+            t -= ratio
+        return PHASES[-1][1], PHASES[-1][2]
+
+class Handler(BaseHTTPRequestHandler):
+    fleet: Fleet = None
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，验证客户端连接复用
+
+    def log_message(self, *args): pass
+
+    def _send(self, code, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _host(self):
+        return self.headers.get("Host", "").split(":")[0]
+
+    def _admit(self) -> bool:
+        fleet, host = self.fleet, self._host()
+        with fleet.lock:
+            fleet.stats["requests"] += 1
+            if not fleet.rate_limit: return True
+            second = int(time.time())
+            window, count = fleet.hits.get(host, (second, 0))
+            count = count + 1 if window == second else 1
+            fleet.hits[host] = (second, count)
+            if count > fleet.rate_limit:
+                fleet.stats["throttled"] += 1
+                return False
+        return True
+
+    def _authorized(self) -> bool:
+        token = self.headers.get("X-Auth-Token")
+        with self.fleet.lock:
+            session = self.fleet.sessions.get(token)
+            return bool(session) and session[0] == self._host() and session[1] > time.time()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.path != "/redfish/v1/SessionService/Sessions": return self._send(404)
+        token = uuid.uuid4().hex
+        with self.fleet.lock:
+            self.fleet.stats["logins"] += 1
+            self.fleet.sessions[token] = (self._host(), time.time() + self.fleet.session_ttl)
+        self._send(201, {"Id": token[:8]}, {"X-Auth-Token": token,
+                                            "Location": f"/redfish/v1/SessionService/Sessions/{token[:8]}"})
+
+    def do_DELETE(self):
+        self._send(204)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.fleet.lock: return self._send(200, dict(self.fleet.stats, sessions=len(self.fleet.sessions)))
+        if not self._admit(): return self._send(429, {"error": "rate limited"})
+        if not self._authorized(): return self._send(401, {"error": "unauthorized"})
+        power, progress = self.fleet.state(self._host())
+        if self.path == "/redfish/v1/Systems":
+            return self._send(200, {"Members": [{"@odata.id": SYSTEM_URI}], "Members@odata.count": 1})
+        if self.path == SYSTEM_URI:
+            return self._send(200, {"@odata.id": SYSTEM_URI, "PowerState": power, "BootProgress": {"LastState": progress}})
+        if self.path == f"{SYSTEM_URI}/LogServices/PostCodes/Entries":
+            code = POST_CODES.get(progress)
+            members = [{"MessageArgs": ["1", code]}] if power == "On" and code else []
+            return self._send(200, {"Members": members})
+        self._send(404)
+
+def serve(port: int, cycle: float = 60.0, session_ttl: float = 1800.0, rate_limit: float = 0.0, stuck=()):
+    Handler.fleet = Fleet(cycle, session_ttl, rate_limit, set(stuck))
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="redfish-mock", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Redfish 模拟器")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--cycle", type=float, default=60.0, help="每台 BMC 的重启周期 (秒)")
+    parser.add_argument("--session-ttl", type=float, default=1800.0, help="会话有效期 (秒)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每台 BMC 每秒最多请求数 (0 为不限)")
+    parser.add_argument("--stuck", default="", help="停在 POST 阶段的 BMC IP，逗号分隔")
+    args = parser.parse_args()
+    serve(args.port, args.cycle, args.session_ttl, args.rate_limit, [ip for ip in args.stuck.split(",") if ip])
+    print(f"Redfish mock 监听 :{args.port}，GET /stats 查看请求/登录/限速计数")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
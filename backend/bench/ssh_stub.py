@@ -0,0 +1,192 @@
+# bench/ssh_stub.py
+# 本地 SSH 桩服务：按命令特征返回预置输出，可配置延迟与失败率，SFTP 上传写入临时目录
+# 所有 127.0.0.0/8 地址都落在同一个桩上，因此一个进程即可模拟整个机群
+import argparse
+import logging
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+import paramiko
+
+# 客户端断开时 paramiko 会打印连接重置，压测中属于正常现象
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+# --- 1. 命令应答表 (按顺序匹配，第一个命中的生效) ---
+TOPOLOGY_OUTPUT = "TOPO node0 0-15 60000000 65000000\nTOPO node1 16-31 60000000 65000000\n"
+RESPONSES = [
+    (re.compile(r"TOPO "), TOPOLOGY_OUTPUT),
+    (re.compile(r"Monitor Started"), "SUCCESS: Monitor Started (PID: 4242)\n"),
+    (re.compile(r"Memtest Launched|Supervisor failed"), "SUCCESS: Memtest Launched\n"),
+    (re.compile(r"find .*-printf"), ""),
+]
+
+STEP_RE = re.compile(r'echo "@@STEP (\S+) \$rc"')
+# 公钥下发 (services/credentials.py)：记下公钥，之后该公钥可直接登录
+AUTHORIZED_RE = re.compile(r'echo "\S+ (\S+)[^"]*" >> ~/.ssh/authorized_keys')
+AUTHORIZED_KEYS = set()
+
+def answer(command: str) -> str:
+    key = AUTHORIZED_RE.search(command)
+    if key:
+        AUTHORIZED_KEYS.add(key.group(1))
+        return "KEY_INSTALLED\n"
+    for pattern, output in RESPONSES:
+        if pattern.search(command): return output
+    # 远程事务脚本 (utils.run_remote_transaction)：每个步骤均报告成功
+    return "".join(f"@@STEP {name} 0\n" for name in STEP_RE.findall(command))
+
+# --- 2. SFTP：远端绝对路径映射到本地临时目录 ---
+class _Handle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+class StubSFTPServer(paramiko.SFTPServerInterface):
+    root = tempfile.mkdtemp(prefix="ssh_stub_")
+
+    def _local(self, path):
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def _stat(self, func, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(func(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path): return self._stat(os.stat, path)
+    def lstat(self, path): return self._stat(os.lstat, path)
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, f)), f) for f in os.listdir(local)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        if flags & os.O_WRONLY: mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR: mode = "r+b"
+        else: mode = "rb"
+        try:
+            if "w" in mode or "a" in mode: os.close(os.open(local, flags, 0o644))
+            f = open(local, mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = _Handle(flags)
+        handle.readfile = handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try: os.remove(self._local(path))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try: os.replace(self._local(oldpath), self._local(newpath))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        os.makedirs(self._local(path), exist_ok=True)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try: os.rmdir(self._local(path))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+# --- 3. SSH 会话：exec 请求按延迟/失败率应答 ---
+class StubServer(paramiko.ServerInterface):
+    def __init__(self, latency: float, fail_rate: float):
+        self.latency, self.fail_rate = latency, fail_rate
+
+    def check_auth_password(self, username, password): return paramiko.AUTH_SUCCESSFUL
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL if key.get_base64() in AUTHORIZED_KEYS else paramiko.AUTH_FAILED
+    def get_allowed_auths(self, username): return "publickey,password"
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode(errors="replace")), daemon=True).start()
+        return True
+
+    def _exec(self, channel, command):
+        try:
+            if command == "bash -s":  # 脚本经 stdin 传入，读到 EOF 为止
+                chunks = []
+                while True:
+                    data = channel.recv(65536)
+                    if not data: break
+                    chunks.append(data)
+                command = b"".join(chunks).decode(errors="replace")
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+            if random.random() < self.fail_rate:
+                channel.sendall_stderr(b"stub: simulated failure\n")
+                channel.send_exit_status(1)
+            else:
+                channel.sendall(answer(command).encode())
+                channel.send_exit_status(0)
+        finally:
+            channel.close()
+
+class SSHStub:
+    """在 host:port 上监听；latency 为每条命令的平均耗时 (秒)，fail_rate 为命令失败概率"""
+    def __init__(self, host="0.0.0.0", port=2222, latency=0.05, fail_rate=0.0):
+        self.host, self.port, self.latency, self.fail_rate = host, port, latency, fail_rate
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._sock = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(512)
+        threading.Thread(target=self._accept_loop, name="ssh-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._sock: self._sock.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, StubSFTPServer)
+        try:
+            transport.start_server(server=StubServer(self.latency, self.fail_rate))
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+        transport.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 SSH 桩服务 (后端 config.SSH_PORT 需指向同一端口)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--latency", type=float, default=0.05, help="每条命令平均耗时 (秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="命令失败概率 0~1")
+    args = parser.parse_args()
+    SSHStub(args.host, args.port, args.latency, args.fail_rate).start()
+    print(f"SSH stub listening on {args.host}:{args.port} (files -> {StubSFTPServer.root})")
+    threading.Event().wait()
@@ -0,0 +1,117 @@
+# bench/startup_bench.py
+# 冷启动基准：每次在新进程中测量
+#   import    - 导入 main 的耗时 (uvicorn 多 worker 时每个 worker 都要付出这部分)
+#   healthz   - 从启动 uvicorn 进程到 /healthz 首次返回 200
+#   readyz    - 从启动 uvicorn 进程到 /readyz 首次返回 200 (存储可达、后台任务已启动)
+# 另可列出导入耗时最高的模块 (-X importtime)，定位拖慢启动的依赖
+#
+# 用法 (在 backend 目录下运行，需要 config.py；memory 后端无需 Redis):
+#   python bench/startup_bench.py --runs 5 --out startup.json
+#   python bench/startup_bench.py --runs 5 --baseline startup.json   # 退化时退出码为 1
+#   python bench/startup_bench.py --runs 1 --top 15
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_import() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def measure_serve(timeout: float) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"], cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        while time.perf_counter() - start < timeout and len(result) < 2:
+            if proc.poll() is not None: raise RuntimeError(f"uvicorn 已退出 (rc={proc.returncode})")
+            for probe in ("healthz", "readyz"):
+                if probe in result: continue
+                try:
+                    if requests.get(f"http://127.0.0.1:{port}/{probe}", timeout=1).status_code == 200:
+                        result[probe] = (time.perf_counter() - start) * 1000
+                except requests.RequestException:
+                    pass
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if len(result) < 2: raise RuntimeError(f"{timeout}s 内未就绪: {result}")
+    return result
+
+def top_imports(limit: int) -> list:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line: continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2, "cumulative_ms": round(us / 1000, 1)}
+            for us, name in rows[:limit]]
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for key, cur in results.items():
+        old = baseline.get("results", {}).get(key)
+        if old and cur > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.1f} ms -> {cur:.1f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="后端冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的次数 (取中位数)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="等待就绪的超时 (秒)")
+    parser.add_argument("--top", type=int, default=0, help="列出导入耗时最高的 N 个模块")
+    parser.add_argument("--no-serve", action="store_true", help="只测导入，不启动 uvicorn")
+    parser.add_argument("--out", help="结果写入 JSON (作为基线)")
+    parser.add_argument("--baseline", help="与已有基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许的退化比例")
+    args = parser.parse_args()
+
+    samples = {"import_ms": [measure_import() for _ in range(args.runs)]}
+    if not args.no_serve:
+        serve = [measure_serve(args.timeout) for _ in range(args.runs)]
+        samples["healthz_ms"] = [s["healthz"] for s in serve]
+        samples["readyz_ms"] = [s["readyz"] for s in serve]
+    results = {key: round(statistics.median(values), 1) for key, values in samples.items()}
+
+    print(f"{'指标':<12}{'中位数':>10}{'最小':>10}{'最大':>10}  (ms, {args.runs} 次)")
+    for key, values in samples.items():
+        print(f"{key:<12}{results[key]:>10.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    if args.top:
+        print(f"\n导入耗时最高的 {args.top} 个模块 (累计):")
+        for row in top_imports(args.top):
+            print(f"  {row['cumulative_ms']:>8.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"runs": args.runs, "results": results, "samples": samples}, f, indent=2)
+        print(f"\n结果已写入 {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions: print(f"退化: {line}")
+        if regressions: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench/storage_bench.py
+# 存储后端基准：通过同一个 Database 接口分别压测 memory / redis，输出各操作吞吐与延迟
+#
+# 用法 (在 backend 目录下运行，需要 config.py):
+#   python bench/storage_bench.py --servers 2000 --backends memory,redis
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Database
+from models import ServerSchema
+from storage import MemoryStore, RedisStore
+
+PREFIX = "BENCHSTORE"
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))]
+
+def measure(name, func, items, threads):
+    latencies = []
+    def one(item):
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, items))
+    wall = time.perf_counter() - wall
+    latencies.sort()
+    return {"op": name, "count": len(items), "ops_per_s": round(len(items) / wall, 1),
+            "p50_us": round(percentile(latencies, 50) * 1e6, 1), "p99_us": round(percentile(latencies, 99) * 1e6, 1)}
+
+def run(db: Database, servers: int, threads: int) -> list:
+    ids = [f"{PREFIX}-{i:05d}" for i in range(servers)]
+    event = [{"time": "2026-01-01 00:00:00", "level": "error", "signature": "MCE", "line": "x" * 120}]
+    results = [
+        measure("upsert_server", lambda sid: db.upsert_server(ServerSchema(server_id=sid, bmc_ip="127.0.0.1")), ids, threads),
+        measure("get_server", db.get_server, ids, threads),
+        measure("push_log_events", lambda sid: db.push_log_events(sid, event, 200), ids, threads),
+        measure("get_log_events", db.get_log_events, ids, threads),
+        measure("get_all_servers", lambda _: db.get_all_servers(), list(range(20)), 1),
+        measure("delete_server", db.delete_server, ids, threads),
+    ]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="存储后端基准")
+    parser.add_argument("--servers", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--backends", default="memory,redis")
+    args = parser.parse_args()
+
+    for backend in args.backends.split(","):
+        if backend == "memory":
+            store = MemoryStore(os.path.join(tempfile.mkdtemp(), "bench_db.json"))
+        else:
+            store = RedisStore()
+            if not store.ping():
+                print(f"[{backend}] 无法连接，跳过")
+                continue
+        db = Database(store)
+        start = time.perf_counter()
+        results = run(db, args.servers, args.threads)
+        snap = time.perf_counter()
+        store.snapshot()
+        snap = time.perf_counter() - snap
+        store.close()
+        print(f"\n[{backend}] {args.servers} 台服务器, {args.threads} 线程, 总耗时 {time.perf_counter() - start:.2f}s"
+              + (f", 快照 {snap * 1000:.1f}ms" if backend == "memory" else ""))
+        print(f"{'op':<18}{'count':>8}{'ops/s':>12}{'p50(us)':>12}{'p99(us)':>12}")
+        for r in results:
+            print(f"{r['op']:<18}{r['count']:>8}{r['ops_per_s']:>12}{r['p50_us']:>12}{r['p99_us']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# codec.py
+# 服务器状态的紧凑编码：
+#   1. 状态/阶段字符串编码为整数 (码表只追加、不改序，旧数据始终可解)
+#   2. 存储：省略默认值字段 + msgpack 二进制 (未安装 msgpack 时退化为紧凑 JSON)
+#   3. 接口响应：可选 compact (码表 + 省略默认值) 与 msgpack 格式，默认仍为可读 JSON；凭据字段一律不返回
+import json
+from typing import Iterable
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from models import ServerSchema
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --- 1. 码表 (只允许在末尾追加) ---
+STATUS_CODES = (
+    "Idle", "Deployed", "Running", "Stopped", "Finished", "Error",
+)
+PHASE_CODES = (
+    "未部署", "已部署", "正在启动...", "用户已停止", "环境已重置", "环境就绪", "已归档",
+    "运行中...", "测试进行中", "等待进程启动...",
+    "冷重启进行中 (Cold)", "热重启进行中 (Warm)", "压力重启进行中 (Stress)",
+    "阶段1: 冷重启 (Cold)", "阶段2: 热重启 (Warm)", "阶段3: 压力测试 (Stress)", "全部完成",
+    "压测已结束", "AC 脚本已部署", "AC压测进行中...", "AC压测已停止",
+)
+CODED_FIELDS = {
+    "status": STATUS_CODES, "reboot_status": STATUS_CODES, "memtest_status": STATUS_CODES,
+    "reboot_phase": PHASE_CODES, "memtest_phase": PHASE_CODES,
+    "ac_status": STATUS_CODES, "ac_phase": PHASE_CODES,
+}
+_INDEX = {table: {s: i for i, s in enumerate(table)} for table in (STATUS_CODES, PHASE_CODES)}
+
+def encode_fields(data: dict) -> dict:
+    """把码表内的状态/阶段替换为整数，码表外的字符串原样保留"""
+    for field, table in CODED_FIELDS.items():
+        value = data.get(field)
+        if isinstance(value, str):
+            code = _INDEX[table].get(value)
+            if code is not None: data[field] = code
+    return data
+
+def decode_fields(data: dict) -> dict:
+    for field, table in CODED_FIELDS.items():
+        value = data.get(field)
+        if isinstance(value, int) and 0 <= value < len(table): data[field] = table[value]
+    return data
+
+def to_compact(server: ServerSchema, include_version: bool = False) -> dict:
+    data = server.model_dump(exclude_defaults=True, exclude=None if include_version else {"version"})
+    data["server_id"] = server.server_id  # 主键始终保留
+    if include_version: data["version"] = server.version
+    return encode_fields(data)
+
+# --- 2. 存储编码 (首字节区分格式：'{' 为 JSON，0x01 为 msgpack) ---
+MSGPACK_MAGIC = b"\x01"
+
+def encode_server(server: ServerSchema) -> bytes:
+    data = to_compact(server)
+    if msgpack is not None:
+        return MSGPACK_MAGIC + msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+def decode_server(raw) -> ServerSchema:
+    """兼容三种存量格式：旧版完整 JSON、紧凑 JSON、msgpack"""
+    if isinstance(raw, str): raw = raw.encode()
+    if raw[:1] == MSGPACK_MAGIC:
+        if msgpack is None: raise ValueError("数据为 msgpack 编码，但未安装 msgpack")
+        data = msgpack.unpackb(raw[1:], raw=False)
+    else:
+        data = json.loads(raw)
+    return ServerSchema.model_validate(decode_fields(data))
+
+# --- 3. 接口响应 ---
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# 凭据只存不出：所有服务器列表响应都不含这些字段 (存储编码不受影响)
+SECRET_FIELDS = frozenset({"ssh_password", "bmc_password"})
+
+def dump_server(server: ServerSchema, fmt: str = "full", include: set = None) -> dict:
+    """接口响应中的单台服务器 (include 为字段白名单)"""
+    if fmt == "compact":
+        data = server.model_dump(include=include, exclude=SECRET_FIELDS, exclude_defaults=True)
+        return encode_fields(data | {"server_id": server.server_id, "version": server.version})
+    return server.model_dump(include=include, exclude=SECRET_FIELDS)
+
+def codes_table() -> dict:
+    return {"status": list(STATUS_CODES), "phase": list(PHASE_CODES), "fields": {f: ("status" if t is STATUS_CODES else "phase") for f, t in CODED_FIELDS.items()}}
+
+def render_servers(servers: Iterable[ServerSchema], request: Request, fmt: str = "full", key: str = "results", extra: dict = None) -> Response:
+    """
+    fmt=full    : 完整可读 JSON (默认，与旧版一致)
+    fmt=compact : 省略默认值 + 状态/阶段码，附带码表，前端按码表还原
+    Accept: application/msgpack 时以 msgpack 编码返回 (与 fmt 组合使用)
+    压缩由 GZip 中间件按 Accept-Encoding 处理
+    """
+    body = dict(extra or {})
+    body[key] = [dump_server(s, fmt) for s in servers]
+    if fmt == "compact": body["codes"] = codes_table()
+    return render_body(body, request)
+
+def render_body(body: dict, request: Request, headers: dict = None) -> Response:
+    """按 Accept 头选择 msgpack 或 JSON"""
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(msgpack.packb(body, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    return JSONResponse(body, headers=headers)
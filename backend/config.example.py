@@ -8,10 +8,7 @@ LOCAL_SCRIPT_DIR = os.path.join(BASE_DIR, "scripts")
 TEMP_SCRIPT_DIR = os.path.join(BASE_DIR, "temp_scripts")
 DB_FILE = os.path.join(BASE_DIR, "data", "servers_db.json")
 LOCAL_DOWNLOAD_DIR = os.path.join(BASE_DIR, "data", "downloads")
-
-# 自动创建必要目录
-if not os.path.exists(os.path.dirname(DB_FILE)): os.makedirs(os.path.dirname(DB_FILE))
-if not os.path.exists(LOCAL_DOWNLOAD_DIR): os.makedirs(LOCAL_DOWNLOAD_DIR)
+# 目录在首次写入时创建 (存储快照 / 产物 / 临时脚本)，导入配置不产生文件系统操作
 
 # --- 2. 服务器连接配置 ---
 SSH_PORT = 22
@@ -34,6 +31,13 @@ SCRIPT_MONITOR_NAME = "monitor_daemon.sh"
 # Memtest 相关
 SCRIPT_MEMTEST_NAME = "memtester.sh"
 FILE_MEMTEST_TAR = "memtester-4.6.0.tar.gz"
+# 无界面模式 (按 NUMA 节点/核心绑定，supervisor 控制时长)
+SCRIPT_MEMTEST_SUPERVISOR_NAME = "memtest_supervisor.sh"
+MEMTEST_MEM_RATIO = 0.9  # 每个 NUMA 节点空闲内存的测试占比
+
+# stressapptest 参数 (部署时按 NUMA 拓扑计算，采集失败时用默认值)
+STRESS_MEM_RATIO = 0.8
+STRESS_DEFAULT_ARGS = "-C 128 -m 128"
 
 # MemInfo 相关
 SCRIPT_MEM_INFO_NAME = "get_memory_info.sh"
@@ -61,4 +65,80 @@ CLEAN_RC_LOCAL_CONTENT = r"""#!/bin/bash
 
 touch /var/lock/subsys/local
 exit 0
-"""
\ No newline at end of file
+"""
+
+# --- 6. 重启耗时回归检测 ---
+BOOT_MIN_SAMPLES = 5      # 至少积累多少轮才开始判定异常
+BOOT_SPIKE_SIGMA = 4.0    # 单轮偏离均值超过 N 倍标准差视为尖峰
+BOOT_CUSUM_K = 0.5        # CUSUM 容差 (以标准差为单位)
+BOOT_CUSUM_H = 5.0        # CUSUM 报警阈值 (以标准差为单位)
+
+# --- 7. 远程日志增量抓取 ---
+SCRAPE_INTERVAL = 60             # 抓取周期 (秒)
+SCRAPE_WORKERS = 16              # 并发抓取的主机数
+SCRAPE_MAX_BYTES = 4 * 1024 * 1024  # 单个文件单次最多读取的字节数
+SCRAPE_EVENT_KEEP = 200          # 每台服务器保留的最近事件条数
+
+# --- 8. 日志管道 ---
+LOG_QUEUE_SIZE = 10000       # 日志队列容量，满时丢弃 (不阻塞请求线程)
+LOG_RING_SIZE = 500          # 每台服务器在内存中保留的最近日志条数
+LOG_RATE_PER_SERVER = 20     # 每台服务器每秒允许的 INFO/DEBUG 日志条数 (WARNING 以上不限)
+LOG_RATE_BURST = 100         # 限流令牌桶容量
+
+# --- 9. 存储后端 ---
+# redis: 生产环境 (多 worker 共享)；memory: 单进程内嵌存储，定期快照到 DB_FILE (小型实验室 / 测试)
+STORAGE_BACKEND = "redis"
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+REDIS_PASSWORD = None        # Redis 有密码时填写
+REDIS_DB = 0
+REDIS_MAX_CONNECTIONS = 64   # 连接池上限，超过时请求排队等待
+STORAGE_SNAPSHOT_INTERVAL = 10  # memory 后端快照周期 (秒)
+SERVER_CACHE_ENABLED = True     # 进程内缓存已解析的服务器对象 (经变更频道跨 worker 失效)
+
+# --- 10. 在线状态探测 (后台任务，前端轮询 GET /servers 不再触发 Ping) ---
+# 每台服务器按状态自适应：测试运行中快速探测，稳定/离线主机指数退避 (离线加随机抖动)
+PROBE_TICK = 1               # 调度周期 (秒)，每周期只探测到期的服务器
+PROBE_FAST_INTERVAL = 2      # 测试运行中 (reboot / acreboot) 的探测间隔 (秒)
+PROBE_INTERVAL = 5           # 稳定/离线主机的初始间隔，状态变化后回到该值 (秒)
+PROBE_MAX_INTERVAL = 60      # 退避上限 (秒)
+PROBE_MAX_PER_TICK = 256     # 每周期最多探测台数 (最逾期的优先)，限制总负载
+PROBE_WORKERS = 64           # 并发 Ping 数
+
+# --- 11. 多 worker 部署 (需 STORAGE_BACKEND = "redis"；memory 后端强制单 worker) ---
+UVICORN_WORKERS = 1          # uvicorn worker 进程数
+LOCK_TTL = 30                # 服务器操作锁过期时间 (秒)，持有期间自动续期，进程崩溃后自动释放
+LEADER_TTL = 15              # 定时任务 Leader 租约 (秒)，Leader 退出后由其它 worker 接管
+
+# --- 12. BMC 带外状态轮询 (Redfish，需在服务器上配置 bmc_user / bmc_password) ---
+REDFISH_INTERVAL = 5         # 轮询任务周期 (秒)
+REDFISH_MIN_INTERVAL = 10    # 单台 BMC 最小轮询间隔 (秒)，避免压垮 BMC
+REDFISH_MAX_BACKOFF = 300    # 连续失败时的最大退避 (秒)
+REDFISH_WORKERS = 32         # 并发轮询的 BMC 数
+REDFISH_TIMEOUT = 5          # 单个请求超时 (秒)
+REDFISH_SCHEME = "https"
+REDFISH_PORT = None          # None 为协议默认端口
+REDFISH_VERIFY_TLS = False   # BMC 多为自签证书
+
+# --- 13. 批量启动活动 (错峰启动 reboot / acreboot) ---
+CAMPAIGN_TICK = 2            # 推进周期 (秒)
+
+# --- 14. 日志归档与产物存储 (停止测试时 DUT 日志流式传回后端) ---
+ARTIFACT_DIR = os.path.join(BASE_DIR, "data", "artifacts")   # 产物根目录 (内容按 sha256 去重存放)
+ARTIFACT_MAX_BYTES = 50 * 1024 ** 3                          # 产物总大小上限，超出时从最旧的删除 (0 为不限)
+ARTIFACT_MAX_AGE_DAYS = 90                                   # 产物保留天数 (0 为不限)
+ARTIFACT_GC_INTERVAL = 3600                                  # 保留策略执行周期 (秒)
+ARCHIVE_REMOTE_STATE_DIR = "/root/.monitor_archive"         # DUT 上的增量清单目录 (记录已归档内容)
+ARCHIVE_ZSTD_LEVEL = 3                                       # zstd 压缩级别 (多线程 -T0)
+REMOTE_GC_KEEP_DAYS = 7                                      # DUT 清理：Trash/ 与遗留归档包保留天数
+
+# --- 15. 批量导入 / 导出 (CSV / JSONL) ---
+IMPORT_BATCH = 500           # 每批校验并写入的记录数 (一次管道往返)
+IMPORT_MAX_ROWS = 20000      # 单次导入的记录上限
+IMPORT_CHECK_WORKERS = 32    # 导入后连通性 / SSH 凭据检查的并发数
+
+# --- 16. SSH 密钥认证 (后端公钥经 POST /ssh/bootstrap 下发到 DUT，之后优先用密钥登录) ---
+SSH_KEY_FILE = os.path.join(BASE_DIR, "data", "ssh", "id_ed25519")  # 后端私钥，不存在时首次使用自动生成 (Ed25519)
+SSH_KEY_COMMENT = "server-monitor"   # 写入 authorized_keys 的注释，用于识别
+SSH_HOST_KEY_CHANGED = "update"      # 主机公钥变化 (如重装系统) 时：update 记录新公钥并告警 / reject 拒绝连接
+SSH_BOOTSTRAP_WORKERS = 32           # 批量下发公钥的并发数
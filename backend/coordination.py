@@ -0,0 +1,181 @@
+# coordination.py
+# 多 worker / 多主机部署时的协调：
+#   1. 每台服务器一把分布式锁，同一时刻只允许一个变更操作 (部署/启动/停止...)
+#   2. 操作协调：相同的在途请求合并为一次执行、共享结果；不同操作冲突时拒绝 (409)
+#   3. 后台定时任务的 Leader 选举，只有 Leader 进程执行探测/抓取
+# 基于存储后端的带过期互斥锁 (Redis: SET NX PX + Lua 校验持有者；memory: 进程内)
+import functools
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from config import LOCK_TTL, LEADER_TTL
+from database import db
+from logger import logger
+
+class LockBusyError(Exception):
+    """锁已被其它请求持有 (main.py 转换为 409)"""
+
+class ActionConflictError(LockBusyError):
+    def __init__(self, server_id: str, running: str, requested: str):
+        self.server_id, self.running, self.requested = server_id, running, requested
+        if running == requested:
+            msg = f"[{server_id}] {running} 正在其它 worker 上执行，请稍后刷新状态"
+        else:
+            msg = f"[{server_id}] {running or '其它操作'} 正在执行，{requested} 已拒绝"
+        super().__init__(msg)
+
+# --- 1. 分布式锁 (持有期间后台线程自动续期，进程崩溃后锁在 TTL 后自动释放) ---
+class DistributedLock:
+    def __init__(self, name: str, ttl: float = LOCK_TTL, owner: str = "", label: str = "", renew: bool = True):
+        """renew=False 用于只有几次存储读写的短临界区：不启动续期线程，持有时间须远小于 ttl"""
+        self.key = f"lock:{name}"
+        self.ttl_ms = int(ttl * 1000)
+        self.renew = renew
+        # 锁值 "操作名|持有者"，冲突时可告知对方正在执行什么
+        self.token = f"{label}|{owner or WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def acquire(self, timeout: float = 0) -> bool:
+        """timeout > 0 时轮询等待锁释放"""
+        deadline = time.monotonic() + timeout
+        while not db.store.acquire_lock(self.key, self.token, self.ttl_ms):
+            if time.monotonic() >= deadline: return False
+            time.sleep(0.05)
+        if not self.renew: return True
+        self._stop.clear()
+        self._renewer = threading.Thread(target=self._renew, name=f"lock-renew-{self.key}", daemon=True)
+        self._renewer.start()
+        return True
+
+    def _renew(self):
+        while not self._stop.wait(self.ttl_ms / 3000):
+            if not db.store.extend_lock(self.key, self.token, self.ttl_ms):
+                logger.warning(f"[Lock] {self.key} 续期失败，锁可能已过期被他人获取")
+                return
+
+    def release(self):
+        self._stop.set()
+        db.store.release_lock(self.key, self.token)
+
+    def holder_label(self) -> str:
+        return (db.store.get(self.key) or "").split("|", 1)[0]
+
+    def __enter__(self):
+        if not self.acquire():
+            raise LockBusyError(f"{self.key} 正被其它操作占用")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def server_lock(server_id: str, action: str = "") -> DistributedLock:
+    return DistributedLock(f"server:{server_id}", label=action)
+
+# --- 2. 操作协调 (进程内合并重复请求，跨进程由服务器锁互斥) ---
+def _request_key(params: dict) -> str:
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+class ActionCoordinator:
+    """
+    每台服务器同一时刻只执行一个操作：
+      - 同一操作、同一参数的请求 (双击 / 多人同时点击) 等待在途请求并共享其结果，不再重复 SSH
+      - 其它操作 (如部署中点击启动) 立即以 ActionConflictError 拒绝，不排队，避免操作按意外顺序落地
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # server_id -> (action, request_key, Future)
+
+    def running(self, server_id: str) -> str:
+        with self._lock:
+            current = self._inflight.get(server_id)
+        return current[0] if current else ""
+
+    def run(self, server_id: str, action: str, params: dict, func):
+        key = _request_key(params)
+        with self._lock:
+            current = self._inflight.get(server_id)
+            if current and (current[0], current[1]) != (action, key):
+                raise ActionConflictError(server_id, current[0], action)
+            owner = current is None
+            future = Future() if owner else current[2]
+            if owner: self._inflight[server_id] = (action, key, future)
+
+        if not owner:
+            logger.info(f"[{server_id}] {action} 已在执行，合并重复请求")
+            return future.result()
+
+        try:
+            lock = server_lock(server_id, action)
+            if not lock.acquire():
+                raise ActionConflictError(server_id, lock.holder_label(), action)
+            try:
+                result = func()
+            finally:
+                lock.release()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)  # 等待者收到相同的异常 (如 404)
+            raise
+        finally:
+            with self._lock: self._inflight.pop(server_id, None)
+
+coordinator = ActionCoordinator()
+
+def server_action(action: str):
+    """路由装饰器：按路径参数 server_id 经协调器执行，其余参数参与重复请求判定"""
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            params = {k: v for k, v in kwargs.items() if k != "server_id"}
+            return coordinator.run(kwargs["server_id"], action, params, lambda: endpoint(*args, **kwargs))
+        return wrapper
+    return decorator
+
+# --- 3. Leader 选举 (定时任务只在 Leader 上执行) ---
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class LeaderElector:
+    def __init__(self, name: str = "scheduler", ttl: float = LEADER_TTL):
+        self.lock = DistributedLock(f"leader:{name}", ttl, owner=WORKER_ID)
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leader-elector", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = self.lock.ttl_ms / 3000
+        while True:
+            try:
+                if self.is_leader:
+                    held = db.store.extend_lock(self.lock.key, self.lock.token, self.lock.ttl_ms)
+                else:
+                    held = db.store.acquire_lock(self.lock.key, self.lock.token, self.lock.ttl_ms)
+            except Exception as e:
+                logger.warning(f"[Leader] 选举异常: {e}")
+                held = False
+            if held != self.is_leader:
+                logger.info(f"[Leader] {WORKER_ID} {'成为' if held else '失去'} Leader")
+            self.is_leader = held
+            if self._stop.wait(interval): break
+        if self.is_leader:
+            db.store.release_lock(self.lock.key, self.lock.token)
+            self.is_leader = False
+
+    def stop(self):
+        self._stop.set()
+        if self._thread: self._thread.join(timeout=5)
+
+leader = LeaderElector()
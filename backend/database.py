@@ -1,55 +1,367 @@
-import redis
+import datetime
 import json
-from models import ServerSchema
+import threading
+from models import ServerSchema, CampaignSchema, RunSchema
 from typing import Dict, List
+from config import SERVER_CACHE_ENABLED
+from storage import Store, create_store
+from codec import encode_server, decode_server
+from logger import logger
 
-# --- Redis 配置 ---
-# 如果你的 Redis 有密码，加 password='xxx'
-# decode_responses=True 让我们取出来的是字符串而不是字节
-r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# --- 1. 进程内缓存 (已解析的 ServerSchema，按版本号失效) ---
+class ServerCache:
+    """
+    读穿透缓存：命中时既不访问存储也不做 Pydantic 解析。
+    任何进程写入都会经存储的变更频道通知到这里；订阅断开期间缓存停用，所有读取直达存储。
+    返回给调用方的是浅拷贝：顶层字段可随意修改，嵌套容器 (列表/字典/子模型) 只能整体替换、不可原地修改。
+    """
+    def __init__(self):
+        self._items: Dict[str, ServerSchema] = {}
+        self._ids = set()         # 已知存在的服务器 (complete 时有效)
+        self._gen = {}            # 每台服务器的本地失效计数，用于丢弃读取期间已过期的结果
+        self._global_gen = 0
+        self.complete = False     # _ids 是否覆盖全部服务器
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def on_reset(self, connected: bool):
+        with self._lock:
+            self._items.clear()
+            self._ids.clear()
+            self.complete = False
+            self.enabled = connected
+            self._global_gen += 1
+
+    def on_change(self, server_id: str, version: int, deleted: bool):
+        with self._lock:
+            self._gen[server_id] = self._gen.get(server_id, 0) + 1
+            self._global_gen += 1
+            cached = self._items.get(server_id)
+            if deleted:
+                self._items.pop(server_id, None)
+                self._ids.discard(server_id)
+            else:
+                self._ids.add(server_id)
+                # 版本号随写入单调递增；本进程刚写入的对象已是该版本，无需丢弃
+                if cached is None or cached.version < version: self._items.pop(server_id, None)
+
+    def generation(self, server_id: str = None) -> int:
+        with self._lock:
+            return self._global_gen if server_id is None else self._gen.get(server_id, 0)
+
+    def get(self, server_id: str):
+        if not self.enabled: return None
+        obj = self._items.get(server_id)
+        return obj.model_copy() if obj is not None else None
+
+    def put(self, server: ServerSchema, gen: int = None):
+        """gen 为读取前取得的失效计数；期间收到过失效通知则不写入"""
+        with self._lock:
+            if not self.enabled: return
+            sid = server.server_id
+            if gen is not None and self._gen.get(sid, 0) != gen: return
+            cached = self._items.get(sid)
+            if cached is None or cached.version <= server.version:
+                self._items[sid] = server.model_copy()
+                self._ids.add(sid)
+
+    def fill_all(self, servers: Dict[str, ServerSchema], gen: int):
+        with self._lock:
+            if not self.enabled or self._global_gen != gen: return
+            self._items = {sid: s.model_copy() for sid, s in servers.items()}
+            self._ids = set(servers)
+            self.complete = True
+
+    def snapshot(self):
+        """返回 (完整时的全部服务器拷贝, 缺失的 ID)，缓存不完整时返回 None"""
+        with self._lock:
+            if not self.enabled or not self.complete: return None
+            items = {sid: obj.model_copy() for sid, obj in self._items.items()}
+            missing = [sid for sid in self._ids if sid not in items]
+        return items, missing
 
 class Database:
-    def __init__(self):
-        self.prefix = "server:"  # Redis key 前缀，方便管理
+    def __init__(self, store: Store = None):
+        # 存储后端由 config.STORAGE_BACKEND 决定 (redis / memory)
+        # 延迟到 open() (应用启动时) 或第一次访问 store 时才创建连接池/加载快照并订阅变更，导入本模块不连接存储
+        self._store = None
+        self._pending_store = store
+        self._open_lock = threading.Lock()
+        self.prefix = "server:"  # key 前缀，方便管理
+        self.cache = ServerCache()
+
+    @property
+    def store(self) -> Store:
+        return self._store if self._store is not None else self.open()
+
+    @property
+    def is_open(self) -> bool:
+        return self._store is not None
+
+    def open(self) -> Store:
+        with self._open_lock:
+            if self._store is None:
+                store = self._pending_store or create_store()
+                if SERVER_CACHE_ENABLED:
+                    store.subscribe_changes(self._on_store_change, self.cache.on_reset)
+                self._store = store
+        return self._store
+
+    def _on_store_change(self, version: int, key: str, deleted: bool):
+        if key.startswith(self.prefix):
+            self.cache.on_change(key[len(self.prefix):], version, deleted)
+
+    def _parse(self, val: bytes, version: int) -> ServerSchema | None:
+        try:
+            # 紧凑编码 (msgpack / JSON) 转为 Pydantic 对象，兼容旧版完整 JSON
+            server_obj = decode_server(val)
+        except Exception as e:
+            logger.error(f"[Storage] 服务器数据解析失败: {e}")
+            return None
+        server_obj.version = version
+        return server_obj
+
+    def _fetch(self, server_ids: List[str]) -> Dict[str, ServerSchema]:
+        gens = {sid: self.cache.generation(sid) for sid in server_ids}
+        rows = self.store.versioned_mget([f"{self.prefix}{sid}" for sid in server_ids])
+        servers = {}
+        for sid, (val, version) in zip(server_ids, rows):
+            obj = self._parse(val, version) if val else None
+            if obj:
+                self.cache.put(obj, gens[sid])
+                servers[sid] = obj
+        return servers
 
     def get_all_servers(self) -> Dict[str, ServerSchema]:
         """获取所有服务器数据，返回字典 {id: ServerSchema}"""
-        servers = {}
-        # 1. 扫描所有以 server: 开头的 key
-        keys = r.keys(f"{self.prefix}*")
+        # 1. 缓存完整时只补读失效的服务器
+        snap = self.cache.snapshot()
+        if snap is not None:
+            servers, missing = snap
+            if missing: servers.update(self._fetch(missing))
+            return servers
+
+        # 2. 全量读取：扫描所有以 server: 开头的 key，批量获取数据与版本号
+        gen = self.cache.generation()
+        keys = self.store.keys(self.prefix)
         if not keys:
             return {}
-        
-        # 2. 批量获取数据
-        values = r.mget(keys)
-        
-        # 3. 反序列化
-        for val in values:
-            if val:
-                try:
-                    # 将 JSON 字符串转为 Pydantic 对象
-                    server_obj = ServerSchema.model_validate_json(val)
-                    servers[server_obj.server_id] = server_obj
-                except Exception as e:
-                    print(f"Redis 数据解析失败: {e}")
+        servers = {}
+        for val, version in self.store.versioned_mget(keys):
+            obj = self._parse(val, version) if val else None
+            if obj: servers[obj.server_id] = obj
+        self.cache.fill_all(servers, gen)
         return servers
 
+    def fleet_version(self) -> int:
+        """机群版本号：任意服务器写入/删除后递增 (用于 ETag)"""
+        return self.store.current_version()
+
     def get_server(self, server_id: str) -> ServerSchema | None:
-        """获取单个服务器"""
-        val = r.get(f"{self.prefix}{server_id}")
-        if val:
-            return ServerSchema.model_validate_json(val)
-        return None
+        """获取单个服务器 (缓存命中时不访问存储)"""
+        cached = self.cache.get(server_id)
+        if cached is not None:
+            return cached
+        return self._fetch([server_id]).get(server_id)
+
+    def get_servers(self, server_ids: List[str]) -> Dict[str, ServerSchema]:
+        """批量获取 (缓存未命中的一次 mget 读取)，不存在的不返回"""
+        servers = {sid: obj for sid in server_ids if (obj := self.cache.get(sid)) is not None}
+        missing = [sid for sid in dict.fromkeys(server_ids) if sid not in servers]
+        if missing: servers.update(self._fetch(missing))
+        return servers
 
     def upsert_server(self, server: ServerSchema):
-        """新增或更新服务器 (自动保存)"""
+        """新增或更新服务器 (自动保存)；写入后 server.version 为新版本号"""
         key = f"{self.prefix}{server.server_id}"
-        # model_dump_json() 直接把对象转成 JSON 字符串
-        r.set(key, server.model_dump_json())
+        # 省略默认值、状态/阶段编码后存储 (版本号单独存放)
+        server.version = self.store.versioned_set(key, encode_server(server))
+        self.cache.put(server)
+
+    def upsert_servers(self, servers: List[ServerSchema]):
+        """批量写入 (一次管道往返)，用于批量导入"""
+        if not servers: return
+        versions = self.store.versioned_mset({f"{self.prefix}{s.server_id}": encode_server(s) for s in servers})
+        for s in servers:
+            s.version = versions[f"{self.prefix}{s.server_id}"]
+            self.cache.put(s)
 
     def delete_server(self, server_id: str):
         """删除服务器"""
-        r.delete(f"{self.prefix}{server_id}")
+        srv = self.get_server(server_id)
+        self.store.versioned_delete(f"{self.prefix}{server_id}")
+        self.store.delete(f"scrape:{server_id}", f"logevents:{server_id}")
+        if srv: self.unindex_identities(srv)
+
+    # --- 身份索引 (BMC IP / OS IP / AC 盒子+插座 -> server_id，用于发现重复登记) ---
+    # 只在新增 / 导入 / 修改配置时维护；查询时核对属主的当前值，过期条目视为空闲并清除
+    IDENT_PREFIX = "ident:"
+    IDENT_BUILT = "ident:_built"
+
+    @staticmethod
+    def identities(server: ServerSchema) -> Dict[str, str]:
+        """{索引键: 说明}，未配置的字段不参与"""
+        idents = {f"bmc_ip:{server.bmc_ip}": f"BMC IP {server.bmc_ip}"}
+        if server.os_ip: idents[f"os_ip:{server.os_ip}"] = f"OS IP {server.os_ip}"
+        if server.ac_ip: idents[f"ac:{server.ac_ip}#{server.ac_socket}"] = f"AC {server.ac_ip} 插座 {server.ac_socket}"
+        return {k: v for k, v in idents.items() if k.split(":", 1)[1]}
+
+    def _ensure_identity_index(self):
+        """首次使用 (或存储清空后) 从全部服务器重建"""
+        if self.store.get(self.IDENT_BUILT): return
+        mapping = {}
+        for srv in self.get_all_servers().values():
+            for ident in self.identities(srv): mapping.setdefault(f"{self.IDENT_PREFIX}{ident}", srv.server_id)
+        if mapping: self.store.mset(mapping)
+        self.store.set(self.IDENT_BUILT, "1")
+
+    def identity_owners(self, idents: List[str]) -> Dict[str, str]:
+        """返回 {身份: 当前属主 server_id}，无属主的不返回"""
+        if not idents: return {}
+        self._ensure_identity_index()
+        owners = dict(zip(idents, self.store.mget([f"{self.IDENT_PREFIX}{i}" for i in idents])))
+        owned = {i: sid for i, sid in owners.items() if sid}
+        current = self._fetch([sid for sid in set(owned.values()) if self.cache.get(sid) is None])
+        stale = []
+        for ident, sid in owned.items():
+            srv = self.cache.get(sid) or current.get(sid)
+            if not srv or ident not in self.identities(srv): stale.append(ident)
+        if stale: self.store.delete(*[f"{self.IDENT_PREFIX}{i}" for i in stale])
+        return {i: sid for i, sid in owned.items() if i not in stale}
+
+    def identity_conflicts(self, server: ServerSchema) -> List[str]:
+        """与其它服务器重复的身份说明 (如 "OS IP 10.0.0.1 已被 S01 使用")"""
+        idents = self.identities(server)
+        owners = self.identity_owners(list(idents))
+        return [f"{idents[i]} 已被 {sid} 使用" for i, sid in owners.items() if sid != server.server_id]
+
+    def index_identities(self, servers: List[ServerSchema], previous: List[ServerSchema] = ()):
+        """登记身份；previous 为修改前的对象，其不再使用的身份一并释放"""
+        self._ensure_identity_index()
+        mapping = {f"{self.IDENT_PREFIX}{i}": s.server_id for s in servers for i in self.identities(s)}
+        released = [f"{self.IDENT_PREFIX}{i}" for s in previous for i in self.identities(s)]
+        released = [k for k in released if k not in mapping]
+        if released: self._release(released, {s.server_id for s in previous})
+        if mapping: self.store.mset(mapping)
+
+    def unindex_identities(self, server: ServerSchema):
+        self._release([f"{self.IDENT_PREFIX}{i}" for i in self.identities(server)], {server.server_id})
+
+    def _release(self, keys: List[str], owners: set):
+        """只删除仍归属于 owners 的条目 (可能已被其它服务器接管)"""
+        mine = [k for k, sid in zip(keys, self.store.mget(keys)) if sid in owners]
+        if mine: self.store.delete(*mine)
+
+    # --- SSH 主机公钥 (host -> "类型 base64"，见 sshkeys.py) ---
+    def get_host_key(self, host: str) -> str | None:
+        return self.store.get(f"hostkey:{host}")
+
+    def save_host_key(self, host: str, entry: str):
+        self.store.set(f"hostkey:{host}", entry)
+
+    def delete_host_key(self, host: str):
+        self.store.delete(f"hostkey:{host}")
+
+    # --- 日志抓取状态 (每个文件的 inode / offset) ---
+    def get_scrape_state(self, server_id: str) -> dict:
+        val = self.store.get(f"scrape:{server_id}")
+        return json.loads(val) if val else {}
+
+    def save_scrape_state(self, server_id: str, state: dict):
+        self.store.set(f"scrape:{server_id}", json.dumps(state))
+
+    # --- 日志事件 (定长列表，最新在前) ---
+    def push_log_events(self, server_id: str, events: List[dict], keep: int):
+        if not events: return
+        self.store.list_push(f"logevents:{server_id}", [json.dumps(e, ensure_ascii=False) for e in events], keep)
+
+    def get_log_events(self, server_id: str, limit: int = 50) -> List[dict]:
+        return [json.loads(v) for v in self.store.list_range(f"logevents:{server_id}", 0, limit - 1)]
+
+    # --- 批量启动活动 (JSON，重启后由 Leader 继续推进) ---
+    def get_campaign(self, campaign_id: str) -> CampaignSchema | None:
+        val = self.store.get(f"campaign:{campaign_id}")
+        return CampaignSchema.model_validate_json(val) if val else None
+
+    def save_campaign(self, campaign: CampaignSchema):
+        self.store.set(f"campaign:{campaign.campaign_id}", campaign.model_dump_json())
+
+    def list_campaigns(self) -> List[CampaignSchema]:
+        keys = sorted(self.store.keys("campaign:"))
+        return [CampaignSchema.model_validate_json(v) for v in self.store.mget(keys) if v]
+
+    def delete_campaign(self, campaign_id: str):
+        self.store.delete(f"campaign:{campaign_id}")
+
+    # --- 测试运行 (JSON 记录 + 有序集合索引：全部 / 按服务器 / 按类型，分数为开始时间) ---
+    RUN_INDEXES = ("runs:all", "runs:server:{server_id}", "runs:type:{test_type}")
+
+    def get_run(self, run_id: str) -> RunSchema | None:
+        val = self.store.get(f"run:{run_id}")
+        return RunSchema.model_validate_json(val) if val else None
+
+    def get_runs(self, run_ids: List[str]) -> List[RunSchema]:
+        return [RunSchema.model_validate_json(v) for v in self.store.mget([f"run:{r}" for r in run_ids]) if v]
+
+    def save_run(self, run: RunSchema):
+        self.store.set(f"run:{run.run_id}", run.model_dump_json())
+        for index in self.RUN_INDEXES:
+            self.store.zadd(index.format(server_id=run.server_id, test_type=run.test_type), {run.run_id: run.started_ts})
+
+    def query_run_ids(self, server_id: str = "", test_type: str = "", since: float = 0,
+                      until: float = float("inf"), limit: int = None) -> List[str]:
+        """按开始时间倒序；指定服务器时用服务器索引，否则用类型索引，都不指定时用全量索引"""
+        index = f"runs:server:{server_id}" if server_id else f"runs:type:{test_type}" if test_type else "runs:all"
+        return self.store.zrange_by_score(index, since, until, limit)
+
+    def delete_run(self, run: RunSchema):
+        self.store.delete(f"run:{run.run_id}")
+        for index in self.RUN_INDEXES:
+            self.store.zrem(index.format(server_id=run.server_id, test_type=run.test_type), run.run_id)
+
+    # --- 产物索引 (文件在 ARTIFACT_DIR 下，这里只存元数据) ---
+    # JSON 记录 + 有序集合索引：全部 / 按服务器 / 按类型 / 按运行，成员为 "server_id:artifact_id"，分数为创建时间
+    ARTIFACT_INDEXES = ("artifacts:all", "artifacts:server:{server_id}", "artifacts:type:{test_type}", "artifacts:run:{run_id}")
+    ARTIFACT_BUILT = "artifacts:_built"
+
+    def _artifact_indexes(self, meta: dict) -> List[str]:
+        return [index.format(**meta) for index in self.ARTIFACT_INDEXES]
+
+    def _ensure_artifact_index(self):
+        """首次使用时为已有记录 (索引引入前写入的) 补建索引"""
+        if self.store.get(self.ARTIFACT_BUILT): return
+        keys = self.store.keys("artifact:")
+        for val in self.store.mget(keys):
+            if not val: continue
+            meta = json.loads(val)
+            ts = meta.get("created_ts") or datetime.datetime.strptime(meta["created"], "%Y-%m-%d %H:%M:%S").timestamp()
+            for index in self._artifact_indexes(meta): self.store.zadd(index, {f"{meta['server_id']}:{meta['artifact_id']}": ts})
+        self.store.set(self.ARTIFACT_BUILT, "1")
+
+    def save_artifact(self, meta: dict):
+        self._ensure_artifact_index()
+        member = f"{meta['server_id']}:{meta['artifact_id']}"
+        self.store.set(f"artifact:{member}", json.dumps(meta, ensure_ascii=False))
+        for index in self._artifact_indexes(meta): self.store.zadd(index, {member: meta["created_ts"]})
+
+    def get_artifact(self, server_id: str, artifact_id: str) -> dict | None:
+        val = self.store.get(f"artifact:{server_id}:{artifact_id}")
+        return json.loads(val) if val else None
+
+    def list_artifacts(self, server_id: str = "", test_type: str = "", run_id: str = "") -> List[dict]:
+        """按创建时间倒序；走最窄的索引 (运行 > 服务器 > 类型 > 全部)，其余条件在取回的记录上过滤"""
+        self._ensure_artifact_index()
+        index = (f"artifacts:run:{run_id}" if run_id else f"artifacts:server:{server_id}" if server_id
+                 else f"artifacts:type:{test_type}" if test_type else "artifacts:all")
+        members = self.store.zrange_by_score(index, 0, float("inf"))
+        items = [json.loads(v) for v in self.store.mget([f"artifact:{m}" for m in members]) if v]
+        return [a for a in items if (not server_id or a["server_id"] == server_id)
+                and (not test_type or a["test_type"] == test_type) and (not run_id or a["run_id"] == run_id)]
+
+    def delete_artifact(self, meta: dict):
+        member = f"{meta['server_id']}:{meta['artifact_id']}"
+        self.store.delete(f"artifact:{member}")
+        for index in self._artifact_indexes(meta): self.store.zrem(index, member)
 
 # 初始化一个全局 DB 对象供外部调用
 db = Database()
\ No newline at end of file
@@ -0,0 +1,26 @@
+# lazy.py
+# 延迟导入：第一次访问模块属性时才真正加载 (服务模块依赖 paramiko / requests 等较重的库，不拖慢进程启动)
+# 属性访问直接转发到真实模块，对真实模块的修改 (如测试中替换函数) 同样生效
+import importlib
+import threading
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None: self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{' (loaded)' if self._module else ''}>"
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
@@ -1,30 +1,184 @@
 # logger.py
+# 异步日志管道：请求线程只把记录放进队列，由后台 QueueListener 线程写文件/控制台
+import atexit
+import collections
+import contextvars
+import functools
+import inspect
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from config import LOG_QUEUE_SIZE, LOG_RING_SIZE, LOG_RATE_PER_SERVER, LOG_RATE_BURST
 
-# 1. 自动创建日志目录
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+# 1. 日志目录在第一次写文件时创建 (见 LazyRotatingFileHandler)，导入本模块不做文件系统操作
+class LazyRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
 
-# 2. 定义日志格式
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+# --- 2. 日志上下文 (server_id / action / job_id)，由路由包装器在每个请求内设置 ---
+_log_context = contextvars.ContextVar("log_context", default={})
+
+class log_context:
+    """with log_context(server_id="S01", action="reboot_deploy"): ... 内部所有日志自动带上这些字段"""
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __enter__(self):
+        self._token = _log_context.set({**_log_context.get(), **self.fields})
+        return self
+
+    def __exit__(self, *exc):
+        _log_context.reset(self._token)
+
+def bind_log_context(route: str, endpoint):
+    """包装路由函数：按路径参数和路由模板设置日志上下文，并生成 job_id"""
+    if getattr(endpoint, "__log_bound__", False): return endpoint
+
+    def fields(kwargs):
+        # Webhook 等路由的 server_id 在请求体里
+        server_id = kwargs.get("server_id") or getattr(kwargs.get("data"), "server_id", None)
+        return {"server_id": server_id, "action": route, "job_id": uuid.uuid4().hex[:8]}
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            with log_context(**fields(kwargs)):
+                return await endpoint(*args, **kwargs)
+        async_wrapper.__log_bound__ = True
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def sync_wrapper(*args, **kwargs):
+        with log_context(**fields(kwargs)):
+            return endpoint(*args, **kwargs)
+    sync_wrapper.__log_bound__ = True
+    return sync_wrapper
+
+class ContextFilter(logging.Filter):
+    """把上下文字段写入记录 (extra 显式传入的优先)"""
+    def filter(self, record):
+        ctx = _log_context.get()
+        for key in ("server_id", "action", "job_id"):
+            if getattr(record, key, None) is None:
+                setattr(record, key, ctx.get(key))
+        return True
+
+# --- 3. 按服务器限流 (令牌桶，WARNING 及以上不限流) ---
+class ServerRateLimitFilter(logging.Filter):
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate, self.burst = rate, burst
+        self._buckets = {}  # server_id -> [tokens, last_time, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING: return True
+        key = record.server_id or "_backend"
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(key, [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.msg = f"{record.msg} (此前限流丢弃 {bucket[2]} 条)"
+                bucket[2] = 0
+        return True
+
+# --- 4. 非阻塞入队 (队列满时丢弃，绝不阻塞请求线程) ---
+class DroppingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+# --- 5. 结构化 JSON 格式 ---
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record_to_dict(record), ensure_ascii=False)
+
+def record_to_dict(record) -> dict:
+    return {
+        "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+        "level": record.levelname,
+        "msg": record.getMessage(),
+        "server_id": getattr(record, "server_id", None),
+        "action": getattr(record, "action", None),
+        "job_id": getattr(record, "job_id", None),
+        "file": f"{record.filename}:{record.lineno}",
+    }
+
+# --- 6. 内存环形缓冲 (按服务器查询最近日志) ---
+class RingBufferHandler(logging.Handler):
+    def __init__(self, size: int):
+        super().__init__()
+        self.size = size
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        entry = record_to_dict(record)
+        key = entry["server_id"] or "_backend"
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = collections.deque(maxlen=self.size)
+            buf.append(entry)
+
+    def recent(self, server_id: str, limit: int = 100, level: str = None) -> list:
+        """level 为最低级别名 (如 WARNING)；未知级别抛 ValueError"""
+        if level and level.upper() not in logging._nameToLevel: raise ValueError(f"未知日志级别: {level}")
+        min_level = logging._nameToLevel[level.upper()] if level else 0
+        with self._lock:
+            entries = list(self._buffers.get(server_id, ()))
+        if min_level:
+            entries = [e for e in entries if logging.getLevelName(e["level"]) >= min_level]
+        return entries[-limit:][::-1]
+
+# 7. 输出端 (均在 QueueListener 线程中执行)
 log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
 
-# 3. 文件输出 (logs/backend.log)
-file_handler = RotatingFileHandler('logs/backend.log', maxBytes=10*1024*1024, backupCount=5, encoding='utf-8')
-file_handler.setFormatter(log_formatter)
+# 文件输出 (logs/backend.log，JSON Lines)
+file_handler = LazyRotatingFileHandler('logs/backend.log', maxBytes=10*1024*1024, backupCount=5, encoding='utf-8')
+file_handler.setFormatter(JsonFormatter())
 file_handler.setLevel(logging.INFO)
 
-# 4. 控制台输出 (黑窗口也能看)
+# 控制台输出 (黑窗口也能看)
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(log_formatter)
 console_handler.setLevel(logging.INFO)
 
-# 5. 初始化 Logger
+ring_handler = RingBufferHandler(LOG_RING_SIZE)
+ring_handler.setLevel(logging.DEBUG)
+
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+queue_handler.addFilter(ContextFilter())
+queue_handler.addFilter(ServerRateLimitFilter(LOG_RATE_PER_SERVER, LOG_RATE_BURST))
+
+listener = QueueListener(log_queue, file_handler, console_handler, ring_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+# 8. 初始化 Logger
 logger = logging.getLogger("MonitorLogger")
-logger.setLevel(logging.INFO)
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger.setLevel(logging.DEBUG)
+logger.addHandler(queue_handler)
 
 # 防止重复打印
-logger.propagate = False
\ No newline at end of file
+logger.propagate = False
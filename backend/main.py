@@ -1,12 +1,20 @@
-import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 # 1. 关键：从 routes.py 导入 router
 # 如果这行报错，说明你的 routes.py 文件名不对，或者不在同一个文件夹下
 from routes import router as api_router
 
-app = FastAPI(title="自动化测试监控平台 API", version="3.0")
+# 启动/关闭由 lifespan 统一管理 (见第 4 节)：导入本模块不连接存储、不启动线程，worker 进程可立即完成导入
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_background_tasks()
+    yield
+    stop_background_tasks()
+
+app = FastAPI(title="自动化测试监控平台 API", version="3.0", lifespan=lifespan)
 
 # 2. 配置跨域
 app.add_middleware(
@@ -16,11 +24,94 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 2.0 大响应按 Accept-Encoding 自动 gzip 压缩 (浏览器默认支持)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# 2.1 请求耗时统计 (按路由模板聚合，避免 server_id 撑爆标签)
+import sys
+import time
+from fastapi import Request
+from metrics import HTTP_REQUEST_SECONDS
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=route.path if route else "unmatched", status=status)
 
 # 3. 核心：挂载路由！
 # 这一行如果不写，所有的接口都会报 404
 app.include_router(api_router)
 
+# 3.1 服务器操作冲突 -> 409 (running 为正在执行的操作名，供前端提示)
+from fastapi.responses import JSONResponse
+from coordination import LockBusyError, leader
+
+@app.exception_handler(LockBusyError)
+async def lock_busy_handler(request: Request, exc: LockBusyError):
+    return JSONResponse(status_code=409, content={"success": False, "message": str(exc), "running": getattr(exc, "running", "")})
+
+# 4. 后台定时任务 (在线探测 / BMC 带外轮询 / 批量启动推进 / 远程日志增量抓取 / 产物保留 / 内嵌存储快照)
+# 多 worker 时探测与抓取只在 Leader 上执行；快照属于本进程存储，每个进程各自执行
+# 服务模块延迟加载：注册时不导入，第一次执行任务时才加载 (在后台线程中，不阻塞启动)
+import scheduler
+from config import SCRAPE_INTERVAL, STORAGE_SNAPSHOT_INTERVAL, PROBE_TICK, REDFISH_INTERVAL, CAMPAIGN_TICK, ARTIFACT_GC_INTERVAL, STORAGE_BACKEND, UVICORN_WORKERS
+from database import db
+from lazy import lazy_import
+service_scraper = lazy_import("services.logscraper")
+service_probe = lazy_import("services.probe")
+service_redfish = lazy_import("services.redfish")
+service_campaign = lazy_import("services.campaign")
+artifacts = lazy_import("artifacts")
+
+scheduler.register("probe", PROBE_TICK, lambda: service_probe.probe_due())
+scheduler.register("redfish", REDFISH_INTERVAL, lambda: service_redfish.poll_all())
+scheduler.register("campaign", CAMPAIGN_TICK, lambda: service_campaign.tick_all())
+scheduler.register("logscraper", SCRAPE_INTERVAL, lambda: service_scraper.scrape_all())
+scheduler.register("artifacts", ARTIFACT_GC_INTERVAL, lambda: artifacts.enforce_retention())
+scheduler.register("snapshot", STORAGE_SNAPSHOT_INTERVAL, lambda: db.store.snapshot(), leader_only=False)
+scheduler.set_leader_check(lambda: leader.is_leader)
+
+class Lifecycle:
+    started_at = 0.0   # 启动完成的时间 (0 表示尚未就绪)
+    startup_ms = 0.0   # lifespan 初始化耗时
+
+def start_background_tasks():
+    start = time.perf_counter()
+    db.open()  # 创建连接池 / 加载快照，并订阅变更
+    leader.start()
+    scheduler.start_all()
+    Lifecycle.startup_ms = (time.perf_counter() - start) * 1000
+    Lifecycle.started_at = time.time()
+
+def stop_background_tasks():
+    Lifecycle.started_at = 0.0
+    scheduler.stop_all()
+    if "services.redfish" in sys.modules: service_redfish.close_all()  # 未加载过说明没有会话
+    leader.stop()
+    if db.is_open: db.store.close()
+
+# 4.1 存活 / 就绪探针 (不经过业务路由包装，不计入剖析)
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """进程存活即返回 200"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """启动完成且存储可达时返回 200，否则 503 (负载均衡据此摘除实例)"""
+    checks = {"startup": Lifecycle.started_at > 0, "store": db.is_open and db.store.ping()}
+    ready = all(checks.values())
+    body = {"ready": ready, "checks": checks, "startup_ms": round(Lifecycle.startup_ms, 1), "leader": leader.is_leader}
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 # 👇👇👇 必须加上这一段！没有它，脚本就是哑巴 👇👇👇
 if __name__ == "__main__":
     print("------------------------------------------------")
@@ -31,6 +122,12 @@ if __name__ == "__main__":
         print(f"   - {route.path}")
     print("------------------------------------------------")
     
+    # 启动服务！memory 后端的数据在进程内，只能单 worker 运行
     import uvicorn
-    # 启动服务！
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = UVICORN_WORKERS if STORAGE_BACKEND == "redis" else 1
+    if workers != UVICORN_WORKERS:
+        print(f"⚠️ STORAGE_BACKEND={STORAGE_BACKEND} 不支持多 worker，已按单 worker 启动")
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
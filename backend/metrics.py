@@ -0,0 +1,103 @@
+# metrics.py
+# 轻量 Prometheus 指标 (无第三方依赖)：Counter / Histogram + 文本格式导出
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_str(names, values) -> str:
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+# --- 1. 计数器 ---
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+# --- 2. 直方图 ---
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket_counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_str(self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+# --- 3. 注册表 ---
+_registry = []
+
+def counter(name, help_text, labels=()) -> Counter:
+    m = Counter(name, help_text, labels)
+    _registry.append(m)
+    return m
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    m = Histogram(name, help_text, labels, buckets)
+    _registry.append(m)
+    return m
+
+def render_all() -> str:
+    lines = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# --- 4. 后端指标定义 ---
+HTTP_REQUEST_SECONDS = histogram("monitor_http_request_seconds", "HTTP 请求耗时", ("method", "route", "status"))
+SSH_PHASE_SECONDS = histogram("monitor_ssh_phase_seconds", "SSH 各阶段耗时 (connect/exec/sftp_put/sftp_get)", ("phase",))
+PING_SECONDS = histogram("monitor_ping_seconds", "Ping 探测耗时", ("result",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5))
+REDIS_OP_SECONDS = histogram("monitor_redis_op_seconds", "Redis 命令耗时", ("op",),
+                             buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+PROBES = counter("monitor_probes_total", "在线探测次数 (按探测节奏分类)", ("cadence",))
+WEBHOOK_REPORTS = counter("monitor_webhook_reports_total", "Webhook 上报次数", ("server_id", "task_type"))
@@ -1,5 +1,25 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
+
+# --- 0. 重启耗时统计 (流式均值/方差 + CUSUM 变点检测) ---
+class BootStats(BaseModel):
+    samples: int = 0          # 已统计的轮次数
+    mean: float = 0.0         # 单轮耗时均值 (秒)
+    m2: float = 0.0           # Welford 累积平方差
+    last: float = 0.0         # 最近一轮耗时
+    anchor_loop: int = -1     # 上一次汇报的轮次
+    anchor_ts: float = 0.0    # 上一次汇报轮次的时间戳
+    cusum_pos: float = 0.0    # CUSUM 上漂移累积量
+    cusum_neg: float = 0.0    # CUSUM 下漂移累积量
+    anomaly: str = ""         # "" / spike / drift_up / drift_down
+    anomaly_loop: str = "-"   # 触发异常的轮次
+
+# --- 0.1 NUMA 节点 (用于 memtest / stressapptest 放置计划) ---
+class NumaNode(BaseModel):
+    node: int
+    cpus: List[int] = []
+    mem_free_mb: int = 0
+    mem_total_mb: int = 0
 
 # --- 1. 服务器模型 (包含 AC 字段) ---
 class ServerSchema(BaseModel):
@@ -7,12 +27,20 @@ class ServerSchema(BaseModel):
     bmc_ip: str
     os_ip: Optional[str] = None
     ssh_user: str = "root"
-    ssh_password: str = "1"
+    ssh_password: str = "1"       # 已下发密钥后可清空 (见 ssh_key_fp)
+    ssh_key_fp: str = ""          # 已下发并验证过的后端公钥指纹，为空表示仍用密码登录
     
     status: str = "Idle"
     description: str = ""
     bmc_online: bool = False
     os_online: bool = False
+
+    # --- BMC 带外状态 (Redfish 轮询，未配置 bmc_user 时不轮询) ---
+    bmc_user: str = ""
+    bmc_password: str = ""
+    bmc_power_state: str = ""    # On / Off / PoweringOn / PoweringOff
+    bmc_boot_progress: str = ""  # BootProgress.LastState，如 MemoryInitializationStarted / OSRunning
+    bmc_post_code: str = ""      # 未进入 OS 时最近的 POST 码
     
     # --- Reboot 状态 ---
     reboot_status: str = "Idle"
@@ -23,18 +51,84 @@ class ServerSchema(BaseModel):
     memtest_status: str = "Idle"
     memtest_phase: str = "未部署"
     memtest_runtime_configured: str = "3600"
+    memtest_mode: str = "gui"  # gui: 桌面终端执行 / headless: supervisor 后台执行
+    memtest_patterns: Dict[str, List[int]] = Field(default_factory=dict)  # {测试项: [通过数, 失败数]}
+    memtest_fail_count: int = 0
+    edac_ce: int = 0          # EDAC 可纠正错误数
+    edac_ue: int = 0          # EDAC 不可纠正错误数
+    mce_count: int = 0        # dmesg 中的 MCE 记录数
 
     # --- ✅ ACReboot 专属字段 ---
     ac_ip: str = ""          # AC 盒子 IP
     ac_socket: str = "1"     # AC 插座号
     ac_temp_ip: str = ""     # 临时 OS IP
+    ac_status: str = "Idle"
+    ac_phase: str = "未部署"
+    ac_loop: str = "-"
+
+    # --- 当前运行 (测试类型 -> run_id，见 RunSchema) ---
+    active_runs: Dict[str, str] = Field(default_factory=dict)
+
+    # --- NUMA 拓扑 (部署/启动时采集) ---
+    numa_nodes: List[NumaNode] = Field(default_factory=list)
+    numa_updated: str = "-"
+
+    # --- 重启耗时统计 ---
+    boot_stats: BootStats = Field(default_factory=BootStats)
+
+    # --- 远程日志抓取 ---
+    log_error_count: int = 0  # 累计发现的错误特征数
+    last_log_error: str = ""  # 最近一次错误摘要
     
     last_report_time: str = "-"
 
+    # 存储版本号 (每次写入由存储分配，全局递增；不随数据保存)
+    version: int = 0
+
+# --- 1.1 批量启动活动 (错峰启动 reboot / acreboot，状态持久化在存储中) ---
+class CampaignSchema(BaseModel):
+    campaign_id: str = ""
+    test_type: str = "reboot"        # reboot / acreboot
+    server_ids: List[str]
+    stagger: float = 30.0            # 相邻两台启动的最小间隔 (秒)
+    max_in_reboot: int = 4           # 同时处于重启中 (OS 不可达) 的上限，达到上限时暂缓启动下一台
+    state: str = "Running"           # Running / Paused / Finished / Cancelled
+    pending: List[str] = Field(default_factory=list)         # 尚未启动 (按顺序)
+    launched: Dict[str, float] = Field(default_factory=dict) # server_id -> 启动时间戳
+    failed: Dict[str, str] = Field(default_factory=dict)     # server_id -> 失败原因
+    next_launch_ts: float = 0.0
+    created: str = "-"
+
+# --- 1.2 测试运行 (每次启动一条记录，按服务器 / 类型 / 开始时间建索引) ---
+class RunSchema(BaseModel):
+    run_id: str = ""
+    server_id: str
+    test_type: str                   # reboot / acreboot / memtest
+    params: Dict[str, str] = Field(default_factory=dict)  # 启动参数 (memtest 时长/模式、AC 插座等)
+    status: str = "Running"          # Running / Finished / Stopped / Error / Aborted
+    outcome: str = ""                # 结束后: pass / fail / aborted
+    phase: str = ""
+    loop: str = "-"
+    reports: int = 0                 # 归属本次运行的 Webhook 数
+    errors: int = 0                  # 归属本次运行的日志错误特征数
+    last_error: str = ""
+    started_ts: float = 0.0
+    ended_ts: float = 0.0
+    started: str = "-"
+    ended: str = "-"
+    last_report: str = "-"
+
 # --- 2. ✅ Webhook 模型 (补回这个类) ---
 class WebhookSchema(BaseModel):
     server_id: str
-    task_type: str = "reboot"  # 'reboot' 或 'memtest'
+    task_type: str = "reboot"  # 'reboot' / 'acreboot' / 'memtest'
+    run_id: Optional[str] = None  # 可选；不带时归属该类型的当前运行
     status: str                # Running, Finished, Error
     phase: str                 # 当前阶段描述
-    loop: str = "-"            # 当前轮次
\ No newline at end of file
+    loop: str = "-"            # 当前轮次
+    loop_ts: Optional[float] = None  # reboot_all_times 的更新时间 (epoch 秒)
+    # Memtest 硬件错误计数 (memtest_daemon.sh 上报，均为测试开始以来的增量)
+    edac_ce: Optional[int] = None
+    edac_ue: Optional[int] = None
+    mce_count: Optional[int] = None
+    memtest_patterns: Optional[Dict[str, List[int]]] = None  # 本次测试的分项累计 {测试项: [通过, 失败]}
\ No newline at end of file
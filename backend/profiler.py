@@ -0,0 +1,197 @@
+# profiler.py
+# 运行时可开关的性能剖析：按路由采样 / 确定性剖析，输出 flamegraph 可用的折叠栈 (collapsed stacks)
+# 关闭时每个请求只多一次 `session is None` 判断
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from fastapi.routing import APIRoute
+from logger import logger
+
+# --- 1. 栈帧标签 ---
+def _code_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def _cfunc_label(func) -> str:
+    return f"<{getattr(func, '__qualname__', repr(func))}>"
+
+# --- 2. 剖析会话 ---
+class ProfileSession:
+    def __init__(self, mode: str, routes, duration: float, max_requests, interval: float):
+        self.mode = mode                      # sampling / deterministic
+        self.routes = set(routes or [])       # 为空表示所有路由
+        self.deadline = time.time() + duration
+        self.remaining = max_requests         # None 表示不限请求数
+        self.interval = interval
+        self.started_at = time.time()
+        self.requests = 0
+        self.stacks = {}                      # 折叠栈 -> 样本数 (sampling) / 微秒 (deterministic)
+        self.threads = {}                     # 采样模式: 线程 ID -> 路由
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def matches(self, route: str) -> bool:
+        return not self.routes or route in self.routes
+
+    def expired(self) -> bool:
+        return time.time() >= self.deadline or (self.remaining is not None and self.remaining <= 0)
+
+    def add(self, stack: str, value: float):
+        with self.lock:
+            self.stacks[stack] = self.stacks.get(stack, 0) + value
+
+    def collapsed(self) -> str:
+        with self.lock:
+            items = sorted(self.stacks.items())
+        return "\n".join(f"{stack} {int(value)}" for stack, value in items if value >= 1) + "\n"
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode, "routes": sorted(self.routes), "requests": self.requests,
+            "remaining": self.remaining, "started_at": self.started_at,
+            "deadline": self.deadline, "stacks": len(self.stacks), "running": not self.stopped.is_set(),
+        }
+
+# --- 3. 确定性剖析：sys.setprofile 记录每个函数的自身耗时 (微秒) ---
+class _TraceCollector:
+    def __init__(self, session: ProfileSession, root: str):
+        self.session = session
+        self.stack = [[root, time.perf_counter(), 0.0]]  # [标签, 开始时间, 子调用耗时]
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call" or event == "c_call":
+            label = _code_label(frame.f_code) if event == "call" else _cfunc_label(arg)
+            self.stack.append([label, now, 0.0])
+        elif len(self.stack) > 1:  # return / c_return / c_exception
+            self._pop(now)
+
+    def _pop(self, now):
+        label, start, child = self.stack.pop()
+        elapsed = now - start
+        self.stack[-1][2] += elapsed
+        path = ";".join(e[0] for e in self.stack) + ";" + label
+        self.session.add(path, (elapsed - child) * 1e6)
+
+    def finish(self):
+        now = time.perf_counter()
+        while len(self.stack) > 1: self._pop(now)
+        label, start, child = self.stack[0]
+        self.session.add(label, (now - start - child) * 1e6)
+
+# --- 4. 采样剖析：后台线程定时抓取目标线程的调用栈 ---
+def _sample_loop(session: ProfileSession):
+    while not session.stopped.wait(session.interval):
+        if session.expired():
+            profiler.stop()
+            return
+        frames = sys._current_frames()
+        with session.lock:
+            targets = list(session.threads.items())
+        for tid, route in targets:
+            frame = frames.get(tid)
+            stack = []
+            while frame is not None:
+                stack.append(_code_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                session.add(f"route:{route};" + ";".join(reversed(stack)), 1)
+
+# --- 5. 全局开关 ---
+class Profiler:
+    def __init__(self):
+        self.session = None
+        self.last = None
+        self._lock = threading.Lock()
+
+    def start(self, mode="sampling", routes=None, duration=60.0, max_requests=None, interval=0.005):
+        with self._lock:
+            if self.session: raise RuntimeError("已有剖析会话在运行")
+            session = ProfileSession(mode, routes, duration, max_requests, interval)
+            self.session = session
+        if mode == "sampling":
+            threading.Thread(target=_sample_loop, args=(session,), name="profiler-sampler", daemon=True).start()
+        logger.info(f"[Profiler] 开始 {mode} 剖析: routes={sorted(session.routes) or 'ALL'}, "
+                    f"duration={duration}s, requests={max_requests}")
+        return session
+
+    def stop(self):
+        with self._lock:
+            session, self.session = self.session, None
+            if session:
+                session.stopped.set()
+                self.last = session
+        if session: logger.info(f"[Profiler] 剖析结束: {session.requests} 个请求, {len(session.stacks)} 条栈")
+        return session
+
+    def _enter(self, route: str):
+        """请求开始时判定是否纳入剖析，返回会话或 None"""
+        session = self.session
+        if session is None or not session.matches(route): return None
+        if session.expired():
+            self.stop()
+            return None
+        with session.lock:
+            if session.remaining is not None:
+                if session.remaining <= 0: return None
+                session.remaining -= 1
+            session.requests += 1
+        return session
+
+    def _begin(self, session, route):
+        if session.mode == "deterministic":
+            collector = _TraceCollector(session, f"route:{route}")
+            sys.setprofile(collector)
+            return collector
+        with session.lock:
+            session.threads[threading.get_ident()] = route
+        return None
+
+    def _end(self, session, collector):
+        if collector:
+            sys.setprofile(None)
+            collector.finish()
+        else:
+            with session.lock:
+                session.threads.pop(threading.get_ident(), None)
+        if session.expired(): self.stop()
+
+    def wrap(self, route: str, endpoint):
+        """
+        包装路由函数：关闭时直接调用，开启时在执行线程内剖析。
+        注意 async 路由在确定性模式下会同时记录事件循环上并发执行的其它协程。
+        """
+        if getattr(endpoint, "__profiled__", False): return endpoint  # include_router 会重复注册
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                session = self.session and self._enter(route)
+                if not session: return await endpoint(*args, **kwargs)
+                collector = self._begin(session, route)
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    self._end(session, collector)
+            async_wrapper.__profiled__ = True
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def sync_wrapper(*args, **kwargs):
+            session = self.session and self._enter(route)
+            if not session: return endpoint(*args, **kwargs)
+            collector = self._begin(session, route)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                self._end(session, collector)
+        sync_wrapper.__profiled__ = True
+        return sync_wrapper
+
+profiler = Profiler()
+
+# --- 6. 路由类：注册时自动包装 endpoint ---
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiler.wrap(path, endpoint), **kwargs)
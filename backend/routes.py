@@ -1,24 +1,54 @@
-from fastapi import APIRouter, HTTPException, Body
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+import hashlib
+import io
 import os
+import tempfile
+import time
 from typing import List
 
 # ✅ 引入新的 Redis DB 对象
 from database import db
-from models import ServerSchema, WebhookSchema
-from utils import ping_ip
+from models import ServerSchema, WebhookSchema, BootStats, CampaignSchema
+import metrics
+import codec
+from profiler import profiler, ProfiledRoute
+from logger import bind_log_context, ring_handler
+from coordination import server_action
+from config import REMOTE_GC_KEEP_DAYS
+import artifacts
+from services.memparse import max_pattern_counts
 
-# 引入业务服务
-from services import reboot as service_reboot
-from services import memtest as service_memtest
-from services import meminfo as service_meminfo
-from services import acreboot as service_ac
+# 引入业务服务 (延迟加载：第一次调用时才导入，paramiko 等依赖不拖慢启动)
+from lazy import lazy_import
+service_reboot = lazy_import("services.reboot")
+service_memtest = lazy_import("services.memtest")
+service_meminfo = lazy_import("services.meminfo")
+service_ac = lazy_import("services.acreboot")
+service_boottime = lazy_import("services.boottime")
+service_scraper = lazy_import("services.logscraper")
+service_numa = lazy_import("services.numaplan")
+service_probe = lazy_import("services.probe")
+service_campaign = lazy_import("services.campaign")
+service_archive = lazy_import("services.archive")
+service_runs = lazy_import("services.runs")
+service_inventory = lazy_import("services.inventory")
+service_credentials = lazy_import("services.credentials")
+sshkeys = lazy_import("sshkeys")
 
-router = APIRouter()
+class MonitorRoute(ProfiledRoute):
+    """注册路由时绑定日志上下文 (server_id / action / job_id)，再交给剖析器包装"""
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, bind_log_context(path, endpoint), **kwargs)
+
+router = APIRouter(route_class=MonitorRoute)
+
+MEMTEST_MODES = ("gui", "headless")
 
 # --- 1. 监控刷新接口 (核心修复版) ---
 @router.post("/monitor/refresh")
-def refresh_status():
+def refresh_status(request: Request, fmt: str = "full"):
     """
     修复说明：
     之前版本在 Ping 耗时期间持有旧的 Server 对象，Ping 完后强行覆盖写入，
@@ -26,45 +56,67 @@ def refresh_status():
     
     现在改为：
     1. 拿快照 -> 2. Ping (耗时) -> 3. 重新 fetch 最新对象 -> 4. 更新 Ping 结果 -> 5. 写入
+    后台 probe 任务已定期执行同样的探测，前端轮询请使用 GET /servers。
     """
-    # 1. 获取所有服务器的快照 (仅用于获取 IP 列表)
-    servers_snapshot = db.get_all_servers()
-    results = []
-    
-    # 2. 执行 Ping 操作 (耗时操作，此时不锁库，允许 Webhook 并发写入)
-    ping_results = {}
-    for s_id, server in servers_snapshot.items():
-        bmc_alive = ping_ip(server.bmc_ip)
-        # 如果配置了 OS IP 才 ping，否则默认为 False
-        os_alive = ping_ip(server.os_ip) if server.os_ip else False
-        ping_results[s_id] = (bmc_alive, os_alive)
-    
-    # 3. 【关键步骤】Ping 结束后，逐个获取最新的 Server 对象进行更新
-    for s_id, (bmc_alive, os_alive) in ping_results.items():
-        latest_server = db.get_server(s_id)
-        if not latest_server: 
-            continue # 防止 Ping 期间服务器被删了
-        
-        # 4. 只更新 Ping 相关的字段
-        latest_server.bmc_online = bmc_alive
-        
-        # OS 在线状态判断逻辑
-        if os_alive:
-            latest_server.os_online = True
-        else:
-            # Ping 不通，直接置为 False
-            # (前端会根据 reboot_status='Running' && os_online=False 显示为'重启中')
-            latest_server.os_online = False
+    # 1. 拿快照并发 Ping -> 2. 逐个重新获取最新对象 -> 3. 仅在线状态变化时写入 (见 services/probe.py)
+    results = service_probe.probe_all()
 
-        # 5. 写入数据库 (此时覆盖风险极低，因为从 get 到 upsert 只有极短时间)
-        db.upsert_server(latest_server)
-        results.append(latest_server)
-    
-    return {"results": [s.model_dump() for s in results]}
+    # fmt=compact 返回省略默认值 + 状态码的紧凑格式；Accept: application/msgpack 返回二进制
+    return codec.render_servers(results, request, fmt)
+
+# --- 1.1 机群列表 (分页 / 过滤 / 字段选择 / ETag) ---
+# 每种测试模式的"状态"过滤对应的字段
+MODE_STATUS_FIELD = {"reboot": "reboot_status", "acreboot": "ac_status", "memtest": "memtest_status", "meminfo": "status"}
+MAX_PAGE_SIZE = 500
+
+@router.get("/servers")
+def list_servers(request: Request, mode: str = None, status: str = None, online: bool = None,
+                 page: int = 1, page_size: int = 50, fields: str = None, since: int = None, fmt: str = "full"):
+    """
+    - mode + status: 按该模式的状态字段过滤 (如 mode=memtest&status=Running)
+    - 只给 mode: 返回该模式状态不为 Idle 的服务器 (运行中 / 已结束 / 出错，即跑过该测试的)
+    - online: 按 OS 在线状态过滤
+    - fields: 逗号分隔的字段列表，server_id 与 version 总是返回
+    - since: 只返回版本号大于 since 的服务器，另附本页全部 ID 供客户端剔除已删除项
+    - If-None-Match: 机群版本未变时返回 304
+    """
+    if mode is not None and mode not in MODE_STATUS_FIELD: raise HTTPException(400, f"未知模式: {mode}")
+    page, page_size = max(1, page), min(max(1, page_size), MAX_PAGE_SIZE)
+
+    # 先取版本号再读数据：期间若有写入，下次轮询 ETag 必然不同
+    version = db.fleet_version()
+    etag = 'W/"%d-%s"' % (version, hashlib.md5(str(request.query_params).encode()).hexdigest()[:8])
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    servers = sorted(db.get_all_servers().values(), key=lambda s: s.server_id)
+    field = MODE_STATUS_FIELD.get(mode, "status")
+    if status is not None:
+        servers = [s for s in servers if getattr(s, field) == status]
+    elif mode is not None:
+        servers = [s for s in servers if getattr(s, field) != "Idle"]
+    if online is not None:
+        servers = [s for s in servers if s.os_online == online]
+
+    total = len(servers)
+    page_items = servers[(page - 1) * page_size: page * page_size]
+    changed = [s for s in page_items if since is None or s.version > since]
+
+    include = None
+    if fields:
+        include = {f.strip() for f in fields.split(",") if f.strip() in ServerSchema.model_fields} | {"server_id", "version"}
+    items = [codec.dump_server(s, fmt, include) for s in changed]
+
+    body = {"version": version, "total": total, "page": page, "page_size": page_size, "items": items}
+    if since is not None: body["ids"] = [s.server_id for s in page_items]
+    if fmt == "compact": body["codes"] = codec.codes_table()
+    # no-cache: 浏览器每次都带 If-None-Match 重新验证
+    return codec.render_body(body, request, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 # --- 2. Webhook 回调 ---
 @router.post("/report/webhook")
 def receive_report(data: WebhookSchema):
+    metrics.WEBHOOK_REPORTS.inc(server_id=data.server_id, task_type=data.task_type)
     # 从 Redis 获取最新对象
     srv = db.get_server(data.server_id)
     if not srv:
@@ -77,12 +129,29 @@ def receive_report(data: WebhookSchema):
     if data.task_type == "memtest":
         srv.memtest_status = data.status
         srv.memtest_phase = data.phase
+        # 硬件错误计数 (旧版 daemon 不带这些字段)
+        if data.edac_ce is not None: srv.edac_ce = data.edac_ce
+        if data.edac_ue is not None: srv.edac_ue = data.edac_ue
+        if data.mce_count is not None: srv.mce_count = data.mce_count
+        # 分项计数随 Webhook 即时上报 (日志抓取周期较长)，与抓取结果逐项取较大值
+        if data.memtest_patterns is not None:
+            srv.memtest_patterns = max_pattern_counts(srv.memtest_patterns, data.memtest_patterns)
+            srv.memtest_fail_count = sum(fail for _, fail in srv.memtest_patterns.values())
     else:
-        # Reboot 任务
-        srv.reboot_status = data.status
-        srv.reboot_phase = data.phase
-        srv.reboot_loop = data.loop
+        # Reboot / ACReboot 任务 (状态字段分开，两种测试互不覆盖)
+        if data.task_type == "acreboot":
+            srv.ac_status, srv.ac_phase, srv.ac_loop = data.status, data.phase, data.loop
+        else:
+            srv.reboot_status, srv.reboot_phase, srv.reboot_loop = data.status, data.phase, data.loop
+        # 重启耗时统计 (O(1) 增量更新)
+        # (在拷贝上更新再整体替换：缓存对象的嵌套模型不可原地修改)
+        if data.loop_ts is not None:
+            stats = srv.boot_stats.model_copy()
+            service_boottime.update_boot_stats(srv.server_id, stats, data.loop, data.loop_ts)
+            srv.boot_stats = stats
 
+    # 归属到当前运行 (上报结束状态时关闭运行)
+    service_runs.attribute_report(srv, data)
     srv.last_report_time = now_str
     
     # ✅ 写回 Redis
@@ -91,17 +160,25 @@ def receive_report(data: WebhookSchema):
 
 # --- 3. Reboot 相关接口 (修复并发覆盖问题) ---
 @router.post("/servers/{server_id}/deploy")
+@server_action("reboot_deploy")
 def reboot_deploy(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404, "Server not found")
     
+    # 按 NUMA 拓扑计算 stressapptest 参数 (采集失败时沿用默认值)
+    nodes = service_numa.collect_topology(srv)
+    stress_args = service_numa.build_stress_args(nodes)
+    
     # 耗时操作
-    success, msg = service_reboot.deploy_reboot_scripts(srv)
+    success, msg = service_reboot.deploy_reboot_scripts(srv, stress_args)
     
     # 重新获取最新状态，防止覆盖
     if success:
         srv_latest = db.get_server(server_id)
         if srv_latest:
+            if nodes:
+                srv_latest.numa_nodes = nodes
+                srv_latest.numa_updated = service_numa.topology_timestamp()
             srv_latest.reboot_status = "Deployed"
             srv_latest.reboot_phase = "已部署"
             db.upsert_server(srv_latest)
@@ -109,12 +186,13 @@ def reboot_deploy(server_id: str):
     return {"success": success, "message": msg}
 
 @router.post("/servers/{server_id}/start_test")
-async def reboot_start(server_id: str):
+@server_action("reboot_start")
+def reboot_start(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     
     # 耗时操作 (SSH 连接)
-    success, msg = await service_reboot.start_reboot_test(srv)
+    success, msg = service_reboot.start_reboot_test(srv)
     
     # 重新获取最新状态
     if success:
@@ -122,17 +200,19 @@ async def reboot_start(server_id: str):
         if srv_latest:
             srv_latest.reboot_status = "Running"
             srv_latest.reboot_phase = "正在启动..."
+            service_runs.start_run(srv_latest, "reboot")
             db.upsert_server(srv_latest)
             
     return {"success": success, "message": msg}
 
 @router.post("/servers/{server_id}/stop_test")
-async def reboot_stop(server_id: str):
+@server_action("reboot_stop")
+def reboot_stop(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     
     # 耗时操作
-    success, msg = await service_reboot.stop_reboot_test(srv)
+    success, msg = service_reboot.stop_reboot_test(srv)
     
     # 重新获取最新状态
     if success:
@@ -140,17 +220,19 @@ async def reboot_stop(server_id: str):
         if srv_latest:
             srv_latest.reboot_status = "Stopped"
             srv_latest.reboot_phase = "用户已停止"
+            service_runs.finish_run(srv_latest, "reboot", "Stopped")
             db.upsert_server(srv_latest)
             
     return {"success": success, "message": msg}
 
 @router.post("/servers/{server_id}/reset_files")
-async def reboot_reset(server_id: str):
+@server_action("reboot_reset")
+def reboot_reset(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     
     # 耗时操作
-    success, msg = await service_reboot.reset_reboot_files(srv)
+    success, msg = service_reboot.reset_reboot_files(srv)
     
     # 重新获取最新状态
     if success:
@@ -159,12 +241,37 @@ async def reboot_reset(server_id: str):
             srv_latest.reboot_status = "Idle"
             srv_latest.reboot_phase = "环境已重置"
             srv_latest.reboot_loop = "-"
+            service_runs.finish_run(srv_latest, "reboot", "Aborted")
+            srv_latest.boot_stats = BootStats()
+            srv_latest.log_error_count = 0
+            srv_latest.last_log_error = ""
             db.upsert_server(srv_latest)
             
     return {"success": success, "message": msg}
 
+@router.get("/servers/{server_id}/boot_stats")
+def boot_stats_get(server_id: str):
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    stats = srv.boot_stats
+    return {
+        "samples": stats.samples, "mean": round(stats.mean, 2),
+        "std": round(service_boottime.boot_std(stats), 2), "last": round(stats.last, 2),
+        "anomaly": stats.anomaly, "anomaly_loop": stats.anomaly_loop,
+    }
+
+@router.post("/servers/{server_id}/boot_stats/ack")
+def boot_stats_ack(server_id: str):
+    """确认异常 (清除告警标记，保留统计基线)"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    srv.boot_stats = srv.boot_stats.model_copy(update={"anomaly": "", "anomaly_loop": "-"})
+    db.upsert_server(srv)
+    return {"success": True, "message": "告警已确认"}
+
 # --- 4. Memtest 相关接口 (同样加固) ---
 @router.post("/servers/{server_id}/memtest/deploy")
+@server_action("memtest_deploy")
 def memtest_deploy(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
@@ -181,24 +288,82 @@ def memtest_deploy(server_id: str):
     return {"success": success, "message": msg}
 
 @router.post("/servers/{server_id}/memtest/start")
+@server_action("memtest_start")
 def memtest_start(server_id: str, payload: dict = Body(...)):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     runtime = payload.get("runtime", "3600")
+    mode = payload.get("mode", srv.memtest_mode)
+    if mode not in MEMTEST_MODES: raise HTTPException(400, f"不支持的执行模式: {mode}")
+    
+    # 无界面模式按最新 NUMA 拓扑生成放置计划
+    nodes, plan = [], ""
+    if mode == "headless":
+        nodes = service_numa.collect_topology(srv)
+        plan = service_numa.format_memtest_plan(service_numa.build_memtest_plan(nodes))
     
-    success, msg = service_memtest.start_memtest(srv, str(runtime))
+    success, msg = service_memtest.start_memtest(srv, str(runtime), mode, plan)
     
     if success:
         srv_latest = db.get_server(server_id)
         if srv_latest:
+            if nodes:
+                srv_latest.numa_nodes = nodes
+                srv_latest.numa_updated = service_numa.topology_timestamp()
             srv_latest.memtest_status = "Running"
             srv_latest.memtest_phase = f"启动指令已发 (限时{runtime}s)"
             srv_latest.memtest_runtime_configured = str(runtime)
+            srv_latest.memtest_mode = mode
+            srv_latest.memtest_patterns = {}
+            srv_latest.memtest_fail_count = 0
+            srv_latest.edac_ce = srv_latest.edac_ue = srv_latest.mce_count = 0
+            service_runs.start_run(srv_latest, "memtest", {"runtime": runtime, "mode": mode})
             db.upsert_server(srv_latest)
             
     return {"success": success, "message": msg}
 
+@router.post("/servers/{server_id}/memtest/config")
+def memtest_config(server_id: str, payload: dict = Body(...)):
+    """保存 Memtest 执行模式 (gui / headless)"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    mode = payload.get("mode", "gui")
+    if mode not in MEMTEST_MODES: raise HTTPException(400, f"不支持的执行模式: {mode}")
+    srv.memtest_mode = mode
+    db.upsert_server(srv)
+    return {"success": True, "message": f"执行模式已设为 {mode}"}
+
+@router.post("/servers/{server_id}/numa/refresh")
+@server_action("numa_refresh")
+def numa_refresh(server_id: str):
+    """重新采集 NUMA 拓扑"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    nodes = service_numa.collect_topology(srv)
+    if not nodes: return {"success": False, "message": "拓扑采集失败"}
+    srv_latest = db.get_server(server_id)
+    if srv_latest:
+        srv_latest.numa_nodes = nodes
+        srv_latest.numa_updated = service_numa.topology_timestamp()
+        db.upsert_server(srv_latest)
+    return {"success": True, "message": f"采集到 {len(nodes)} 个 NUMA 节点"}
+
+@router.get("/servers/{server_id}/numa/plan")
+def numa_plan(server_id: str):
+    """查看基于已采集拓扑的放置计划"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    plan = service_numa.build_memtest_plan(srv.numa_nodes)
+    return {
+        "numa_nodes": [n.model_dump() for n in srv.numa_nodes],
+        "numa_updated": srv.numa_updated,
+        "memtest_plan": plan,
+        "memtest_total_mb": sum(p["mb"] for p in plan),
+        "stress_args": service_numa.build_stress_args(srv.numa_nodes),
+    }
+
 @router.post("/servers/{server_id}/memtest/archive")
+@server_action("memtest_archive")
 def memtest_archive(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
@@ -210,12 +375,15 @@ def memtest_archive(server_id: str):
         if srv_latest:
             srv_latest.memtest_status = "Finished"
             srv_latest.memtest_phase = "已归档"
+            service_runs.finish_run(srv_latest, "memtest", "Stopped",
+                                    failed=srv_latest.memtest_fail_count > 0 or srv_latest.edac_ue > 0)
             db.upsert_server(srv_latest)
             
     return {"success": success, "message": msg}
 
 # --- 5. MemInfo 相关接口 ---
 @router.post("/servers/{server_id}/meminfo/deploy")
+@server_action("meminfo_deploy")
 def meminfo_deploy(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
@@ -223,22 +391,62 @@ def meminfo_deploy(server_id: str):
     return {"success": success, "message": msg}
 
 @router.post("/servers/{server_id}/meminfo/run")
-async def meminfo_run(server_id: str):
+@server_action("meminfo_run")
+def meminfo_run(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
-    success, msg = await service_meminfo.run_meminfo(srv)
+    success, msg = service_meminfo.run_meminfo(srv)
     return {"success": success, "message": msg}
 
 @router.get("/servers/{server_id}/meminfo/download")
-async def meminfo_download(server_id: str):
+@server_action("meminfo_download")
+def meminfo_download(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
-    success, msg, path = await service_meminfo.download_meminfo_result(srv)
+    success, msg, artifact = service_meminfo.download_meminfo_result(srv)
     
-    if success and path and os.path.exists(path):
-        return FileResponse(path=path, filename=os.path.basename(path), media_type='text/plain')
+    if success and artifact and os.path.exists(artifact["path"]):
+        return FileResponse(path=artifact["path"], filename=artifact["name"], media_type='text/plain')
     return {"success": False, "message": msg or "文件不存在"}
 
+# --- 5.1 远程日志抓取 ---
+@router.post("/servers/{server_id}/logs/scrape")
+def logs_scrape(server_id: str):
+    """立即增量抓取一次 (不受定时任务的状态过滤限制)"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    events = service_scraper.scrape_and_record(srv, wait=service_scraper.MANUAL_WAIT)
+    return {"success": True, "message": f"抓取完成，新增 {len(events)} 条事件", "events": events}
+
+@router.get("/servers/{server_id}/logs/events")
+def logs_events(server_id: str, limit: int = 50):
+    if not db.get_server(server_id): raise HTTPException(404)
+    return {"events": db.get_log_events(server_id, limit)}
+
+@router.get("/servers/{server_id}/logs")
+def logs_recent(server_id: str, limit: int = 100, level: str = None):
+    """后端针对该服务器的最近日志 (内存环形缓冲，新的在前)"""
+    if not db.get_server(server_id): raise HTTPException(404)
+    try:
+        return {"logs": ring_handler.recent(server_id, limit, level)}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+# --- 5.1 BMC 带外轮询配置 ---
+@router.post("/servers/{server_id}/bmc/save_config")
+def bmc_save_config(server_id: str, payload: dict = Body(...)):
+    """保存 Redfish 凭据；清空用户名即停止轮询。列表接口不返回密码，未提供时保留原密码"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    
+    srv.bmc_user = payload.get("bmc_user", "")
+    srv.bmc_password = payload.get("bmc_password", srv.bmc_password) if srv.bmc_user else ""
+    if not srv.bmc_user:
+        srv.bmc_power_state = srv.bmc_boot_progress = srv.bmc_post_code = ""
+    
+    db.upsert_server(srv)
+    return {"success": True, "message": "BMC 配置已保存"}
+
 # ================= AC REBOOT 路由 =================
 
 @router.post("/servers/{server_id}/acreboot/save_config")
@@ -246,15 +454,20 @@ def acreboot_save_config(server_id: str, payload: dict = Body(...)):
     """保存 AC 配置 (IP, Socket, TempIP)"""
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
+    old = srv.model_copy()
     
     srv.ac_ip = payload.get("ac_ip", "")
     srv.ac_socket = payload.get("ac_socket", "1")
     srv.ac_temp_ip = payload.get("ac_temp_ip", "")
+    conflicts = db.identity_conflicts(srv)
+    if conflicts: raise HTTPException(409, "; ".join(conflicts))
     
     db.upsert_server(srv)
+    db.index_identities([srv], [old])
     return {"success": True, "message": "AC 配置已保存"}
 
 @router.post("/servers/{server_id}/acreboot/deploy")
+@server_action("ac_deploy")
 def acreboot_deploy(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
@@ -262,54 +475,228 @@ def acreboot_deploy(server_id: str):
     if not srv.ac_ip:
         return {"success": False, "message": "请先配置 AC 盒子 IP"}
         
-    success, msg = service_ac.deploy_ac_script(srv)
+    success, msg, steps = service_ac.deploy_ac_script(srv)
     
     if success:
         srv_latest = db.get_server(server_id)
         if srv_latest:
-            srv_latest.reboot_status = "Deployed" 
-            srv_latest.reboot_phase = "AC 脚本已部署"
+            srv_latest.ac_status = "Deployed"
+            srv_latest.ac_phase = "AC 脚本已部署"
             db.upsert_server(srv_latest)
             
-    return {"success": success, "message": msg}
+    return {"success": success, "message": msg, "steps": steps}
 
 @router.post("/servers/{server_id}/acreboot/start")
+@server_action("ac_start")
 def acreboot_start(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     
-    success, msg = service_ac.start_ac_test(srv)
+    success, msg, steps = service_ac.start_ac_test(srv)
     
     if success:
         srv_latest = db.get_server(server_id)
         if srv_latest:
-            srv_latest.reboot_status = "Running"
-            srv_latest.reboot_phase = "AC压测进行中..."
+            srv_latest.ac_status = "Running"
+            srv_latest.ac_phase = "AC压测进行中..."
+            service_runs.start_run(srv_latest, "acreboot", {"ac_ip": srv_latest.ac_ip, "ac_socket": srv_latest.ac_socket})
             db.upsert_server(srv_latest)
             
-    return {"success": success, "message": msg}
+    return {"success": success, "message": msg, "steps": steps}
 
 @router.post("/servers/{server_id}/acreboot/stop")
+@server_action("ac_stop")
 def acreboot_stop(server_id: str):
     srv = db.get_server(server_id)
     if not srv: raise HTTPException(404)
     
-    success, msg = service_ac.stop_ac_test(srv)
+    success, msg, steps = service_ac.stop_ac_test(srv)
     
     if success:
         srv_latest = db.get_server(server_id)
         if srv_latest:
-            srv_latest.reboot_status = "Stopped"
-            srv_latest.reboot_phase = "AC压测已停止"
+            srv_latest.ac_status = "Stopped"
+            srv_latest.ac_phase = "AC压测已停止"
+            service_runs.finish_run(srv_latest, "acreboot", "Stopped")
             db.upsert_server(srv_latest)
             
-    return {"success": success, "message": msg}
+    return {"success": success, "message": msg, "steps": steps}
+
+@router.post("/servers/{server_id}/acreboot/reset")
+@server_action("ac_reset")
+def acreboot_reset(server_id: str):
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    
+    success, msg, steps = service_ac.reset_ac_files(srv)
+    
+    if success:
+        srv_latest = db.get_server(server_id)
+        if srv_latest:
+            srv_latest.ac_status = "Idle"
+            srv_latest.ac_phase = "环境已重置"
+            srv_latest.ac_loop = "-"
+            srv_latest.boot_stats = BootStats()
+            service_runs.finish_run(srv_latest, "acreboot", "Aborted")
+            db.upsert_server(srv_latest)
+            
+    return {"success": success, "message": msg, "steps": steps}
+
+# ================= 批量启动活动 (错峰) =================
+@router.post("/campaigns")
+def campaign_create(campaign: CampaignSchema):
+    try:
+        campaign = service_campaign.create_campaign(campaign)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    return {"success": True, "message": f"活动 {campaign.campaign_id} 已创建", "campaign": campaign.model_dump()}
+
+@router.get("/campaigns")
+def campaign_list():
+    return {"campaigns": [c.model_dump() for c in db.list_campaigns()]}
+
+@router.get("/campaigns/{campaign_id}")
+def campaign_get(campaign_id: str):
+    campaign = db.get_campaign(campaign_id)
+    if not campaign: raise HTTPException(404)
+    return campaign.model_dump()
+
+@router.post("/campaigns/{campaign_id}/{command}")
+def campaign_control(campaign_id: str, command: str):
+    state = {"pause": "Paused", "resume": "Running", "cancel": "Cancelled"}.get(command)
+    if not state: raise HTTPException(404)
+    try:
+        campaign = service_campaign.update_campaign(campaign_id, state)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    if not campaign: raise HTTPException(404)
+    return {"success": True, "message": f"活动 {campaign_id} -> {state}", "campaign": campaign.model_dump()}
+
+# ================= 测试运行 =================
+@router.get("/runs")
+def run_list(server_id: str = "", test_type: str = "", status: str = "", outcome: str = "",
+             since: float = 0, until: float = None, days: float = None, limit: int = 100):
+    """
+    按开始时间倒序。since / until 为 epoch 秒，days 为最近 N 天 (如 test_type=acreboot&outcome=fail&days=7)
+    """
+    if days: since = max(since, time.time() - days * 86400)
+    runs = service_runs.query_runs(server_id, test_type, status, outcome, since,
+                                   until if until is not None else float("inf"), min(max(1, limit), MAX_PAGE_SIZE))
+    return {"runs": [r.model_dump() for r in runs]}
+
+@router.get("/runs/{run_id}")
+def run_get(run_id: str):
+    run = db.get_run(run_id)
+    if not run: raise HTTPException(404)
+    return {**run.model_dump(), "artifacts": [_artifact_summary(a) for a in artifacts.query(run.server_id, run_id=run_id)]}
+
+# ================= 产物存储 (测试日志归档 / 结果文件) =================
+def _artifact_summary(a: dict) -> dict:
+    return {k: v for k, v in a.items() if k not in ("files", "path")}
+
+@router.get("/artifacts")
+def artifact_list(server_id: str = "", test_type: str = "", run_id: str = "", limit: int = 200):
+    items = artifacts.query(server_id, test_type, run_id)
+    total = sum({a["sha256"]: a["size"] for a in items}.values())
+    return {"artifacts": [_artifact_summary(a) for a in items[:limit]], "count": len(items), "total_bytes": total}
+
+@router.get("/servers/{server_id}/artifacts/{artifact_id}")
+def artifact_get(server_id: str, artifact_id: str):
+    meta = db.get_artifact(server_id, artifact_id)
+    if not meta: raise HTTPException(404)
+    return {k: v for k, v in meta.items() if k != "path"}
+
+@router.get("/servers/{server_id}/artifacts/{artifact_id}/download")
+def artifact_download(server_id: str, artifact_id: str):
+    meta = db.get_artifact(server_id, artifact_id)
+    if not meta or not os.path.exists(meta["path"]): raise HTTPException(404)
+    return FileResponse(path=meta["path"], filename=meta["name"], media_type="application/octet-stream")
 
-# --- 6. 服务器管理 ---
+@router.delete("/servers/{server_id}/artifacts/{artifact_id}")
+def artifact_delete(server_id: str, artifact_id: str):
+    if not artifacts.delete(server_id, artifact_id): raise HTTPException(404)
+    return {"success": True, "message": "产物已删除"}
+
+@router.post("/servers/{server_id}/artifacts/gc_remote")
+@server_action("remote_gc")
+def artifact_gc_remote(server_id: str, keep_days: int = REMOTE_GC_KEEP_DAYS):
+    """清理 DUT 上 Trash/ 与遗留归档包中超过 keep_days 天的内容"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    success, msg, steps = service_archive.gc_remote(srv, keep_days)
+    return {"success": success, "message": msg, "steps": steps}
+
+@router.post("/artifacts/gc")
+def artifact_gc(remote: bool = True):
+    """立即执行后端保留策略；remote=true 时同时清理所有空闲 DUT"""
+    result = {"success": True, "retention": artifacts.enforce_retention()}
+    if remote: result["remote"] = service_archive.gc_idle_servers()
+    return result
+
+# --- 6. 监控指标 (Prometheus 文本格式) ---
+@router.get("/metrics")
+def metrics_export():
+    return PlainTextResponse(metrics.render_all(), media_type="text/plain; version=0.0.4")
+
+# --- 6.1 运行时性能剖析 (管理接口) ---
+@router.post("/admin/profile/start")
+def profile_start(payload: dict = Body(...)):
+    """
+    payload: mode (sampling/deterministic), routes (路由模板列表，空=全部),
+             duration (秒), requests (最多剖析的请求数), interval_ms (采样间隔)
+    """
+    mode = payload.get("mode", "sampling")
+    if mode not in ("sampling", "deterministic"): raise HTTPException(400, f"不支持的模式: {mode}")
+    routes = payload.get("routes") or []
+    if not isinstance(routes, list) or not all(isinstance(r, str) for r in routes):
+        raise HTTPException(400, "routes 应为路由模板字符串列表")
+    try:
+        duration = float(payload.get("duration", 60))
+        interval_ms = float(payload.get("interval_ms", 5))
+        max_requests = payload.get("requests")
+        if max_requests is not None:
+            if isinstance(max_requests, bool) or float(max_requests) != int(max_requests): raise ValueError
+            max_requests = int(max_requests)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "duration / interval_ms 应为数字，requests 应为整数")
+    # 上限防止误操作留下长时间运行的剖析会话
+    if not 0 < duration <= 3600: raise HTTPException(400, f"duration 应在 (0, 3600] 秒内: {duration}")
+    if not 1 <= interval_ms <= 1000: raise HTTPException(400, f"interval_ms 应在 [1, 1000] 内: {interval_ms}")
+    if max_requests is not None and max_requests < 1: raise HTTPException(400, f"requests 应为正整数: {max_requests}")
+    try:
+        session = profiler.start(mode=mode, routes=routes, duration=duration, max_requests=max_requests,
+                                 interval=interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    return {"success": True, "message": "剖析已开启", "session": session.summary()}
+
+@router.post("/admin/profile/stop")
+def profile_stop():
+    session = profiler.stop()
+    if not session: return {"success": False, "message": "当前没有剖析会话"}
+    return {"success": True, "message": "剖析已停止", "session": session.summary()}
+
+@router.get("/admin/profile/status")
+def profile_status():
+    session = profiler.session or profiler.last
+    return {"active": profiler.session is not None, "session": session.summary() if session else None}
+
+@router.get("/admin/profile/result")
+def profile_result():
+    """折叠栈文本，可直接交给 flamegraph.pl / speedscope"""
+    session = profiler.session or profiler.last
+    if not session: raise HTTPException(404, "暂无剖析结果")
+    return PlainTextResponse(session.collapsed())
+
+# --- 7. 服务器管理 ---
 @router.post("/servers/add")
 def add_server(server: ServerSchema):
-    # 添加时不需要担心并发，直接写入
+    # 添加时不需要担心并发，直接写入；BMC IP / OS IP / AC 插座与其它服务器重复时拒绝
+    conflicts = db.identity_conflicts(server)
+    if conflicts: raise HTTPException(409, "; ".join(conflicts))
+    old = db.get_server(server.server_id)
     db.upsert_server(server)
+    db.index_identities([server], [old] if old else [])
     return {"success": True, "message": "添加成功"}
 
 @router.delete("/servers/delete/{server_id}")
@@ -317,4 +704,64 @@ def delete_server(server_id: str):
     if db.get_server(server_id):
         db.delete_server(server_id)
         return {"success": True, "status": "success"}
-    raise HTTPException(404, "Server not found")
\ No newline at end of file
+    raise HTTPException(404, "Server not found")
+# --- 7.1 SSH 密钥下发 (之后优先密钥登录，可清除存储的密码) ---
+@router.get("/ssh/public_key")
+def ssh_public_key():
+    """后端公钥 (authorized_keys 格式)，也可手动加入 DUT 或装机模板"""
+    return PlainTextResponse(sshkeys.public_key_line() + "\n", headers={"X-Key-Fingerprint": sshkeys.fingerprint()})
+
+@router.post("/ssh/bootstrap")
+def ssh_bootstrap_fleet(payload: dict = Body(default={})):
+    """payload: server_ids (缺省为全部在线服务器) / forget_password (默认 true，验证密钥登录后清除密码) / force (已部署的也重新下发)"""
+    return service_credentials.bootstrap_fleet(payload.get("server_ids"), bool(payload.get("forget_password", True)),
+                                               bool(payload.get("force")))
+
+@router.post("/servers/{server_id}/ssh/bootstrap")
+@server_action("ssh_bootstrap")
+def ssh_bootstrap(server_id: str, forget_password: bool = True):
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    success, msg = service_credentials.bootstrap_server(srv, forget_password)
+    return {"success": success, "message": msg}
+
+@router.delete("/servers/{server_id}/ssh/host_key")
+def ssh_forget_host_key(server_id: str):
+    """清除记录的主机公钥 (SSH_HOST_KEY_CHANGED = "reject" 时，确认重装后调用)，下次连接重新记录"""
+    srv = db.get_server(server_id)
+    if not srv: raise HTTPException(404)
+    if srv.os_ip: sshkeys.forget_host_key(sshkeys.host_id(srv.os_ip))
+    return {"success": True, "message": "主机公钥记录已清除"}
+
+# --- 7.2 批量导入 / 导出 (CSV / JSONL) ---
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # 请求体超过该大小时转存临时文件
+
+@router.post("/servers/import")
+async def import_servers(request: Request, format: str = "csv", mode: str = "upsert", dry_run: bool = False, check: bool = False):
+    """
+    请求体为 CSV (首行表头) 或 JSONL，列/键为 ServerSchema 的配置字段，空值保留原值
+    - mode: upsert 新增或更新 / create 只新增 (已存在的记为错误)
+    - dry_run: 只校验不写入
+    - check: 导入后对新服务器做 Ping 与 SSH 凭据检查
+    坏行 (校验失败、重复) 按行号返回并跳过，其余照常导入
+    """
+    if format not in service_inventory.FORMATS: raise HTTPException(400, f"未知格式: {format}")
+    if mode not in service_inventory.MODES: raise HTTPException(400, f"未知模式: {mode}")
+    # 请求体边收边存 (大文件落临时文件)，解析与写库在线程池中逐行进行
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as body:
+        async for chunk in request.stream(): body.write(chunk)
+        body.seek(0)
+        text = io.TextIOWrapper(body, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            return await run_in_threadpool(service_inventory.import_servers, format, text, mode, dry_run, check)
+        finally:
+            text.detach()
+
+@router.get("/servers/export")
+def export_servers(format: str = "csv", fields: str = None):
+    """默认导出全部配置字段；密码列一律留空 (与列表接口一致)。fields 为逗号分隔的字段列表"""
+    if format not in service_inventory.FORMATS: raise HTTPException(400, f"未知格式: {format}")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    media = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(service_inventory.export_servers(format, field_list), media_type=f"{media}; charset=utf-8",
+                             headers={"Content-Disposition": f'attachment; filename="servers.{format}"'})
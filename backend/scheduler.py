@@ -0,0 +1,50 @@
+# scheduler.py
+import threading
+from logger import logger
+
+# --- 1. 周期任务 (独立守护线程，异常不中断循环) ---
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, func, leader_only: bool = True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.leader_only = leader_only  # 多 worker 部署时只在 Leader 上执行
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"task-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"[Scheduler] 任务 {self.name} 已启动 (间隔 {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.leader_only and not _is_leader(): continue
+            try:
+                self.func()
+            except Exception:
+                logger.exception(f"[Scheduler] 任务 {self.name} 执行异常")
+
+# --- 2. 全局注册表 ---
+_tasks = {}
+_is_leader = lambda: True  # 默认单进程，始终执行
+
+def set_leader_check(check):
+    global _is_leader
+    _is_leader = check
+
+def register(name: str, interval: float, func, leader_only: bool = True):
+    _tasks[name] = PeriodicTask(name, interval, func, leader_only)
+
+def start_all():
+    for task in _tasks.values():
+        task.start()
+
+def stop_all():
+    for task in _tasks.values():
+        task.stop()
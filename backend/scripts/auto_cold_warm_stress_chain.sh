@@ -15,7 +15,8 @@ CMD_PHASE_3="-m -i 12"
 
 # 压力测试命令 (注意：增加了 cd WORK_DIR 确保日志生成在正确位置)
 # -s 3600 代表跑 1 小时
-RAW_STRESS_CMD="stressapptest -l stressapptest.log --remote_numa -W -C 128 -m 128 -s 3600 --reserve_memory"
+# {{STRESS_ARGS}} 由后端部署时按 NUMA 拓扑注入 (-M 内存MB -m 拷贝线程 -C CPU线程)
+RAW_STRESS_CMD="stressapptest -l stressapptest.log --remote_numa -W {{STRESS_ARGS}} -s 3600 --reserve_memory"
 
 WORK_DIR="/root/Reboot"
 FLAG_FILE="$WORK_DIR/.chain_monitor_status"
@@ -0,0 +1,132 @@
+#!/bin/bash
+
+# ===============================================
+# Memtest 无界面执行模式 (Headless Supervisor)
+# 按 NUMA 节点/核心绑定 memtester 实例，运行时长由本脚本控制
+# 用法: memtest_supervisor.sh -t <秒> [-r <内存占用比例>] [-p <放置计划>]
+#   -p 由后端按 NUMA 拓扑计算: node:cpu:mb,node:cpu:mb,...
+#      不传时在本机按节点空闲内存自行均分
+# ===============================================
+
+RUNTIME=3600
+MEM_RATIO="0.9"
+PLAN=""
+
+while getopts "t:r:p:" opt; do
+    case $opt in
+        t) RUNTIME=$OPTARG ;;
+        r) MEM_RATIO=$OPTARG ;;
+        p) PLAN=$OPTARG ;;
+    esac
+done
+
+WORK_DIR=$(cd "$(dirname "$0")" && pwd)
+RESULT_DIR="$WORK_DIR/mem_result"
+STATUS_FILE="$WORK_DIR/.supervisor_status"
+PID_FILE="$WORK_DIR/.supervisor.pid"
+LOG_FILE="$WORK_DIR/supervisor.log"
+MIN_MB=16
+
+log() { echo "[$(date '+%Y-%m-%d %H:%M:%S')] $1" >> "$LOG_FILE"; }
+
+# --- 1. 旧结果归入 Trash，保证 mem_result 只有本轮输出 ---
+mkdir -p "$RESULT_DIR" "$WORK_DIR/Trash"
+if [ -n "$(ls -A "$RESULT_DIR" 2>/dev/null)" ]; then
+    mv "$RESULT_DIR" "$WORK_DIR/Trash/mem_result_$(date +%Y%m%d_%H%M%S)"
+    mkdir -p "$RESULT_DIR"
+fi
+echo $$ > "$PID_FILE"
+
+# --- 2. 拓扑探测 ---
+expand_cpulist() {
+    local out="" part
+    for part in ${1//,/ }; do
+        if [[ "$part" == *-* ]]; then out="$out $(seq "${part%-*}" "${part#*-}")"; else out="$out $part"; fi
+    done
+    echo $out
+}
+
+MEMTESTER_BIN=$(command -v memtester)
+if [ -z "$MEMTESTER_BIN" ]; then
+    log "错误: 未找到 memtester，请先部署环境"
+    echo "error" > "$STATUS_FILE"
+    exit 1
+fi
+HAS_NUMACTL=0
+command -v numactl >/dev/null 2>&1 && HAS_NUMACTL=1
+
+CHILD_PIDS=""
+launch_instance() {
+    local node=$1 cpu=$2 mb=$3
+    local out="$RESULT_DIR/node${node}_cpu${cpu}.log"
+    # loops=0 表示无限循环，时长由 supervisor 截止
+    if [ $HAS_NUMACTL -eq 1 ]; then
+        taskset -c "$cpu" numactl --membind="$node" "$MEMTESTER_BIN" "${mb}M" 0 > "$out" 2>&1 < /dev/null &
+    else
+        taskset -c "$cpu" "$MEMTESTER_BIN" "${mb}M" 0 > "$out" 2>&1 < /dev/null &
+    fi
+    CHILD_PIDS="$CHILD_PIDS $!"
+}
+
+launch_node() {
+    local node=$1 cpus=$2 free_kb=$3
+    local cpu_arr=($cpus)
+    local count=${#cpu_arr[@]}
+    [ $count -eq 0 ] && return
+    local total_mb=$(awk -v kb="$free_kb" -v r="$MEM_RATIO" 'BEGIN {printf "%d", kb * r / 1024}')
+    # 内存不足以让每个核心分到 MIN_MB 时减少实例数
+    while [ $count -gt 1 ] && [ $((total_mb / count)) -lt $MIN_MB ]; do count=$((count / 2)); done
+    local mb=$((total_mb / count))
+    [ $mb -lt $MIN_MB ] && { log "节点 $node 可用内存不足，跳过"; return; }
+    log "节点 $node: $count 个实例 x ${mb}MB"
+    for ((i = 0; i < count; i++)); do launch_instance "$node" "${cpu_arr[$i]}" "$mb"; done
+}
+
+if [ -n "$PLAN" ]; then
+    [ -d /sys/devices/system/node/node0 ] || HAS_NUMACTL=0
+    log "使用后端放置计划"
+    for item in ${PLAN//,/ }; do
+        IFS=: read -r node cpu mb <<< "$item"
+        launch_instance "$node" "$cpu" "$mb"
+    done
+elif ls -d /sys/devices/system/node/node[0-9]* >/dev/null 2>&1; then
+    for node_dir in /sys/devices/system/node/node[0-9]*; do
+        node=${node_dir##*node}
+        cpus=$(expand_cpulist "$(cat "$node_dir/cpulist")")
+        free_kb=$(awk '/MemFree/ {print $4}' "$node_dir/meminfo")
+        launch_node "$node" "$cpus" "${free_kb:-0}"
+    done
+else
+    HAS_NUMACTL=0
+    launch_node 0 "$(seq 0 $(($(nproc) - 1)))" "$(awk '/MemAvailable/ {print $2}' /proc/meminfo)"
+fi
+
+# --- 3. 监督循环：全部退出或到达时限即结束 ---
+stop_children() {
+    [ -n "$CHILD_PIDS" ] && kill $CHILD_PIDS 2>/dev/null
+    sleep 2
+    [ -n "$CHILD_PIDS" ] && kill -9 $CHILD_PIDS 2>/dev/null
+}
+trap 'log "收到终止信号"; stop_children; echo "stopped" > "$STATUS_FILE"; rm -f "$PID_FILE"; exit 0' TERM INT
+
+DEADLINE=$(( $(date +%s) + RUNTIME ))
+log "启动完成: 实例PID [$CHILD_PIDS ], 时限 ${RUNTIME}s"
+while true; do
+    ALIVE=0
+    for pid in $CHILD_PIDS; do kill -0 "$pid" 2>/dev/null && ALIVE=$((ALIVE + 1)); done
+    echo "running $ALIVE" > "$STATUS_FILE"
+    if [ $ALIVE -eq 0 ]; then
+        log "所有实例已退出"
+        break
+    fi
+    if [ $(date +%s) -ge $DEADLINE ]; then
+        log "到达运行时限，停止 $ALIVE 个实例"
+        stop_children
+        break
+    fi
+    sleep 5
+done
+
+echo "finished" > "$STATUS_FILE"
+rm -f "$PID_FILE"
+exit 0
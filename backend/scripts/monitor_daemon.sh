@@ -101,12 +101,17 @@ report_backend() {
     local phase=$1
     local loop=$2
     local status=$3
+    local loop_ts=$4
     
     # 清理换行符
     phase=$(echo "$phase" | tr -d '\n')
     loop=$(echo "$loop" | tr -d '\n')
     
-    JSON_DATA="{\"server_id\": \"$SERVER_ID\", \"task_type\": \"$TASK_TYPE\", \"phase\": \"$phase\", \"loop\": \"$loop\", \"status\": \"$status\"}"
+    # 轮次文件的更新时间 (供后端计算单轮重启耗时)
+    local ts_field=""
+    if [[ "$loop_ts" =~ ^[0-9]+$ ]]; then ts_field=", \"loop_ts\": $loop_ts"; fi
+    
+    JSON_DATA="{\"server_id\": \"$SERVER_ID\", \"task_type\": \"$TASK_TYPE\", \"phase\": \"$phase\", \"loop\": \"$loop\", \"status\": \"$status\"$ts_field}"
     
     curl --noproxy "*" -s -X POST "$BACKEND_URL" \
          -H "Content-Type: application/json" \
@@ -129,9 +134,11 @@ while true; do
 
     # 3. 读取轮次
     curr_loop="0"
+    curr_loop_ts=""
     if [ -f "$LOOP_FILE" ]; then 
         val=$(cat "$LOOP_FILE")
         if [[ "$val" =~ ^[0-9]+$ ]]; then curr_loop=$val; fi
+        curr_loop_ts=$(stat -c %Y "$LOOP_FILE" 2>/dev/null)
     fi
     
     # 4. 读取阶段 (状态文件)
@@ -172,7 +179,7 @@ while true; do
     log_to_local "[Loop:$curr_loop] $curr_phase"
     
     # 5. 上报
-    report_backend "$curr_phase" "$curr_loop" "Running"
+    report_backend "$curr_phase" "$curr_loop" "Running" "$curr_loop_ts"
 
     sleep 30
 done
\ No newline at end of file
@@ -0,0 +1,144 @@
+# services/archive.py
+# 停止测试时的日志归档：在 DUT 上打包并以流的形式直接传回后端产物存储，不在 DUT 上留归档文件
+#   1. 压缩：优先 zstd -T0 (多线程)，其次 pigz，最后 gzip -1；后端按流的魔数识别格式
+#   2. 增量：GNU tar --listed-incremental 快照 (每种测试一份清单)，只打包上次归档后新增/变化的文件
+#      清单先写到 .new，后端确认接收完整后才提交，传输失败不会丢失内容
+#   3. 文件列表由 tar -v 写到 DUT 临时文件，提交时一并取回，写入产物索引供按文件名检索
+# 另有 DUT 远程清理 (gc_remote)：删除各工作目录 Trash/ 中与遗留 tar 包中超过保留天数的内容，避免根分区被逐渐写满
+import datetime
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from utils import get_ssh_client, run_remote_transaction, summarize_steps
+from models import ServerSchema
+from artifacts import ArtifactWriter
+from coordination import ActionConflictError, LockBusyError, coordinator
+from database import db
+from logger import logger
+from services import runs as service_runs
+from metrics import SSH_PHASE_SECONDS
+
+CHUNK_SIZE = 256 * 1024
+MAGIC = {b"\x28\xb5\x2f\xfd": "zst", b"\x1f\x8b": "gz"}
+MAX_INDEXED_FILES = 2000
+
+def _stream_cmd(root: str, paths: list, state: str, pre: str) -> str:
+    targets = " ".join(shlex.quote(p) for p in paths)
+    return f"""
+set -o pipefail
+mkdir -p {ARCHIVE_REMOTE_STATE_DIR}
+cd {shlex.quote(root)} || exit 3
+{pre}
+TARGETS=""
+for p in {targets}; do [ -e "$p" ] && TARGETS="$TARGETS $p"; done
+[ -n "$TARGETS" ] || exit 4
+if command -v zstd >/dev/null 2>&1; then COMP="zstd -T0 -{ARCHIVE_ZSTD_LEVEL} -q -c"
+elif command -v pigz >/dev/null 2>&1; then COMP="pigz -c"
+else COMP="gzip -1 -c"; fi
+INCR=""
+if tar --version 2>/dev/null | grep -q GNU; then
+    rm -f {state}.new; [ -f {state} ] && cp {state} {state}.new
+    INCR="--listed-incremental={state}.new"
+fi
+tar $INCR -cvf - $TARGETS 2>{state}.list | $COMP
+rc=$?
+[ $rc -le 1 ] || exit $rc
+"""
+
+def collect_logs(server: ServerSchema, test_type: str, root: str, paths: list, run_id: str = "", pre: str = ""):
+    """
+    将 root 下的 paths 增量打包并流式传回产物存储；pre 为打包前在 root 中执行的命令 (如导出 dmesg)。
+    返回 (success, message, artifact)；没有新内容时 artifact 为 None
+    """
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_id = run_id or service_runs.run_id_for(server, test_type) or f"{test_type}-{stamp}"
+    state = f"{ARCHIVE_REMOTE_STATE_DIR}/{test_type}.snar"
+    ssh = None
+    try:
+        ssh = get_ssh_client(server.os_ip, server.ssh_user, server.ssh_password)
+        with ArtifactWriter(server.server_id, test_type, run_id, f"{test_type}_logs_{stamp}.tar") as writer:
+            with SSH_PHASE_SECONDS.time(phase="archive_stream"):
+                stdin, stdout, stderr = ssh.exec_command(_stream_cmd(root, paths, state, pre))
+                stdin.close()
+                head = b""
+                while True:
+                    chunk = stdout.read(CHUNK_SIZE)
+                    if not chunk: break
+                    if len(head) < 4: head += chunk[:4 - len(head)]
+                    writer.write(chunk)
+                rc = stdout.channel.recv_exit_status()
+            if rc == 4: return True, "无日志可归档", None
+            if rc != 0:
+                ssh.exec_command(f"rm -f {state}.new {state}.list")
+                return False, f"日志打包失败 (rc={rc}): {stderr.read().decode(errors='replace').strip()[:200]}", None
+
+            # 接收完整：提交增量清单并取回文件列表
+            stdin, stdout, _ = ssh.exec_command(
+                f"[ -f {state}.new ] && mv {state}.new {state}; grep -v -e '/$' -e '^tar: ' {state}.list; rm -f {state}.list")
+            files = [line for line in stdout.read().decode(errors="replace").splitlines() if line]
+            if not files: return True, "没有新增日志 (已全部归档)", None
+
+            codec = next((c for m, c in MAGIC.items() if head.startswith(m)), "bin")
+            writer.meta["name"] += f".{codec}"
+            artifact = writer.commit(codec=codec, file_count=len(files), files=files[:MAX_INDEXED_FILES])
+        logger.info(f"[{server.server_id}] 日志已归档: {artifact['name']} "
+                    f"({artifact['file_count']} 个文件, {artifact['size'] / 1024:.1f} KiB, {codec})")
+        return True, f"日志已归档 ({artifact['file_count']} 个文件, {artifact['size'] / 1024:.1f} KiB)", artifact
+    except Exception as e:
+        logger.exception(f"[{server.server_id}] 日志归档异常")
+        return False, f"日志归档异常: {e}", None
+    finally:
+        if ssh: ssh.close()
+
+# --- 远程清理 ---
+REMOTE_WORK_DIRS = (REMOTE_WORK_DIR, REMOTE_AC_DIR, REMOTE_MEMTEST_DIR)
+# 改为流式归档之前留在 DUT 上的 tar 包
+LEGACY_ARCHIVES = ("reboot_logs_*.tar.gz", "acreboot_logs_*.tar.gz", "memtest_result_*.tar.gz")
+
+def _gc_steps(keep_days: int):
+    dirs = " ".join(REMOTE_WORK_DIRS)
+    names = " -o ".join(f"-name '{n}'" for n in LEGACY_ARCHIVES)
+    return [
+        # mv 进 Trash 时会更新 ctime，按 ctime 判断放入 Trash 的时间
+        ("trash", f"""
+freed=0
+for d in {dirs}; do
+    [ -d "$d/Trash" ] || continue
+    before=$(du -sk "$d/Trash" | cut -f1)
+    find "$d/Trash" -mindepth 1 -maxdepth 1 -ctime +{keep_days} -exec rm -rf {{}} +
+    freed=$((freed + before - $(du -sk "$d/Trash" | cut -f1)))
+done
+echo "freed_kb=$freed"
+""", False),
+        ("legacy_archives", f"""
+find {dirs} -maxdepth 1 -type f \\( {names} \\) -mtime +{keep_days} -printf '%s\\n' -delete 2>/dev/null \\
+    | awk '{{s += $1}} END {{printf "freed_kb=%d\\n", s / 1024}}'
+""", False),
+        # 被中断的远程事务留下的暂存目录
+        ("stage_dirs", "find /tmp -maxdepth 1 -name '.monitor_stage_*' -mmin +60 -exec rm -rf {} + ; true", False),
+    ]
+
+def gc_remote(server: ServerSchema, keep_days: int = REMOTE_GC_KEEP_DAYS):
+    """返回 (success, msg, steps)"""
+    success, results = run_remote_transaction(server.os_ip, server.ssh_user, server.ssh_password, _gc_steps(keep_days))
+    freed_kb = sum(int(m) for r in results for m in re.findall(r"freed_kb=(\d+)", r["output"]))
+    msg = summarize_steps(success, results, f"DUT 清理完成，释放 {freed_kb / 1024:.1f} MiB")
+    logger.info(f"[{server.server_id}] {msg}")
+    return success, msg, results
+
+def gc_idle_servers() -> dict:
+    """对在线且没有测试在运行的服务器执行远程清理；正在执行其它操作的服务器跳过"""
+    servers = [s for s in db.get_all_servers().values()
+               if s.os_online and not s.active_runs]
+    if not servers: return {}
+
+    def run(srv):
+        try:
+            return coordinator.run(srv.server_id, "remote_gc", {}, lambda: gc_remote(srv)[:2])
+        except (ActionConflictError, LockBusyError) as e:
+            return False, f"跳过: {e}"
+
+    with ThreadPoolExecutor(max_workers=min(16, len(servers))) as pool:
+        results = list(pool.map(run, servers))
+    return {srv.server_id: {"success": ok, "message": msg} for srv, (ok, msg) in zip(servers, results)}
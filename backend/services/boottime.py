@@ -0,0 +1,64 @@
+import math
+from config import *
+from models import BootStats
+from logger import logger
+
+# --- 1. 标准差 ---
+def boot_std(stats: BootStats) -> float:
+    if stats.samples < 2: return 0.0
+    return math.sqrt(stats.m2 / (stats.samples - 1))
+
+# --- 2. 单次汇报更新 (O(1)，不回看历史) ---
+def update_boot_stats(server_id: str, stats: BootStats, loop: str, loop_ts: float) -> bool:
+    """
+    根据 Webhook 汇报的 (轮次, 时间戳) 增量计算单轮耗时。
+    只有轮次恰好 +1 时才产生一个样本；轮次回退或跳变只重置锚点，
+    避免把停测/重新部署的空档当成一次超长重启。
+    返回 True 表示本次更新新触发了异常。
+    """
+    if not loop.isdigit(): return False
+    curr_loop = int(loop)
+
+    # 1. 同一轮次的重复汇报 (每 30s 一次)，直接忽略
+    if curr_loop == stats.anchor_loop: return False
+
+    prev_loop, prev_ts = stats.anchor_loop, stats.anchor_ts
+    stats.anchor_loop, stats.anchor_ts = curr_loop, loop_ts
+    if prev_loop < 0 or curr_loop != prev_loop + 1 or loop_ts <= prev_ts: return False
+
+    duration = loop_ts - prev_ts
+    stats.last = duration
+
+    # 2. 先用旧基线判定 (避免异常值把自己“洗白”)
+    triggered = ""
+    std, base_mean = boot_std(stats), stats.mean
+    if stats.samples >= BOOT_MIN_SAMPLES and std > 0:
+        z = (duration - stats.mean) / std
+        if abs(z) >= BOOT_SPIKE_SIGMA: triggered = "spike"
+        # 双侧 CUSUM：累积超出容差 k 的偏移量，超过 h 即认为均值发生漂移
+        # 尖峰按阈值截断后同样计入，持续偏高的“尖峰”会升级为漂移
+        z = max(-BOOT_SPIKE_SIGMA, min(BOOT_SPIKE_SIGMA, z))
+        stats.cusum_pos = max(0.0, stats.cusum_pos + z - BOOT_CUSUM_K)
+        stats.cusum_neg = max(0.0, stats.cusum_neg - z - BOOT_CUSUM_K)
+        if stats.cusum_pos >= BOOT_CUSUM_H: triggered = "drift_up"
+        elif stats.cusum_neg >= BOOT_CUSUM_H: triggered = "drift_down"
+
+    # 3. 漂移确认后以新水平重建基线；尖峰不计入基线；其余 Welford 增量更新
+    if triggered.startswith("drift"):
+        stats.samples, stats.mean, stats.m2 = 0, 0.0, 0.0
+        stats.cusum_pos = stats.cusum_neg = 0.0
+    elif triggered != "spike":
+        stats.samples += 1
+        delta = duration - stats.mean
+        stats.mean += delta / stats.samples
+        stats.m2 += delta * (duration - stats.mean)
+
+    # 同类告警持续出现时只记一次日志，避免每轮刷屏
+    if triggered and triggered != stats.anomaly:
+        stats.anomaly = triggered
+        stats.anomaly_loop = str(curr_loop)
+        logger.warning(f"[{server_id}] 重启耗时异常 ({triggered}): 第 {curr_loop} 轮 {duration:.1f}s, "
+                       f"基线 {base_mean:.1f}±{std:.1f}s")
+        return True
+    if triggered: stats.anomaly_loop = str(curr_loop)
+    return False
@@ -0,0 +1,187 @@
+# services/campaign.py
+# 批量启动活动：按顺序错峰启动一批服务器的 reboot / acreboot 测试
+#   - stagger       : 相邻两台启动的最小间隔，避免整柜同时上下电 (浪涌电流) 与同时回连 (Webhook/SSH 洪峰)
+#   - max_in_reboot : 本活动中同时处于重启中的机器上限，达到上限时暂缓启动下一台
+#   - AC 盒子互斥   : 同一 ac_ip 上已有测试在运行时，共用该盒子的机器排队等待；
+#                     启动前先持有该盒子的分布式锁直到启动完成 (ac_status 写入前，其它活动 / worker 不会选中同一盒子)
+# 活动状态保存在存储中，由 Leader 的定时任务推进；后端重启后从存储继续
+import datetime
+import time
+import uuid
+from typing import List
+from database import db
+from models import CampaignSchema, ServerSchema
+from coordination import DistributedLock, LockBusyError, ActionConflictError, coordinator
+from logger import logger
+from services import reboot as service_reboot
+from services import acreboot as service_ac
+from services import runs as service_runs
+
+# 测试类型 -> (协调器操作名，与路由一致以便合并/互斥；启动函数；状态/阶段字段前缀；启动后的阶段描述)
+START_ACTIONS = {
+    "reboot": ("reboot_start", service_reboot.start_reboot_test, "reboot", "正在启动..."),
+    "acreboot": ("ac_start", service_ac.start_ac_test, "ac", "AC压测进行中..."),
+}
+
+# --- 1. 状态判定 ---
+def is_rebooting(srv: ServerSchema) -> bool:
+    """测试运行中且 OS 不可用 (有 Redfish 数据时按电源/BootProgress 判定，否则按 OS Ping)"""
+    if srv.reboot_status != "Running" and srv.ac_status != "Running": return False
+    if srv.bmc_power_state == "Off": return True
+    if srv.bmc_boot_progress and srv.bmc_boot_progress != "OSRunning": return True
+    return not srv.os_online
+
+def busy_ac_boxes(servers: dict) -> set:
+    """有测试在运行的 AC 盒子 (保守判定：共用盒子的任一机器处于 Running 即视为占用)"""
+    return {s.ac_ip for s in servers.values() if s.ac_ip and s.ac_status == "Running"}
+
+def _campaign_lock(campaign_id: str) -> DistributedLock:
+    return DistributedLock(f"campaign:{campaign_id}", ttl=30)
+
+def _reserve_ac_box(ac_ip: str, campaign_id: str) -> DistributedLock | None:
+    """预占 AC 盒子 (持有期间自动续期，进程崩溃时随 TTL 过期)；拿到锁后按最新状态复核一次"""
+    lock = DistributedLock(f"acbox:{ac_ip}", ttl=30, label=f"campaign {campaign_id}")
+    if not lock.acquire(): return None
+    if ac_ip in busy_ac_boxes(db.get_all_servers()):
+        lock.release()
+        return None
+    return lock
+
+# --- 2. 创建与控制 ---
+def create_campaign(campaign: CampaignSchema) -> CampaignSchema:
+    if campaign.test_type not in START_ACTIONS: raise ValueError(f"不支持的测试类型: {campaign.test_type}")
+    if campaign.stagger < 0 or campaign.max_in_reboot < 1: raise ValueError("stagger 不能为负，max_in_reboot 至少为 1")
+    servers = db.get_all_servers()
+    ids = list(dict.fromkeys(campaign.server_ids))  # 去重并保持顺序
+    missing = [sid for sid in ids if sid not in servers]
+    if missing: raise ValueError(f"服务器不存在: {', '.join(missing)}")
+    if campaign.test_type == "acreboot":
+        no_ac = [sid for sid in ids if not servers[sid].ac_ip]
+        if no_ac: raise ValueError(f"未配置 AC 盒子 IP: {', '.join(no_ac)}")
+
+    campaign.campaign_id = uuid.uuid4().hex[:8]
+    campaign.server_ids, campaign.pending = ids, list(ids)
+    campaign.launched, campaign.failed = {}, {}
+    campaign.state, campaign.next_launch_ts = "Running", 0.0
+    campaign.created = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db.save_campaign(campaign)
+    logger.info(f"[Campaign {campaign.campaign_id}] 创建: {campaign.test_type} x {len(ids)}, "
+                f"间隔 {campaign.stagger}s, 重启中上限 {campaign.max_in_reboot}")
+    return campaign
+
+def update_campaign(campaign_id: str, state: str) -> CampaignSchema | None:
+    """Paused / Running / Cancelled；已结束的活动不可再改"""
+    lock = _campaign_lock(campaign_id)
+    if not lock.acquire(timeout=5): raise LockBusyError(f"活动 {campaign_id} 正在推进，请稍后重试")
+    try:
+        campaign = db.get_campaign(campaign_id)
+        if not campaign: return None
+        if campaign.state in ("Finished", "Cancelled"): raise ValueError(f"活动已{campaign.state}")
+        campaign.state = state
+        db.save_campaign(campaign)
+        logger.info(f"[Campaign {campaign_id}] 状态 -> {state}")
+        return campaign
+    finally:
+        lock.release()
+
+# --- 3. 推进 (每个周期每个活动最多启动一台) ---
+def _pick(campaign: CampaignSchema, servers: dict):
+    """返回 (server_id, 失败原因, AC 盒子锁)；server_id 为 None 表示本周期不启动。盒子锁由调用方在启动结束后释放"""
+    if sum(1 for sid in campaign.launched if sid in servers and is_rebooting(servers[sid])) >= campaign.max_in_reboot:
+        return None, None, None
+    is_ac = campaign.test_type == "acreboot"
+    busy = busy_ac_boxes(servers) if is_ac else set()
+    for sid in campaign.pending:
+        srv = servers.get(sid)
+        if srv is None: return sid, "服务器已删除", None
+        if not is_ac: return sid, None, None
+        if srv.ac_ip in busy: continue
+        box = _reserve_ac_box(srv.ac_ip, campaign.campaign_id)
+        if box is None:
+            busy.add(srv.ac_ip)  # 其它活动正在该盒子上启动
+            continue
+        return sid, None, box
+    return None, None, None
+
+def _launch(test_type: str, srv: ServerSchema):
+    action, start, prefix, phase = START_ACTIONS[test_type]
+
+    def run():
+        result = start(srv)
+        if result[0]:
+            srv_latest = db.get_server(srv.server_id)
+            if srv_latest:
+                setattr(srv_latest, f"{prefix}_status", "Running")
+                setattr(srv_latest, f"{prefix}_phase", phase)
+                params = {"ac_ip": srv_latest.ac_ip, "ac_socket": srv_latest.ac_socket} if test_type == "acreboot" else {}
+                service_runs.start_run(srv_latest, test_type, params)
+                db.upsert_server(srv_latest)
+        return result[0], result[1]
+
+    return coordinator.run(srv.server_id, action, {}, run)
+
+def tick(campaign_id: str):
+    lock = _campaign_lock(campaign_id)
+    if not lock.acquire(): return  # 正在被修改，下个周期再推进
+    try:
+        campaign = db.get_campaign(campaign_id)
+        if not campaign or campaign.state != "Running": return
+        now = time.time()
+        if not campaign.pending:
+            campaign.state = "Finished"
+            db.save_campaign(campaign)
+            logger.info(f"[Campaign {campaign_id}] 全部启动完毕 (失败 {len(campaign.failed)} 台)")
+            return
+        if now < campaign.next_launch_ts: return
+
+        servers = db.get_all_servers()
+        sid, error, box = _pick(campaign, servers)
+        if sid is None: return
+        campaign.pending.remove(sid)
+        if error:
+            campaign.failed[sid] = error
+        else:
+            campaign.launched[sid] = now
+            campaign.next_launch_ts = now + campaign.stagger
+        try:
+            db.save_campaign(campaign)
+        except Exception:
+            if box: box.release()
+            raise
+    finally:
+        lock.release()
+    if error: return
+
+    # 启动 (SSH) 在锁外执行，不阻塞暂停/取消；AC 盒子锁持有到启动结束 (成功时 ac_status 已为 Running)
+    logger.info(f"[Campaign {campaign_id}] [{sid}] 启动 {campaign.test_type}")
+    requeue = False
+    try:
+        ok, msg = _launch(campaign.test_type, servers[sid])
+    except ActionConflictError as e:
+        ok, msg, requeue = False, str(e), True  # 服务器上有其它操作，放回队尾稍后重试
+    except Exception as e:
+        logger.exception(f"[Campaign {campaign_id}] [{sid}] 启动异常")
+        ok, msg = False, str(e)
+    finally:
+        if box: box.release()
+    if ok: return
+
+    if not lock.acquire(timeout=10):
+        logger.error(f"[Campaign {campaign_id}] [{sid}] 无法记录启动失败: {msg}")
+        return
+    try:
+        campaign = db.get_campaign(campaign_id)
+        if not campaign: return
+        campaign.launched.pop(sid, None)
+        if requeue: campaign.pending.append(sid)
+        else: campaign.failed[sid] = msg
+        if campaign.state == "Finished" and campaign.pending: campaign.state = "Running"
+        db.save_campaign(campaign)
+    finally:
+        lock.release()
+    logger.warning(f"[Campaign {campaign_id}] [{sid}] 启动失败{' (稍后重试)' if requeue else ''}: {msg}")
+
+def tick_all() -> List[str]:
+    running = [c.campaign_id for c in db.list_campaigns() if c.state == "Running"]
+    for campaign_id in running: tick(campaign_id)
+    return running
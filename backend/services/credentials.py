@@ -0,0 +1,56 @@
+# services/credentials.py
+# SSH 密钥下发 (bootstrap)：把后端公钥写入 DUT 的 authorized_keys，验证纯密钥登录后记录指纹
+#   - 之后所有连接 (含连接池) 优先走密钥认证，省去密码认证往返，也不再依赖明文密码
+#   - 验证通过后默认清空存储中的 ssh_password (forget_password=False 时保留)
+#   - 批量下发时并发执行，跳过离线的与已部署当前密钥的服务器 (force 时全部重新下发)
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from config import *
+from database import db
+from models import ServerSchema
+from logger import logger
+from utils import get_ssh_client, run_ssh_command
+import sshkeys
+
+# 幂等：已存在同一行时不重复追加；SELinux 下恢复 .ssh 的安全上下文
+INSTALL_CMD = ('umask 077; mkdir -p ~/.ssh && touch ~/.ssh/authorized_keys && '
+               '(grep -qxF "{line}" ~/.ssh/authorized_keys || echo "{line}" >> ~/.ssh/authorized_keys) && '
+               '(restorecon -R ~/.ssh >/dev/null 2>&1; true) && echo KEY_INSTALLED')
+
+def bootstrap_server(server: ServerSchema, forget_password: bool = True) -> Tuple[bool, str]:
+    if not server.os_ip: return False, "未配置 OS IP"
+    fp = sshkeys.fingerprint()
+    # 1. 下发公钥 (密码或已有密钥登录)
+    ok, output = run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password,
+                                 INSTALL_CMD.format(line=sshkeys.public_key_line()))
+    if not ok or "KEY_INSTALLED" not in output: return False, f"写入 authorized_keys 失败: {output}"
+    # 2. 不带密码重新登录，确认密钥生效
+    try:
+        get_ssh_client(server.os_ip, server.ssh_user, None).close()
+    except Exception as e:
+        return False, f"密钥登录验证失败: {e}"
+
+    # 3. 回写：重新获取最新对象，只改凭据字段
+    srv_latest = db.get_server(server.server_id)
+    if not srv_latest: return False, "服务器已被删除"
+    srv_latest.ssh_key_fp = fp
+    if forget_password: srv_latest.ssh_password = ""
+    db.upsert_server(srv_latest)
+    logger.info(f"[{server.server_id}] 已部署后端公钥 {fp}" + (" (已清除密码)" if forget_password else ""))
+    return True, "密钥已部署" + ("，密码已清除" if forget_password else "")
+
+def bootstrap_fleet(server_ids: List[str] = None, forget_password: bool = True, force: bool = False) -> dict:
+    fp = sshkeys.fingerprint()
+    servers = db.get_all_servers()
+    candidates = [servers[s] for s in server_ids if s in servers] if server_ids else list(servers.values())
+    targets = [s for s in candidates if s.os_ip and s.os_online and (force or s.ssh_key_fp != fp)]
+    results = {}
+    if targets:
+        with ThreadPoolExecutor(max_workers=min(SSH_BOOTSTRAP_WORKERS, len(targets))) as pool:
+            for srv, (ok, msg) in zip(targets, pool.map(lambda s: bootstrap_server(s, forget_password), targets)):
+                results[srv.server_id] = {"success": ok, "message": msg}
+    failed = sum(1 for r in results.values() if not r["success"])
+    skipped = len(candidates) - len(targets)
+    message = f"下发 {len(targets)} 台，失败 {failed} 台，跳过 {skipped} 台 (离线或已部署)"
+    logger.info(f"[SSH] 批量下发公钥: {message}")
+    return {"success": failed == 0, "message": message, "fingerprint": fp, "results": results}
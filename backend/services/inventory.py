@@ -0,0 +1,221 @@
+# services/inventory.py
+# 机群清单批量导入 / 导出 (CSV / JSONL)
+#   - 逐行流式解析，每 IMPORT_BATCH 条一次批量读取、校验后一次管道写入；坏行记录行号后跳过，不影响其它行
+#   - 只导入配置字段；已存在的服务器在写入前批量重新获取最新对象，仅覆盖本次提供的字段 (测试状态不受影响)
+#   - 重复检测：文件内 server_id / BMC IP / OS IP / AC 盒子+插座，以及与已登记服务器的冲突 (身份索引，见 Database)
+#   - 可选导入后检查：新服务器并发 Ping，OS 可达的再验证 SSH 凭据
+#   - 导出不含密码 (密码列留空)；空单元格导入时保留原值，因此导出文件可直接改后再导入
+import csv
+import io
+import ipaddress
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+from pydantic import ValidationError
+from config import *
+from database import db
+from models import ServerSchema
+from logger import logger
+from utils import get_ssh_client
+from services import probe
+
+FORMATS = ("csv", "jsonl")
+MODES = ("upsert", "create")
+# 可导入 / 导出的配置字段 (均为字符串)
+FIELDS = ("server_id", "bmc_ip", "os_ip", "ssh_user", "ssh_password", "description", "bmc_user", "bmc_password",
+          "memtest_runtime_configured", "memtest_mode", "ac_ip", "ac_socket", "ac_temp_ip")
+SECRET_FIELDS = ("ssh_password", "bmc_password")
+HOST_FIELDS = ("bmc_ip", "os_ip", "ac_ip", "ac_temp_ip")
+SERVER_ID_RE = re.compile(r"^[^\s/:#]{1,64}$")  # 用于存储键与 URL
+HOSTNAME_RE = re.compile(r"^[A-Za-z0-9]([A-Za-z0-9.-]{0,251}[A-Za-z0-9])?$")
+MAX_ERRORS = 200  # 返回的错误明细上限 (计数不受限)
+
+# --- 1. 解析 ---
+def iter_rows(fmt: str, stream: Iterable[str]) -> Iterator[Tuple[int, dict | None, str]]:
+    """逐行产出 (行号, 记录, 错误)；空值视为未提供"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "列数多于表头"
+                continue
+            yield reader.line_num, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}, ""
+        return
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"JSON 解析失败: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "每行应为一个 JSON 对象"
+            continue
+        yield line_no, {k: str(v).strip() for k, v in row.items() if v is not None and str(v).strip()}, ""
+
+def _valid_host(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return bool(HOSTNAME_RE.match(value)) and not value.replace(".", "").isdigit()
+
+def validate_row(row: dict) -> Tuple[dict, str]:
+    """返回 (配置字段, 错误)；未知列忽略"""
+    fields = {k: v for k, v in row.items() if k in FIELDS}
+    sid = fields.get("server_id", "")
+    if not SERVER_ID_RE.match(sid): return fields, f"server_id 无效: {sid!r}"
+    for f in HOST_FIELDS:
+        if f in fields and not _valid_host(fields[f]): return fields, f"{f} 无效: {fields[f]!r}"
+    if fields.get("memtest_mode", "gui") not in ("gui", "headless"): return fields, f"memtest_mode 无效: {fields['memtest_mode']!r}"
+    for f in ("memtest_runtime_configured", "ac_socket"):
+        if f in fields and not fields[f].isdigit(): return fields, f"{f} 应为整数: {fields[f]!r}"
+    return fields, ""
+
+# --- 2. 导入 ---
+class Importer:
+    def __init__(self, mode: str = "upsert", dry_run: bool = False):
+        self.mode, self.dry_run = mode, dry_run
+        self.seen_ids: Dict[str, int] = {}     # server_id -> 行号
+        self.seen_idents: Dict[str, str] = {}  # 身份 -> server_id (本文件内)
+        self.created: List[str] = []
+        self.updated: List[str] = []
+        self.errors: List[dict] = []
+        self.error_count = 0
+        self.total = 0
+
+    def error(self, line: int, server_id: str, msg: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS: self.errors.append({"line": line, "server_id": server_id, "error": msg})
+
+    def run(self, rows: Iterable[Tuple[int, dict | None, str]]):
+        batch = []
+        for line, row, err in rows:
+            self.total += 1
+            if self.total > IMPORT_MAX_ROWS:
+                self.error(line, "", f"超过单次导入上限 {IMPORT_MAX_ROWS} 条，其余未处理")
+                self.total -= 1
+                break
+            if err:
+                self.error(line, "", err)
+                continue
+            batch.append((line, row))
+            if len(batch) >= IMPORT_BATCH:
+                self._process(batch)
+                batch = []
+        if batch: self._process(batch)
+
+    def _process(self, batch: List[Tuple[int, dict]]):
+        # 1. 逐行校验，合并到已有配置上构造完整对象
+        existing = db.get_servers([row["server_id"] for _, row in batch if row.get("server_id")])
+        staged = []  # (行号, 本行字段, 合并后的对象)
+        for line, row in batch:
+            fields, err = validate_row(row)
+            sid = fields.get("server_id", "")
+            if not err and sid in self.seen_ids: err = f"与第 {self.seen_ids[sid]} 行的 server_id 重复"
+            if not err and sid in existing and self.mode == "create": err = "服务器已存在"
+            if not err and sid not in existing and "bmc_ip" not in fields: err = "新服务器缺少 bmc_ip"
+            if not err:
+                try:
+                    base = existing[sid].model_dump(include=set(FIELDS)) if sid in existing else {}
+                    srv = ServerSchema.model_validate({**base, **fields})
+                except ValidationError as e:
+                    err = "; ".join(f"{'.'.join(map(str, x['loc']))}: {x['msg']}" for x in e.errors())
+            if err:
+                self.error(line, sid, err)
+                continue
+            self.seen_ids[sid] = line
+            staged.append((line, fields, srv))
+
+        # 2. 重复检测：文件内 + 身份索引
+        owners = db.identity_owners(list({i for _, _, srv in staged for i in db.identities(srv)}))
+        accepted = []
+        for line, fields, srv in staged:
+            idents = db.identities(srv)
+            clash = []
+            for i, desc in idents.items():
+                if owners.get(i, srv.server_id) != srv.server_id: clash.append(f"{desc} 已被 {owners[i]} 使用")
+                elif self.seen_idents.get(i, srv.server_id) != srv.server_id: clash.append(f"{desc} 与本文件中的 {self.seen_idents[i]} 重复")
+            if clash:
+                self.error(line, srv.server_id, "; ".join(clash))
+                continue
+            for i in idents: self.seen_idents[i] = srv.server_id
+            accepted.append((fields, srv, srv.server_id in existing))
+
+        # 3. 写入：已存在的重新获取最新对象，只覆盖本行提供的字段
+        writes, previous = [], []
+        current = db.get_servers([srv.server_id for _, srv, is_update in accepted if is_update])
+        for fields, srv, is_update in accepted:
+            latest = current.get(srv.server_id) if is_update else None
+            if latest:
+                previous.append(latest.model_copy())
+                for k, v in fields.items(): setattr(latest, k, v)
+                srv = latest
+            writes.append(srv)
+            (self.updated if latest else self.created).append(srv.server_id)
+        if self.dry_run or not writes: return
+        db.upsert_servers(writes)
+        db.index_identities(writes, previous)
+
+    def summary(self) -> dict:
+        ok = len(self.created) + len(self.updated)
+        verb = "校验通过" if self.dry_run else "导入"
+        return {
+            "success": self.error_count == 0, "dry_run": self.dry_run,
+            "message": f"{verb} {ok} 台 (新增 {len(self.created)}，更新 {len(self.updated)})，跳过 {self.error_count} 行",
+            "total": self.total, "created": self.created, "updated": self.updated,
+            "skipped": self.error_count, "errors": sorted(self.errors, key=lambda e: e["line"]),
+        }
+
+def import_servers(fmt: str, stream: Iterable[str], mode: str = "upsert", dry_run: bool = False, check: bool = False) -> dict:
+    importer = Importer(mode, dry_run)
+    importer.run(iter_rows(fmt, stream))
+    result = importer.summary()
+    if not dry_run:
+        logger.info(f"[Inventory] {result['message']}")
+        if check and importer.created: result["check"] = check_servers(importer.created)
+    return result
+
+# --- 3. 导入后检查 (新服务器：并发 Ping 并回写在线状态，OS 可达的再验证 SSH 登录) ---
+def check_servers(server_ids: List[str]) -> Dict[str, dict]:
+    servers = [s for s in map(db.get_server, server_ids) if s]
+    if not servers: return {}
+    pings = probe.ping_servers(servers)
+    probe.apply_ping_results(pings)
+
+    def ssh_check(srv: ServerSchema) -> Tuple[str, str]:
+        if not pings[srv.server_id][1]: return srv.server_id, "skipped"
+        try:
+            get_ssh_client(srv.os_ip, srv.ssh_user, srv.ssh_password).close()
+            return srv.server_id, "ok"
+        except Exception as e:
+            return srv.server_id, f"error: {e}"
+
+    with ThreadPoolExecutor(max_workers=min(IMPORT_CHECK_WORKERS, len(servers))) as pool:
+        ssh = dict(pool.map(ssh_check, servers))
+    report = {sid: {"bmc_online": bmc, "os_online": os_alive, "ssh": ssh[sid]} for sid, (bmc, os_alive) in pings.items()}
+    bad = sum(1 for r in report.values() if r["ssh"] != "ok")
+    logger.info(f"[Inventory] 导入后检查 {len(report)} 台，SSH 未通过 {bad} 台")
+    return report
+
+# --- 4. 导出 ---
+def export_servers(fmt: str, fields: List[str] = None) -> Iterator[str]:
+    """逐批产出文本块，供 StreamingResponse 使用；密码字段一律留空"""
+    fields = [f for f in (fields or FIELDS) if f in ServerSchema.model_fields] or list(FIELDS)
+    if "server_id" not in fields: fields.insert(0, "server_id")
+    servers = sorted(db.get_all_servers().values(), key=lambda s: s.server_id)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore") if fmt == "csv" else None
+    if writer: writer.writeheader()
+    for i in range(0, len(servers), IMPORT_BATCH):
+        for srv in servers[i:i + IMPORT_BATCH]:
+            row = srv.model_dump(include=set(fields), mode="json")
+            for f in SECRET_FIELDS:
+                if f in row: row[f] = ""
+            if writer: writer.writerow({k: "" if row[k] is None else row[k] for k in row})
+            else: buf.write(json.dumps({k: row[k] for k in fields}, ensure_ascii=False) + "\n")
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
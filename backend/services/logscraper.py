@@ -0,0 +1,219 @@
+import os
+import re
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from utils import ssh_pool
+from database import db
+from models import ServerSchema
+from logger import logger, log_context
+from coordination import DistributedLock, LockBusyError
+from services.memparse import MemtesterParser, merge_pattern_counts, max_pattern_counts, apply_backspaces
+from services import runs as service_runs
+
+CHUNK_SIZE = 64 * 1024
+MANUAL_WAIT = 30  # 手动抓取遇到正在进行的定时抓取时等待的秒数
+
+# --- 1. 抓取目标 ---
+# 远程扫描根目录 (Trash 目录一律排除)
+SCRAPE_ROOTS = [REMOTE_WORK_DIR, REMOTE_AC_DIR, f"{REMOTE_MEMTEST_DIR}/mem_result", "/root/Test_Logs"]
+
+# 文件名 -> 解析类型 (mem_result 目录下的文件统一按 memtester 解析)
+TARGET_FILES = {
+    "reboot_all_log": "reboot",
+    "auto_debug.log": "chain",
+    "cycle_crash.log": "cycle",
+    "stressapptest.log": "stress",
+    "monitor_detail.log": "monitor",
+    "memtest_detail.log": "monitor",
+}
+# reboot_all_log 必须先于 auto_debug.log 解析 (用于比对 stop 标记)
+KIND_ORDER = ["reboot", "chain", "cycle", "stress", "memtester", "monitor"]
+
+# --- 2. 错误特征 ---
+SIGNATURES = {
+    "stress": [
+        (re.compile(r"miscompare", re.I), "error", "stressapptest miscompare"),
+        (re.compile(r"Status: FAIL"), "error", "stressapptest FAIL"),
+    ],
+    "cycle": [(re.compile(r"command not found|Segmentation fault|Killed"), "warn", "Cycle 脚本异常输出")],
+    "monitor": [(re.compile(r"主进程.*未运行|主进程丢失"), "warn", "测试主进程丢失")],
+}
+STOP_MARKER = "stop reboot automaticly"
+CYCLE_EXIT = re.compile(r"Cycle 脚本退出，返回码: (\d+)")
+
+def file_kind(path: str):
+    if "/mem_result/" in path: return "memtester"
+    return TARGET_FILES.get(os.path.basename(path))
+
+# --- 3. 流式解析 (逐行喂入，状态只保留计数) ---
+class SignatureParser:
+    def __init__(self, meta: dict):
+        self.meta = meta  # {"stops": 已见 stop 标记数, "exits": 已见 Cycle 退出数, "mt_current": {...}}
+        self.events = []
+        self.memtester = MemtesterParser(meta.setdefault("mt_current", {}))
+
+    def _emit(self, path, level, signature, line):
+        self.events.append({
+            "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "file": path, "level": level, "signature": signature, "line": line.strip()[:200],
+        })
+
+    def feed(self, kind: str, path: str, line: str):
+        if kind == "memtester":
+            failed = self.memtester.feed(path, line)
+            if failed: self._emit(path, "error", f"memtester FAILURE ({failed})", apply_backspaces(line))
+            return
+        if kind == "reboot":
+            if STOP_MARKER in line: self.meta["stops"] += 1
+            return
+        if kind == "chain":
+            m = CYCLE_EXIT.search(line)
+            if not m: return
+            self.meta["exits"] += 1
+            if m.group(1) != "0":
+                self._emit(path, "error", f"Cycle 非正常退出 (rc={m.group(1)})", line)
+            if self.meta["exits"] > self.meta["stops"]:
+                self._emit(path, "error", "Cycle 退出但缺少 stop reboot automaticly", line)
+                self.meta["exits"] = self.meta["stops"]  # 重新对齐，避免后续重复告警
+            return
+        for pattern, level, signature in SIGNATURES.get(kind, []):
+            if pattern.search(line):
+                self._emit(path, level, signature, line)
+                break
+
+# --- 4. 远程读取 ---
+def list_remote_files(ssh) -> dict:
+    """一次 exec 列出所有目标文件 (含 rotate_log 产生的 *.bak)，返回 {path: (inode, size)}"""
+    names = " -o ".join(f"-name '{n}'" for n in TARGET_FILES)
+    cmd = (f"find {' '.join(SCRAPE_ROOTS)} -maxdepth 3 -type f -not -path '*/Trash/*' "
+           f"\\( {names} -o -path '*/mem_result/*' -o -name '*.bak' \\) -printf '%i %s %p\\n' 2>/dev/null; true")
+    stdin, stdout, stderr = ssh.exec_command(cmd, timeout=30)
+    listing = {}
+    for row in stdout.read().decode(errors="replace").splitlines():
+        parts = row.split(" ", 2)
+        if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+            listing[parts[2]] = (int(parts[0]), int(parts[1]))
+    return listing
+
+def read_new_lines(sftp, path, offset, size, on_line) -> int:
+    """从 offset 开始按块读取新增内容，只消费完整的行；返回新的 offset (停在最后一个换行之后)"""
+    end = min(size, offset + SCRAPE_MAX_BYTES)
+    pos, pending = offset, b""
+    with sftp.open(path, "rb") as f:
+        f.seek(offset)
+        while pos < end:
+            chunk = f.read(min(CHUNK_SIZE, end - pos))
+            if not chunk: break
+            pos += len(chunk)
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                on_line(line.decode("utf-8", errors="replace"))
+    # 超长的无换行内容直接跳过，防止 offset 卡死
+    if pending and len(pending) >= SCRAPE_MAX_BYTES: return pos
+    return pos - len(pending)
+
+# --- 5. 单台服务器抓取 ---
+def scrape_server(server: ServerSchema) -> SignatureParser:
+    state = db.get_scrape_state(server.server_id)
+    files_state = state.setdefault("files", {})
+    meta = state.setdefault("meta", {"stops": 0, "exits": 0})
+    parser = SignatureParser(meta)
+
+    with ssh_pool.session(server.os_ip, server.ssh_user, server.ssh_password) as (ssh, sftp):
+        listing = list_remote_files(ssh)
+        by_inode = {inode: (path, size) for path, (inode, size) in listing.items()}
+        live = [p for p in listing if file_kind(p)]
+        live.sort(key=lambda p: (KIND_ORDER.index(file_kind(p)), p))
+
+        for path in live:
+            inode, size = listing[path]
+            kind = file_kind(path)
+            feed = lambda line, k=kind, p=path: parser.feed(k, p, line)
+            st = files_state.get(path)
+
+            if st and st["inode"] != inode:
+                rotated = by_inode.get(st["inode"])
+                if rotated and rotated[1] > st["offset"]:
+                    # 文件被 rotate_log 改名为 *.bak (inode 不变)：先补读旧文件剩余部分
+                    read_new_lines(sftp, rotated[0], st["offset"], rotated[1], feed)
+                elif not rotated and kind == "reboot":
+                    # 旧文件已被移走 (重新部署)，标记计数随新一轮测试重置
+                    meta["stops"] = meta["exits"] = 0
+                st = None
+
+            offset = st["offset"] if st else 0
+            if offset > size: offset = 0  # 文件被截断 (如 cycle_crash.log 每阶段重写)
+            if size > offset: offset = read_new_lines(sftp, path, offset, size, feed)
+            files_state[path] = {"inode": inode, "offset": offset}
+
+        # 清理既不存在、也没有被改名保留的文件状态
+        for path in list(files_state):
+            if path not in listing and files_state[path]["inode"] not in by_inode:
+                del files_state[path]
+
+    # memtester 分项按运行累计 (换了运行即重新计数)，与 Webhook 上报的累计值逐项取较大值
+    totals = state.get("memtester_totals", {})
+    run_id = server.active_runs.get("memtest", "")
+    if totals.get("run") != run_id: totals = {"run": run_id, "counts": {}}
+    totals["counts"] = merge_pattern_counts(totals["counts"], parser.memtester.deltas)
+    state["memtester_totals"] = totals
+    parser.memtester.totals = totals["counts"]
+
+    db.save_scrape_state(server.server_id, state)
+    return parser
+
+def scrape_and_record(server: ServerSchema, wait: float = 0) -> list:
+    """
+    同一服务器的抓取互斥 (手动触发与 Leader 定时抓取可能同时进行)：偏移量的读取-解析-提交在锁内完成，
+    否则同一段日志会被解析两次、错误计数翻倍。wait 秒内拿不到锁时抛 LockBusyError
+    """
+    lock = DistributedLock(f"scrape:{server.server_id}", label="logscraper")
+    if not lock.acquire(timeout=wait): raise LockBusyError(f"[{server.server_id}] 日志正在抓取中，请稍后重试")
+    try:
+        with log_context(server_id=server.server_id, action="logscraper"):
+            return _scrape_and_record(server)
+    finally:
+        lock.release()
+
+def _scheduled_scrape(server: ServerSchema) -> list:
+    try:
+        return scrape_and_record(server)
+    except LockBusyError:
+        return []  # 手动抓取正在进行，本周期跳过
+
+def _scrape_and_record(server: ServerSchema) -> list:
+    try:
+        parser = scrape_server(server)
+    except Exception as e:
+        logger.warning(f"[{server.server_id}] 日志抓取失败: {e}")
+        return []
+
+    events, deltas = parser.events, parser.memtester.deltas
+    db.push_log_events(server.server_id, events, SCRAPE_EVENT_KEEP)
+    errors = [e for e in events if e["level"] == "error"]
+    if errors or deltas:
+        srv_latest = db.get_server(server.server_id)
+        if srv_latest:
+            if errors:
+                srv_latest.log_error_count += len(errors)
+                srv_latest.last_log_error = f"{errors[-1]['time']} {errors[-1]['signature']}"
+                service_runs.attribute_errors(srv_latest, errors)
+            if deltas:
+                # memtester 分项计数 (赋新字典，不原地修改)
+                srv_latest.memtest_patterns = max_pattern_counts(srv_latest.memtest_patterns, parser.memtester.totals)
+                srv_latest.memtest_fail_count = sum(fail for _, fail in srv_latest.memtest_patterns.values())
+            db.upsert_server(srv_latest)
+    if errors:
+        logger.warning(f"[{server.server_id}] 日志发现 {len(errors)} 条错误: {errors[-1]['signature']}")
+    return events
+
+# --- 6. 定时任务入口 ---
+def scrape_all():
+    servers = [s for s in db.get_all_servers().values()
+               if s.os_ip and s.os_online and (s.reboot_status == "Running" or s.ac_status == "Running" or s.memtest_status == "Running")]
+    if servers:
+        with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as pool:
+            list(pool.map(_scheduled_scrape, servers))
+    ssh_pool.prune()
@@ -1,7 +1,9 @@
+import datetime
 import os
 from config import *
 from utils import get_ssh_client, run_ssh_command
 from models import ServerSchema
+from artifacts import ArtifactWriter
 
 def deploy_meminfo(server: ServerSchema):
     try:
@@ -19,7 +21,7 @@ def deploy_meminfo(server: ServerSchema):
     except Exception as e:
         return False, str(e)
 
-async def run_meminfo(server: ServerSchema):
+def run_meminfo(server: ServerSchema):
     # 改进点：
     # 1. sed -i 's/\r$//' ...  -> 自动修复 Windows 换行符问题 (这是导致“没反应”的头号杀手)
     # 2. &&                  -> 只有 cd 成功且格式修复成功才运行，避免在错误目录下乱跑
@@ -31,7 +33,8 @@ async def run_meminfo(server: ServerSchema):
     # 确保 run_ssh_command 能够返回命令的执行结果（字符串）
     return run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, cmd)
 
-async def download_meminfo_result(server: ServerSchema):
+def download_meminfo_result(server: ServerSchema):
+    """结果文件经 SFTP 直接写入产物存储 (按内容去重)，返回 (success, msg, artifact)"""
     try:
         ssh = get_ssh_client(server.os_ip, server.ssh_user, server.ssh_password)
         stdin, stdout, stderr = ssh.exec_command(f"find {REMOTE_MEM_DIR} -name '*.txt' | head -1")
@@ -39,13 +42,15 @@ async def download_meminfo_result(server: ServerSchema):
         
         if not remote_path: return False, "未找到结果文件", None
         
-        if not os.path.exists(LOCAL_DOWNLOAD_DIR): os.makedirs(LOCAL_DOWNLOAD_DIR)
-        local_path = os.path.join(LOCAL_DOWNLOAD_DIR, f"{server.server_id}_{os.path.basename(remote_path)}")
-        
         sftp = ssh.open_sftp()
-        sftp.get(remote_path, local_path)
+        # 以结果文件的修改时间标识这次 MemInfo 运行：重复下载同一份结果时沿用原产物记录
+        mtime = sftp.stat(remote_path).st_mtime
+        run_id = f"meminfo-{datetime.datetime.fromtimestamp(mtime).strftime('%Y%m%d_%H%M%S')}"
+        with ArtifactWriter(server.server_id, "meminfo", run_id, os.path.basename(remote_path)) as writer:
+            sftp.getfo(remote_path, writer)
+            artifact = writer.commit()
         sftp.close()
         ssh.close()
-        return True, "下载成功", local_path
+        return True, "下载成功", artifact
     except Exception as e:
-        return False, str(e), None
\ No newline at end of file
+        return False, str(e), None
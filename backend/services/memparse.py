@@ -0,0 +1,85 @@
+import re
+
+# --- 1. memtester 测试项 (memtester 4.x 输出顺序) ---
+MEMTESTER_PATTERNS = [
+    "Stuck Address", "Random Value", "Compare XOR", "Compare SUB", "Compare MUL",
+    "Compare DIV", "Compare OR", "Compare AND", "Sequential Increment", "Solid Bits",
+    "Block Sequential", "Checkerboard", "Bit Spread", "Bit Flip", "Walking Ones",
+    "Walking Zeroes", "8-bit Writes", "16-bit Writes",
+]
+HEADER_RE = re.compile(r"^\s*(" + "|".join(re.escape(p) for p in MEMTESTER_PATTERNS) + r")\s*:(.*)$")
+OK_RE = re.compile(r"\bok\b")
+
+def apply_backspaces(line: str) -> str:
+    """还原终端效果：memtester 用退格符刷新 setting/testing 进度"""
+    if "\b" not in line: return line
+    out = []
+    for ch in line:
+        if ch == "\b":
+            if out: out.pop()
+        else:
+            out.append(ch)
+    return "".join(out)
+
+# --- 2. 流式解析 ---
+class MemtesterParser:
+    """
+    逐行解析 memtester 输出，统计每个测试项的通过/失败次数。
+    current: {文件路径: 当前未出结果的测试项}，跨抓取周期保存，
+    因为 FAILURE 明细可能晚于测试项标题落盘。
+    """
+    def __init__(self, current: dict):
+        self.current = current
+        self.deltas = {}  # 本次新增 {测试项: [通过, 失败]}
+        self.totals = {}  # 当前运行的累计 (由 logscraper 按运行汇总后填入)
+
+    def _count(self, pattern: str, ok: bool):
+        counts = self.deltas.setdefault(pattern, [0, 0])
+        counts[0 if ok else 1] += 1
+
+    def feed(self, path: str, line: str):
+        """返回失败的测试项名称 (首次判定失败时)，否则 None"""
+        line = apply_backspaces(line)
+        m = HEADER_RE.match(line)
+        if m:
+            pattern, rest = m.group(1), m.group(2)
+            self.current.pop(path, None)
+            if "FAILURE" in rest:
+                self._count(pattern, False)
+                return pattern
+            if OK_RE.search(rest):
+                self._count(pattern, True)
+            else:
+                self.current[path] = pattern
+            return None
+
+        pattern = self.current.get(path)
+        if not pattern: return None
+        if "FAILURE" in line:
+            self.current.pop(path)
+            self._count(pattern, False)
+            return pattern
+        if OK_RE.search(line):
+            self.current.pop(path)
+            self._count(pattern, True)
+        return None
+
+def max_pattern_counts(current: dict, totals: dict) -> dict:
+    """
+    合并两个来源的本次测试累计值 (daemon 上报 / 日志抓取)：逐项取较大者。
+    两者统计的是同一批输出，各自单调递增，取较大值不会重复计数。
+    """
+    merged = {k: list(v) for k, v in current.items()}
+    for pattern, (ok, fail) in totals.items():
+        counts = merged.setdefault(pattern, [0, 0])
+        counts[0], counts[1] = max(counts[0], ok), max(counts[1], fail)
+    return merged
+
+def merge_pattern_counts(total: dict, deltas: dict) -> dict:
+    """合并计数，返回新字典 (不原地修改，便于直接赋值回 ServerSchema)"""
+    merged = {k: list(v) for k, v in total.items()}
+    for pattern, (ok, fail) in deltas.items():
+        counts = merged.setdefault(pattern, [0, 0])
+        counts[0] += ok
+        counts[1] += fail
+    return merged
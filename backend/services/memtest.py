@@ -3,6 +3,36 @@ from config import *
 from utils import get_ssh_client, run_ssh_command
 from models import ServerSchema
 from logger import logger
+from services import archive as service_archive
+from services.memparse import MEMTESTER_PATTERNS
+
+# memtester 分项计数 (与 memparse.MemtesterParser 同一判定规则)，读入 mem_result 新增内容，输出 {"测试项": [通过, 失败]}
+# 各文件之间以 @@EOF 分隔；退格符 (\010) 为 memtester 刷新进度用，先去掉
+PATTERN_AWK = r"""
+BEGIN { n = split(pats, list, "|"); for (i = 1; i <= n; i++) known[list[i]] = 1 }
+$0 == "@@EOF" { cur = ""; next }
+{
+    gsub("\010", "")
+    p = index($0, ":")
+    name = p ? substr($0, 1, p - 1) : ""
+    gsub(/^ +| +$/, "", name)
+    if (name in known) {
+        rest = substr($0, p + 1); cur = ""
+        if (rest ~ /FAILURE/) fail[name]++
+        else if (rest ~ /(^|[^A-Za-z])ok([^A-Za-z]|$)/) ok[name]++
+        else cur = name
+        next
+    }
+    if (cur == "") next
+    if ($0 ~ /FAILURE/) { fail[cur]++; cur = "" }
+    else if ($0 ~ /(^|[^A-Za-z])ok([^A-Za-z]|$)/) { ok[cur]++; cur = "" }
+}
+END {
+    out = ""
+    for (i = 1; i <= n; i++) if (ok[list[i]] + fail[list[i]]) out = out sprintf("%s\"%s\":[%d,%d]", out == "" ? "" : ",", list[i], ok[list[i]], fail[list[i]])
+    printf "{%s}", out
+}
+"""
 
 # --- 1. 部署逻辑 (保持不变) ---
 def deploy_memtest_env(server: ServerSchema):
@@ -10,8 +40,9 @@ def deploy_memtest_env(server: ServerSchema):
         logger.info(f"[{server.server_id}] 开始部署 Memtest 环境...")
         script_src = os.path.join(LOCAL_SCRIPT_DIR, SCRIPT_MEMTEST_NAME)
         tar_src = os.path.join(LOCAL_SCRIPT_DIR, FILE_MEMTEST_TAR)
+        supervisor_src = os.path.join(LOCAL_SCRIPT_DIR, SCRIPT_MEMTEST_SUPERVISOR_NAME)
         
-        if not os.path.exists(script_src) or not os.path.exists(tar_src):
+        if not all(os.path.exists(p) for p in (script_src, tar_src, supervisor_src)):
             return False, "本地 Memtest 文件缺失"
 
         ssh = get_ssh_client(server.os_ip, server.ssh_user, server.ssh_password)
@@ -31,6 +62,7 @@ def deploy_memtest_env(server: ServerSchema):
         sftp = ssh.open_sftp()
         sftp.put(script_src, f"{REMOTE_MEMTEST_DIR}/{SCRIPT_MEMTEST_NAME}")
         sftp.put(tar_src, f"{REMOTE_MEMTEST_DIR}/{FILE_MEMTEST_TAR}")
+        sftp.put(supervisor_src, f"{REMOTE_MEMTEST_DIR}/{SCRIPT_MEMTEST_SUPERVISOR_NAME}")
         sftp.close()
 
         cmd_install = f"""
@@ -43,7 +75,7 @@ def deploy_memtest_env(server: ServerSchema):
                 if [ ! -f "memtester" ]; then make && make install; fi
                 cd ..
             fi
-            chmod +x {SCRIPT_MEMTEST_NAME}
+            chmod +x {SCRIPT_MEMTEST_NAME} {SCRIPT_MEMTEST_SUPERVISOR_NAME}
         """
         stdin, stdout, stderr = ssh.exec_command(cmd_install)
         if stdout.channel.recv_exit_status() != 0:
@@ -55,9 +87,9 @@ def deploy_memtest_env(server: ServerSchema):
     except Exception as e:
         return False, f"部署异常: {str(e)}"
 
-# --- 2. 启动逻辑 (完美模拟用户打开终端) ---
-def start_memtest(server: ServerSchema, runtime: str):
-    logger.info(f"[{server.server_id}] 启动 Memtest (Runtime={runtime})")
+# --- 2. 启动逻辑 (gui: 模拟用户打开终端 / headless: supervisor 后台执行) ---
+def start_memtest(server: ServerSchema, runtime: str, mode: str = "gui", plan: str = ""):
+    logger.info(f"[{server.server_id}] 启动 Memtest (Runtime={runtime}, Mode={mode})")
 
     # 1. 杀掉旧进程
     kill_old_cmd = f"""
@@ -67,16 +99,20 @@ def start_memtest(server: ServerSchema, runtime: str):
             if [ -n "$PIDS" ]; then echo "$PIDS" | xargs -r kill -9; fi
         }}
         safe_kill "memtest_daemon.sh"
+        safe_kill "{SCRIPT_MEMTEST_SUPERVISOR_NAME}"
         safe_kill "{SCRIPT_MEMTEST_NAME}"
         killall -9 memtester 2>/dev/null || true
     """
     run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, kill_old_cmd)
 
     # 2. 生成监控脚本
+    patterns = "|".join(MEMTESTER_PATTERNS)
     monitor_script = f"""#!/bin/bash
 SERVER_ID="{server.server_id}"
 URL="http://{BACKEND_IP_PORT}/report/webhook"
 
+RESULT_DIR="{REMOTE_MEMTEST_DIR}/mem_result"
+BASELINE="{REMOTE_MEMTEST_DIR}/.memtest_baseline"
 LOG_DIR="/root/Test_Logs/Memtest"
 mkdir -p "$LOG_DIR"
 LOCAL_LOG="$LOG_DIR/memtest_detail.log"
@@ -99,47 +135,119 @@ log_to_local() {{
     rotate_log
 }}
 
+# EDAC 计数直接读 sysfs 累计值 (O(1))，MCE 从内核日志统计
+read_edac() {{
+    cat /sys/devices/system/edac/mc/mc*/$1 2>/dev/null | awk '{{s+=$1}} END {{print s+0}}'
+}}
+
+count_mce() {{
+    dmesg 2>/dev/null | grep -ciE "mce:|machine check"
+}}
+
+# 基线：EDAC / MCE 为开机以来的累计值，mem_result 可能残留上一轮输出
+# 启动测试前执行 "memtest_daemon.sh baseline" 记录，之后只上报本次测试期间的增量
+if [ "$1" = "baseline" ]; then
+    {{
+        echo "ce $(read_edac ce_count)"
+        echo "ue $(read_edac ue_count)"
+        echo "mce $(count_mce)"
+        for f in "$RESULT_DIR"/*.log; do [ -f "$f" ] && echo "file $(stat -c%s "$f") $f"; done
+    }} > "$BASELINE"
+    exit 0
+fi
+
+declare -A BASE_SIZE
+BASE_CE=0; BASE_UE=0; BASE_MCE=0
+if [ -f "$BASELINE" ]; then
+    while read -r kind value path; do
+        case "$kind" in
+            ce) BASE_CE=$value ;;
+            ue) BASE_UE=$value ;;
+            mce) BASE_MCE=$value ;;
+            file) BASE_SIZE["$path"]=$value ;;
+        esac
+    done < "$BASELINE"
+fi
+
+# 计数器被清零 (edac reset_counters / dmesg 轮转) 时当前值即为增量
+since_base() {{
+    local d=$(( ${{1:-0}} - ${{2:-0}} ))
+    [ $d -lt 0 ] && d=${{1:-0}}
+    echo $d
+}}
+
+count_patterns() {{
+    for f in "$RESULT_DIR"/*.log; do
+        [ -f "$f" ] || continue
+        local base=${{BASE_SIZE["$f"]:-0}}
+        [ $(stat -c%s "$f") -lt $base ] && base=0
+        tail -c +$((base + 1)) "$f"
+        echo
+        echo "@@EOF"
+    done | awk -v pats="{patterns}" '{PATTERN_AWK}'
+}}
+
 report_backend() {{
     local status=$1
     local msg=$2
-    JSON_DATA="{{\\"server_id\\": \\"$SERVER_ID\\", \\"task_type\\": \\"memtest\\", \\"phase\\": \\"$msg\\", \\"status\\": \\"$status\\"}}"
+    local ce=$(since_base $(read_edac ce_count) $BASE_CE)
+    local ue=$(since_base $(read_edac ue_count) $BASE_UE)
+    local mce=$(since_base $(count_mce) $BASE_MCE)
+    local patterns=$(count_patterns)
+    [ -n "$patterns" ] || patterns='{{}}'
+    JSON_DATA="{{\\"server_id\\": \\"$SERVER_ID\\", \\"task_type\\": \\"memtest\\", \\"phase\\": \\"$msg\\", \\"status\\": \\"$status\\", \\"edac_ce\\": ${{ce:-0}}, \\"edac_ue\\": ${{ue:-0}}, \\"mce_count\\": ${{mce:-0}}, \\"memtest_patterns\\": $patterns}}"
     curl --noproxy "*" -s -X POST "$URL" -H "Content-Type: application/json" -d "$JSON_DATA" >/dev/null 2>&1
 }}
 
+# 错误特征 (UE / CE / MCE / FAILURE 行数)：变化时立即上报
+fail_signature() {{
+    echo "$(read_edac ue_count)/$(read_edac ce_count)/$(count_mce)/$(cat "$RESULT_DIR"/*.log 2>/dev/null | grep -c FAILURE)"
+}}
+
 log_to_local "Daemon Started. Waiting 15s..."
 sleep 15
 
+# 每 5 秒检查一次：出现新错误时立即上报，否则每 30 秒上报一次进度
+TICK=0
+LAST_SIG=""
 while true; do
     RAW_PIDS=$(pgrep -f "memtester")
     VALID_PIDS=$(echo "$RAW_PIDS" | xargs -r ps -fp 2>/dev/null | grep -v "grep" | grep -v "memtest_daemon" | grep -v "bash -c" | grep -v "PID" | awk '{{print $2}}')
     COUNT=$(echo "$VALID_PIDS" | wc -w)
 
     if [ -n "$VALID_PIDS" ]; then
-        MSG="压测中 ($COUNT 个核心运行中)"
-        log_to_local "$MSG"
-        report_backend "Running" "$MSG"
+        SIG=$(fail_signature)
+        if [ $((TICK % 6)) -eq 0 ] || [ "$SIG" != "$LAST_SIG" ]; then
+            MSG="压测中 ($COUNT 个核心运行中)"
+            log_to_local "$MSG"
+            report_backend "Running" "$MSG"
+        fi
+        LAST_SIG=$SIG
+        TICK=$((TICK + 1))
     else
         MSG="压测已结束"
         log_to_local "$MSG. Stopping Daemon."
         report_backend "Finished" "$MSG"
         exit 0
     fi
-    sleep 30
+    sleep 5
 done
 """
     
     # 3. 启动命令
-    cmd = f"""
-        cd {REMOTE_MEMTEST_DIR} || exit 1
-        
-        # 写入监控脚本
-        cat > memtest_daemon.sh << 'EOF_MON'
-{monitor_script}
-EOF_MON
-        
-        if command -v dos2unix >/dev/null 2>&1; then dos2unix -q *.sh; fi
-        chmod +x memtest_daemon.sh
-        
+    if mode == "headless":
+        # plan 为空时 supervisor 在本机自行按节点均分
+        plan_arg = f"-p {plan}" if plan else ""
+        launch_cmd = f"""
+        # 无界面模式：supervisor 负责 NUMA 绑定与运行时长，输出写入 mem_result/
+        rm -f .supervisor.pid
+        setsid nohup bash {SCRIPT_MEMTEST_SUPERVISOR_NAME} -t {runtime} -r {MEMTEST_MEM_RATIO} {plan_arg} > supervisor.out 2>&1 < /dev/null &
+        sleep 2
+        if [ ! -f .supervisor.pid ]; then echo "FAILED: Supervisor failed to start"; cat supervisor.log 2>/dev/null | tail -3; exit 1; fi
+        """
+        launched_msg = "SUCCESS: Memtest Launched (Headless)"
+    else:
+        launch_cmd = f"""
         # 1. 替换 runtime (这一步必须做)
         sed -i 's/^runtime=[0-9]*/runtime={runtime}/' {SCRIPT_MEMTEST_NAME}
         
@@ -161,10 +269,25 @@ EOF_MON
         #    exec bash    -> 关键！脚本执行完(或被中断)后，保持窗口不关闭，变成一个 Shell
         nohup gnome-terminal --working-directory="{REMOTE_MEMTEST_DIR}" --title="Memtest Execution" --geometry=100x30 -- bash -c "./{SCRIPT_MEMTEST_NAME}; echo '===================='; echo 'Script Process Ended.'; exec bash" >/dev/null 2>&1 &
         
+        """
+        launched_msg = "SUCCESS: Memtest Launched in Terminal"
+
+    cmd = f"""
+        cd {REMOTE_MEMTEST_DIR} || exit 1
+        
+        # 写入监控脚本
+        cat > memtest_daemon.sh << 'EOF_MON'
+{monitor_script}
+EOF_MON
+        
+        if command -v dos2unix >/dev/null 2>&1; then dos2unix -q *.sh; fi
+        chmod +x memtest_daemon.sh
+        ./memtest_daemon.sh baseline
+        {launch_cmd}
         # 启动后台上报 Daemon
         nohup ./memtest_daemon.sh >/dev/null 2>&1 < /dev/null &
         
-        echo "SUCCESS: Memtest Launched in Terminal"
+        echo "{launched_msg}"
     """
     return run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, cmd)
 
@@ -175,28 +298,17 @@ def stop_memtest(server: ServerSchema):
     stop_cmd = f"""
         kill_target() {{ pgrep -f "$1" | grep -v grep | grep -v python | xargs -r kill -9 2>/dev/null || true; }}
         kill_target "memtest_daemon.sh"
+        kill_target "{SCRIPT_MEMTEST_SUPERVISOR_NAME}"
         kill_target "{SCRIPT_MEMTEST_NAME}"
         killall -9 memtester 2>/dev/null || true
         pkill -f "bash -c .*memtester" || true
     """
     run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, stop_cmd)
 
-    archive_cmd = f"""
-        cd {REMOTE_MEMTEST_DIR} || exit 1
-        dmesg > dmesg.log
-        
-        TIME_TAG=$(date +%Y%m%d_%H%M%S)
-        TAR_NAME="memtest_result_$TIME_TAG.tar.gz"
-        
-        FILES_TO_TAR="dmesg.log"
-        if [ -d "mem_result" ]; then
-             FILES_TO_TAR="$FILES_TO_TAR mem_result"
-        fi
-        
-        tar -czvf $TAR_NAME $FILES_TO_TAR
-        echo "SUCCESS: Archived Result to $TAR_NAME"
-    """
-    return run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, archive_cmd)
+    # 导出 dmesg 后与 mem_result 一起增量打包，流式传回后端产物存储
+    ok, msg, _ = service_archive.collect_logs(server, "memtest", REMOTE_MEMTEST_DIR, ["dmesg.log", "mem_result"],
+                                              pre="dmesg > dmesg.log")
+    return ok, msg
 
 def archive_memtest(server: ServerSchema):
     return stop_memtest(server)
\ No newline at end of file
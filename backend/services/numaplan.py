@@ -0,0 +1,84 @@
+import datetime
+from typing import List
+from config import *
+from utils import run_ssh_command
+from models import ServerSchema, NumaNode
+from logger import logger
+
+MIN_INSTANCE_MB = 16
+
+# --- 1. 拓扑采集 (一次 SSH：每个 NUMA 节点的 cpulist 与 MemFree/MemTotal) ---
+TOPOLOGY_CMD = r"""
+if ls -d /sys/devices/system/node/node[0-9]* >/dev/null 2>&1; then
+    for d in /sys/devices/system/node/node[0-9]*; do
+        echo "TOPO $(basename $d) $(cat $d/cpulist) $(awk '/MemFree/ {f=$4} /MemTotal/ {t=$4} END {print f+0, t+0}' $d/meminfo)"
+    done
+else
+    echo "TOPO node0 0-$(($(nproc) - 1)) $(awk '/MemAvailable/ {f=$2} /MemTotal/ {t=$2} END {print f+0, t+0}' /proc/meminfo)"
+fi
+"""
+
+def expand_cpulist(cpulist: str) -> List[int]:
+    cpus = []
+    for part in cpulist.split(","):
+        if not part: continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def parse_topology(output: str) -> List[NumaNode]:
+    nodes = []
+    for row in output.splitlines():
+        parts = row.split()
+        if len(parts) != 5 or parts[0] != "TOPO": continue
+        try:
+            nodes.append(NumaNode(
+                node=int(parts[1].replace("node", "")), cpus=expand_cpulist(parts[2]),
+                mem_free_mb=int(parts[3]) // 1024, mem_total_mb=int(parts[4]) // 1024,
+            ))
+        except ValueError:
+            continue
+    return sorted(nodes, key=lambda n: n.node)
+
+def collect_topology(server: ServerSchema) -> List[NumaNode]:
+    success, output = run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, TOPOLOGY_CMD)
+    if not success: return []
+    nodes = parse_topology(output)
+    logger.info(f"[{server.server_id}] NUMA 拓扑: " + ", ".join(
+        f"node{n.node}={len(n.cpus)}核/{n.mem_free_mb}MB空闲" for n in nodes))
+    return nodes
+
+def topology_timestamp() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# --- 2. Memtest 放置计划：每个核心一个实例，内存绑定本节点 ---
+def build_memtest_plan(nodes: List[NumaNode], ratio: float = MEMTEST_MEM_RATIO) -> List[dict]:
+    plan = []
+    for n in nodes:
+        total_mb = int(n.mem_free_mb * ratio)
+        count = len(n.cpus)
+        # 内存不足以让每个核心分到 MIN_INSTANCE_MB 时减少实例数
+        while count > 1 and total_mb // count < MIN_INSTANCE_MB: count //= 2
+        if count == 0 or total_mb // count < MIN_INSTANCE_MB: continue
+        mb = total_mb // count
+        plan.extend({"node": n.node, "cpu": cpu, "mb": mb} for cpu in n.cpus[:count])
+    return plan
+
+def format_memtest_plan(plan: List[dict]) -> str:
+    """supervisor -p 参数格式: node:cpu:mb,node:cpu:mb,..."""
+    return ",".join(f"{p['node']}:{p['cpu']}:{p['mb']}" for p in plan)
+
+# --- 3. stressapptest 参数：线程数与内存量按实际硬件计算 ---
+def build_stress_args(nodes: List[NumaNode], ratio: float = STRESS_MEM_RATIO) -> str:
+    """
+    拷贝线程 (-m) 与 CPU 线程 (-C) 各占一半逻辑核，总线程数等于核数；
+    -M 取所有节点空闲内存之和的 ratio。无拓扑信息时沿用脚本默认值。
+    """
+    if not nodes: return STRESS_DEFAULT_ARGS
+    cpus = sum(len(n.cpus) for n in nodes)
+    threads = max(1, cpus // 2)
+    mem_mb = int(sum(n.mem_free_mb for n in nodes) * ratio)
+    return f"-M {mem_mb} -m {threads} -C {threads}"
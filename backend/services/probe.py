@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from config import *
+from utils import ping_ip
+from database import db
+from models import ServerSchema
+from logger import logger
+from metrics import PROBES
+
+# --- 1. 并发 Ping (不持有服务器对象，允许 Webhook 并发写入) ---
+def ping_servers(servers: List[ServerSchema]) -> Dict[str, Tuple[bool, bool]]:
+    def probe(server):
+        bmc_alive = ping_ip(server.bmc_ip)
+        # 如果配置了 OS IP 才 ping，否则默认为 False
+        os_alive = ping_ip(server.os_ip) if server.os_ip else False
+        return server.server_id, (bmc_alive, os_alive)
+
+    if not servers: return {}
+    with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(servers))) as pool:
+        return dict(pool.map(probe, servers))
+
+# --- 2. 回写：Ping 结束后重新获取最新对象，只在在线状态变化时写入 ---
+def apply_ping_results(results: Dict[str, Tuple[bool, bool]]) -> Tuple[List[ServerSchema], set]:
+    """
+    状态不变不写库：避免每轮探测都刷新版本号，使 GET /servers 的 ETag 在空闲时保持不变。
+    (前端会根据 reboot_status='Running' && os_online=False 显示为'重启中')
+    返回 (最新对象列表, 在线状态发生变化的 server_id)
+    """
+    latest, changed = [], set()
+    for s_id, (bmc_alive, os_alive) in results.items():
+        srv = db.get_server(s_id)
+        if not srv: continue  # 防止 Ping 期间服务器被删了
+        if srv.bmc_online != bmc_alive or srv.os_online != os_alive:
+            logger.info(f"[{s_id}] 在线状态变化: BMC {srv.bmc_online}->{bmc_alive}, OS {srv.os_online}->{os_alive}")
+            srv.bmc_online, srv.os_online = bmc_alive, os_alive
+            db.upsert_server(srv)
+            changed.add(s_id)
+        latest.append(srv)
+    return latest, changed
+
+# --- 3. 自适应探测节奏 (每台服务器独立的下次探测时间) ---
+#   fast    : 测试运行中 (reboot / acreboot 循环)，固定短间隔，精确捕捉重启窗口
+#   stable  : 在线且状态未变，间隔从 PROBE_INTERVAL 起指数退避到 PROBE_MAX_INTERVAL
+#   offline : BMC/OS 均不可达，同样退避并加随机抖动，避免大量离线机同时重试
+# 任一状态变化立即回到最短间隔；每个周期最多探测 PROBE_MAX_PER_TICK 台 (最逾期的优先)，总负载有上限
+def cadence(srv: ServerSchema) -> str:
+    if srv.reboot_status == "Running" or srv.ac_status == "Running": return "fast"
+    if not srv.bmc_online and not srv.os_online: return "offline"
+    return "stable"
+
+class ProbeSchedule:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # server_id -> {"last": 上次探测, "next": 下次到期, "interval": 当前间隔}
+
+    def _due_at(self, srv: ServerSchema, entry) -> float:
+        # 进入测试 (由路由/活动启动，不经探测) 后不等旧的长间隔到期
+        if cadence(srv) == "fast": return min(entry["next"], entry["last"] + PROBE_FAST_INTERVAL)
+        return entry["next"]
+
+    def due(self, servers: List[ServerSchema], now: float, limit: int) -> List[ServerSchema]:
+        ids = {s.server_id for s in servers}
+        with self._lock:
+            for s_id in [k for k in self._entries if k not in ids]: del self._entries[s_id]  # 已删除的服务器
+            due = [(self._due_at(s, self._entries[s.server_id]) if s.server_id in self._entries else 0.0, s) for s in servers]
+        due = sorted((d for d in due if d[0] <= now), key=lambda d: d[0])
+        return [s for _, s in due[:limit]]
+
+    def record(self, srv: ServerSchema, changed: bool, now: float):
+        kind = cadence(srv)
+        with self._lock:
+            entry = self._entries.setdefault(srv.server_id, {"last": now, "next": now, "interval": 0.0})
+            if kind == "fast":
+                interval = PROBE_FAST_INTERVAL
+            elif changed or not entry["interval"]:
+                interval = PROBE_INTERVAL
+            else:
+                interval = min(PROBE_MAX_INTERVAL, max(PROBE_INTERVAL, entry["interval"]) * 2)
+            jitter = random.uniform(0.75, 1.25) if kind == "offline" else 1.0
+            entry.update(last=now, interval=interval, next=now + interval * jitter)
+        PROBES.inc(cadence=kind)
+
+    def snapshot(self) -> dict:
+        with self._lock: return {k: dict(v) for k, v in self._entries.items()}
+
+schedule = ProbeSchedule()
+
+def probe_due() -> List[str]:
+    """定时任务入口：只探测到期的服务器，返回在线状态变化的 server_id"""
+    now = time.time()
+    servers = schedule.due(list(db.get_all_servers().values()), now, PROBE_MAX_PER_TICK)
+    if not servers: return []
+    latest, changed = apply_ping_results(ping_servers(servers))
+    for srv in latest: schedule.record(srv, srv.server_id in changed, now)
+    return sorted(changed)
+
+def probe_all() -> List[ServerSchema]:
+    """手动刷新：立即探测全部服务器 (同时刷新各自的节奏)"""
+    now = time.time()
+    latest, changed = apply_ping_results(ping_servers(list(db.get_all_servers().values())))
+    for srv in latest: schedule.record(srv, srv.server_id in changed, now)
+    return latest
@@ -1,9 +1,10 @@
 import os
 import shutil
 from config import *
-from utils import get_ssh_client, run_ssh_command, convert_to_unix_format
+from utils import get_ssh_client, run_ssh_command, convert_to_unix_format, make_temp_script_dir
 from models import ServerSchema
 from logger import logger
+from services import archive as service_archive
 
 # 定义标准的 rc.local 清理内容 (原版逻辑)
 CLEAN_RC_LOCAL_CONTENT = r"""#!/bin/bash
@@ -13,13 +14,13 @@ exit 0
 """
 
 # --- 部署逻辑 (融合版：带 Trash 和 Safe Kill) ---
-def deploy_reboot_scripts(server: ServerSchema):
+def deploy_reboot_scripts(server: ServerSchema, stress_args: str = STRESS_DEFAULT_ARGS):
+    tmp_dir = None
     try:
         logger.info(f"[{server.server_id}] 开始部署 Reboot 脚本 (V3.0 融合修复版)...")
         
-        # 1. 本地文件准备
-        if os.path.exists(TEMP_SCRIPT_DIR): shutil.rmtree(TEMP_SCRIPT_DIR)
-        os.makedirs(TEMP_SCRIPT_DIR)
+        # 1. 本地文件准备 (每次部署使用独立临时目录，多 worker / 并发部署互不干扰)
+        tmp_dir = make_temp_script_dir(server.server_id)
 
         files = [SCRIPT_CHAIN_NAME, SCRIPT_CYCLE_NAME, SCRIPT_MONITOR_NAME]
         for f in files:
@@ -32,7 +33,8 @@ def deploy_reboot_scripts(server: ServerSchema):
         for fname in files:
             with open(os.path.join(LOCAL_SCRIPT_DIR, fname), 'r', encoding='utf-8') as f:
                 content = f.read().replace("{{BACKEND_URL}}", backend_url).replace("{{SERVER_ID}}", server.server_id)
-            with open(os.path.join(TEMP_SCRIPT_DIR, fname), 'w', encoding='utf-8', newline='\n') as f:
+                content = content.replace("{{STRESS_ARGS}}", stress_args)
+            with open(os.path.join(tmp_dir, fname), 'w', encoding='utf-8', newline='\n') as f:
                 f.write(convert_to_unix_format(content))
 
         # 3. SSH 连接与环境清理 (找回原版的 safe_kill 和 Trash 逻辑)
@@ -77,21 +79,22 @@ def deploy_reboot_scripts(server: ServerSchema):
         # 4. 上传新文件
         sftp = ssh.open_sftp()
         for f in files:
-            sftp.put(os.path.join(TEMP_SCRIPT_DIR, f), f"{REMOTE_WORK_DIR}/{f}")
+            sftp.put(os.path.join(tmp_dir, f), f"{REMOTE_WORK_DIR}/{f}")
         sftp.close()
         
         # 5. 赋予权限
         ssh.exec_command(f"chmod +x {REMOTE_WORK_DIR}/*.sh")
         ssh.close()
-        shutil.rmtree(TEMP_SCRIPT_DIR)
         
         return True, "部署成功 (Trash归档/RC重置已执行)"
     except Exception as e:
         logger.exception(f"[{server.server_id}] Reboot 部署异常")
         return False, f"部署异常: {str(e)}"
+    finally:
+        if tmp_dir: shutil.rmtree(tmp_dir, ignore_errors=True)
 
 # --- 启动逻辑 (融合版：找回 dos2unix 和 setsid) ---
-async def start_reboot_test(server: ServerSchema):
+def start_reboot_test(server: ServerSchema):
     logger.info(f"[{server.server_id}] 启动 Reboot 测试...")
     
     # 【核心修复】加入 dos2unix 防止 Windows 格式报错
@@ -123,7 +126,7 @@ async def start_reboot_test(server: ServerSchema):
     return run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, start_cmd)
 
 # --- 停止逻辑 (融合版：找回 -q 优雅退出) ---
-async def stop_reboot_test(server: ServerSchema):
+def stop_reboot_test(server: ServerSchema):
     logger.info(f"[{server.server_id}] 停止 Reboot 测试并归档...")
     
     # 【核心修复】先尝试 -q 优雅退出，再强杀
@@ -149,22 +152,17 @@ async def stop_reboot_test(server: ServerSchema):
         cat > /etc/rc.d/rc.local <<'EOF'
 {CLEAN_RC_LOCAL_CONTENT}EOF
         chmod +x /etc/rc.d/rc.local
-        
-        # 5. 归档日志 (V2.1 逻辑)
-        LOG_DIR="/root/Test_Logs/Reboot"
-        if [ -d "$LOG_DIR" ]; then
-            TIME_TAG=$(date +%Y%m%d_%H%M%S)
-            TAR_NAME="reboot_logs_$TIME_TAG.tar.gz"
-            tar -czvf $TAR_NAME -C /root/Test_Logs Reboot
-            echo "SUCCESS: Logs archived to $TAR_NAME"
-        else
-            echo "SUCCESS: Stopped (No logs found)"
-        fi
     """
-    return run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, stop_cmd)
+    ok, msg = run_ssh_command(server.os_ip, server.ssh_user, server.ssh_password, stop_cmd)
+    if not ok: return ok, msg
+
+    # 5. 归档日志：增量打包并流式传回后端产物存储 (不在 DUT 上留 tar 包)
+    #    测试此时已停止：归档失败只在消息中提示，不影响停止结果
+    archived, archive_msg, _ = service_archive.collect_logs(server, "reboot", "/root/Test_Logs", ["Reboot"])
+    return True, f"已停止；{archive_msg}" if archived else f"已停止，但{archive_msg}"
 
 # --- 重置逻辑 (融合版：Trash 归档) ---
-async def reset_reboot_files(server: ServerSchema):
+def reset_reboot_files(server: ServerSchema):
     logger.info(f"[{server.server_id}] 重置环境...")
     
     reset_cmd = f"""
@@ -0,0 +1,151 @@
+# services/redfish.py
+# BMC 带外状态轮询 (Redfish)：电源状态 / BootProgress / POST 码
+# 每台 BMC 一个长连接 Session，复用 Redfish 会话令牌 (X-Auth-Token)，不为每次轮询重新登录；
+# 按 BMC 限速 (最小轮询间隔 + 失败退避)，全机群经线程池并发
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import requests
+from config import *
+from database import db
+from models import ServerSchema
+from logger import logger
+
+if not REDFISH_VERIFY_TLS:
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# 这些 BootProgress 状态表示已进入/完成 OS 引导，无需再读 POST 码
+OS_BOOT_STATES = ("OSBootStarted", "OSRunning")
+
+class RedfishError(Exception):
+    pass
+
+# --- 1. 单台 BMC 客户端 (会话复用 + 限速) ---
+class BmcClient:
+    def __init__(self, bmc_ip: str, user: str, password: str):
+        self.base = f"{REDFISH_SCHEME}://{bmc_ip}" + (f":{REDFISH_PORT}" if REDFISH_PORT else "")
+        self.user, self.password = user, password
+        self.http = requests.Session()
+        self.http.verify = REDFISH_VERIFY_TLS
+        self.http.headers["Accept"] = "application/json"
+        self.session_uri = None   # 当前 Redfish 会话 (注销用)
+        self.system_uri = None    # 首次发现后缓存 (/redfish/v1/Systems/<id>)
+        self.lock = threading.Lock()  # 同一台 BMC 同时只发一个轮询
+        self.next_poll = 0.0
+        self.failures = 0
+
+    def _login(self):
+        resp = self.http.post(f"{self.base}/redfish/v1/SessionService/Sessions",
+                              json={"UserName": self.user, "Password": self.password}, timeout=REDFISH_TIMEOUT)
+        if resp.status_code not in (200, 201) or "X-Auth-Token" not in resp.headers:
+            raise RedfishError(f"登录失败 (HTTP {resp.status_code})")
+        self.http.headers["X-Auth-Token"] = resp.headers["X-Auth-Token"]
+        location = resp.headers.get("Location", "")
+        self.session_uri = self.base + location if location.startswith("/") else location
+
+    def get(self, path: str) -> dict:
+        """会话过期 (401) 时重新登录一次"""
+        if "X-Auth-Token" not in self.http.headers: self._login()
+        url = path if path.startswith("http") else self.base + path
+        resp = self.http.get(url, timeout=REDFISH_TIMEOUT)
+        if resp.status_code == 401:
+            self._login()
+            resp = self.http.get(url, timeout=REDFISH_TIMEOUT)
+        if resp.status_code != 200: raise RedfishError(f"GET {path} -> HTTP {resp.status_code}")
+        return resp.json()
+
+    def poll(self) -> dict:
+        if not self.system_uri:
+            members = self.get("/redfish/v1/Systems").get("Members", [])
+            if not members: raise RedfishError("Systems 集合为空")
+            self.system_uri = members[0]["@odata.id"]
+        system = self.get(self.system_uri)
+        power = system.get("PowerState", "")
+        progress = (system.get("BootProgress") or {}).get("LastState", "")
+        post_code = ""
+        # 上电但尚未进入 OS 时读取最近的 POST 码，判断是否卡在自检
+        if power == "On" and progress not in OS_BOOT_STATES:
+            post_code = self._last_post_code()
+        return {"bmc_power_state": power, "bmc_boot_progress": progress, "bmc_post_code": post_code}
+
+    def _last_post_code(self) -> str:
+        try:
+            entries = self.get(f"{self.system_uri}/LogServices/PostCodes/Entries").get("Members", [])
+        except RedfishError:
+            return ""  # 不支持 PostCodes 日志的 BMC
+        if not entries: return ""
+        # OpenBMC: MessageArgs = [启动周期描述, POST 码, ...]
+        args = entries[-1].get("MessageArgs") or []
+        return str(args[1]) if len(args) > 1 else entries[-1].get("Message", "")[:64]
+
+    def close(self):
+        try:
+            if self.session_uri: self.http.delete(self.session_uri, timeout=REDFISH_TIMEOUT)
+        except requests.RequestException:
+            pass
+        self.http.close()
+
+# --- 2. 客户端池 (按 bmc_ip 复用；凭据变更时重建) ---
+_clients: Dict[str, BmcClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(server: ServerSchema) -> BmcClient:
+    with _clients_lock:
+        client = _clients.get(server.bmc_ip)
+        if client and (client.user, client.password) != (server.bmc_user, server.bmc_password):
+            client.close()
+            client = None
+        if client is None:
+            client = _clients[server.bmc_ip] = BmcClient(server.bmc_ip, server.bmc_user, server.bmc_password)
+        return client
+
+def prune_clients(active_ips):
+    """注销已删除服务器的会话"""
+    with _clients_lock:
+        for ip in [ip for ip in _clients if ip not in active_ips]: _clients.pop(ip).close()
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values(): client.close()
+        _clients.clear()
+
+# --- 3. 轮询 (到期且未在轮询中的 BMC 才发请求；连续失败指数退避) ---
+def poll_server(server: ServerSchema) -> Optional[dict]:
+    client = get_client(server)
+    now = time.time()
+    if now < client.next_poll or not client.lock.acquire(blocking=False): return None
+    try:
+        state = client.poll()
+        client.failures = 0
+        client.next_poll = now + REDFISH_MIN_INTERVAL
+        return state
+    except (requests.RequestException, RedfishError, ValueError) as e:
+        client.failures += 1
+        client.next_poll = now + min(REDFISH_MAX_BACKOFF, REDFISH_MIN_INTERVAL * 2 ** client.failures)
+        if client.failures == 1: logger.warning(f"[{server.server_id}] Redfish 轮询失败: {e}")
+        return None
+    finally:
+        client.lock.release()
+
+def apply_bmc_state(server_id: str, state: dict) -> bool:
+    """只在状态变化时写库 (与在线探测一致，空闲时不刷新版本号)"""
+    srv = db.get_server(server_id)
+    if not srv: return False
+    if all(getattr(srv, k) == v for k, v in state.items()): return False
+    logger.info(f"[{server_id}] BMC 状态: {srv.bmc_power_state or '-'}/{srv.bmc_boot_progress or '-'} -> "
+                f"{state['bmc_power_state']}/{state['bmc_boot_progress'] or '-'}"
+                + (f" POST {state['bmc_post_code']}" if state["bmc_post_code"] else ""))
+    for k, v in state.items(): setattr(srv, k, v)
+    db.upsert_server(srv)
+    return True
+
+def poll_all() -> List[str]:
+    """轮询所有配置了 BMC 凭据的服务器，返回状态发生变化的 server_id"""
+    servers = [s for s in db.get_all_servers().values() if s.bmc_ip and s.bmc_user]
+    prune_clients({s.bmc_ip for s in servers})
+    if not servers: return []
+    with ThreadPoolExecutor(max_workers=min(REDFISH_WORKERS, len(servers))) as pool:
+        states = list(pool.map(poll_server, servers))
+    return [s.server_id for s, state in zip(servers, states) if state and apply_bmc_state(s.server_id, state)]
@@ -0,0 +1,119 @@
+# services/runs.py
+# 测试运行 (Run)：每次启动 reboot / acreboot / memtest 生成一条运行记录，结束时写入结果
+#   - 服务器上的 active_runs 记录各类型当前运行的 run_id，Webhook 与日志错误据此归属到运行
+#   - 运行记录按 全部 / 服务器 / 类型 建有序集合索引 (分数为开始时间)，按时间范围查询无需遍历所有服务器
+#   - 同类型启动新运行时，未结束的旧运行记为 Aborted
+#   - Webhook、日志抓取与结束运行可能并发更新同一条记录：读-改-写在该运行的锁内进行，避免计数丢失
+import datetime
+import time
+import uuid
+from typing import Callable, List
+from coordination import DistributedLock
+from database import db
+from models import RunSchema, ServerSchema, WebhookSchema
+from logger import logger
+
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+# 运行结束状态 -> 默认结果 (有错误时一律为 fail)
+END_OUTCOMES = {"Finished": "pass", "Stopped": "pass", "Error": "fail", "Aborted": "aborted"}
+QUERY_BATCH = 500
+RUN_LOCK_TTL = 5  # 运行锁不续期 (临界区只有一次读写)；持有者崩溃时最多阻塞这么久
+
+def _now():
+    now = time.time()
+    return now, datetime.datetime.fromtimestamp(now).strftime(TIME_FMT)
+
+def _update_run(run_id: str, apply: Callable[[RunSchema], bool]) -> RunSchema | None:
+    """在运行锁内重新读取记录并修改；apply 返回 False 时不写回。返回写回后的记录"""
+    lock = DistributedLock(f"run:{run_id}", ttl=RUN_LOCK_TTL, label="run update", renew=False)
+    # 锁最迟在 TTL 后过期，持续等待而不丢弃更新
+    while not lock.acquire(timeout=RUN_LOCK_TTL):
+        logger.warning(f"[Run] {run_id} 等待运行锁超过 {RUN_LOCK_TTL}s，继续重试")
+    try:
+        run = db.get_run(run_id)
+        if not run or not apply(run): return None
+        db.save_run(run)
+        return run
+    finally:
+        lock.release()
+
+# --- 1. 生命周期 (调用方负责 upsert 传入的服务器对象) ---
+def start_run(srv: ServerSchema, test_type: str, params: dict = None) -> RunSchema:
+    if srv.active_runs.get(test_type): finish_run(srv, test_type, "Aborted")
+    ts, now_str = _now()
+    run = RunSchema(run_id=f"{datetime.datetime.fromtimestamp(ts).strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}",
+                    server_id=srv.server_id, test_type=test_type,
+                    params={k: str(v) for k, v in (params or {}).items()},
+                    started_ts=ts, started=now_str)
+    db.save_run(run)
+    srv.active_runs = {**srv.active_runs, test_type: run.run_id}  # 赋新字典 (缓存对象不原地修改)
+    logger.info(f"[{srv.server_id}] 运行开始: {test_type} {run.run_id}")
+    return run
+
+def finish_run(srv: ServerSchema, test_type: str, status: str, failed: bool = False, reason: str = "") -> RunSchema | None:
+    run_id = srv.active_runs.get(test_type)
+    srv.active_runs = {k: v for k, v in srv.active_runs.items() if k != test_type}
+    if not run_id: return None
+
+    def apply(run: RunSchema) -> bool:
+        if run.ended_ts: return False
+        run.status = status
+        run.outcome = "fail" if failed or run.errors else END_OUTCOMES.get(status, "")
+        if reason: run.last_error = reason
+        run.ended_ts, run.ended = _now()
+        return True
+
+    run = _update_run(run_id, apply)
+    if not run: return None
+    logger.info(f"[{srv.server_id}] 运行结束: {test_type} {run.run_id} {status} ({run.outcome})")
+    return run
+
+def run_id_for(srv: ServerSchema, test_type: str) -> str:
+    """当前运行；已结束时取该服务器最近一次同类型运行 (如 memtest 自行结束后再归档)"""
+    if srv.active_runs.get(test_type): return srv.active_runs[test_type]
+    for run in db.get_runs(db.query_run_ids(server_id=srv.server_id, limit=20)):
+        if run.test_type == test_type: return run.run_id
+    return ""
+
+# --- 2. 归属 ---
+def attribute_report(srv: ServerSchema, data: WebhookSchema):
+    """Webhook 归属到运行；上报结束状态时关闭运行"""
+    run_id = data.run_id or srv.active_runs.get(data.task_type)
+    if not run_id: return
+
+    def apply(run: RunSchema) -> bool:
+        if run.ended_ts or run.server_id != srv.server_id: return False
+        run.phase, run.loop, run.reports = data.phase, data.loop, run.reports + 1
+        run.last_report = _now()[1]
+        return True
+
+    run = _update_run(run_id, apply)
+    if not run: return
+    if data.status in ("Finished", "Error") and srv.active_runs.get(data.task_type) == run.run_id:
+        failed = data.task_type == "memtest" and (srv.memtest_fail_count > 0 or srv.edac_ue > 0)
+        finish_run(srv, data.task_type, data.status, failed)
+
+def attribute_errors(srv: ServerSchema, errors: List[dict]):
+    """日志错误特征计入该服务器所有进行中的运行"""
+    def apply(run: RunSchema) -> bool:
+        run.errors += len(errors)
+        run.last_error = f"{errors[-1]['time']} {errors[-1]['signature']}"
+        return True
+
+    for run_id in srv.active_runs.values(): _update_run(run_id, apply)
+
+# --- 3. 查询 ---
+def query_runs(server_id: str = "", test_type: str = "", status: str = "", outcome: str = "",
+               since: float = 0, until: float = float("inf"), limit: int = 100) -> List[RunSchema]:
+    """走最窄的索引取时间范围内的 run_id，其余条件在取回的记录上过滤"""
+    exact = not (server_id and test_type) and not status and not outcome
+    ids = db.query_run_ids(server_id, test_type, since, until, limit if exact else None)
+    runs = []
+    for i in range(0, len(ids), QUERY_BATCH):
+        for run in db.get_runs(ids[i:i + QUERY_BATCH]):
+            if test_type and run.test_type != test_type: continue
+            if status and run.status != status: continue
+            if outcome and run.outcome != outcome: continue
+            runs.append(run)
+            if len(runs) >= limit: return runs
+    return runs
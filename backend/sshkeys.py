@@ -0,0 +1,90 @@
+# sshkeys.py
+# SSH 密钥认证：后端密钥对 + 主机公钥记录 (known_hosts)
+#   - 后端私钥 SSH_KEY_FILE 首次使用时生成 (Ed25519)；多个 worker 同时生成时以先落盘的为准
+#   - 主机公钥按地址记录在存储中 (hostkey:<host>)，所有 worker 共用；首次连接时记录，之后每次握手核对
+#   - 主机重装后公钥变化：SSH_HOST_KEY_CHANGED = "update" 时记录新公钥并告警，"reject" 时拒绝连接 (forget 后重连即重新记录)
+import base64
+import hashlib
+import os
+import threading
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from config import SSH_PORT, SSH_KEY_FILE, SSH_KEY_COMMENT, SSH_HOST_KEY_CHANGED
+from database import db
+from logger import logger
+
+KEY_CLASSES = (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey)  # 也可放入运维自备的密钥
+
+# --- 1. 后端密钥 ---
+_key = None
+_key_lock = threading.Lock()
+
+def _generate(path: str):
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    pem = Ed25519PrivateKey.generate().private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH,
+                                                     serialization.NoEncryption())
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f: f.write(pem)
+    try:
+        os.link(tmp, path)  # 目标已存在时失败：其它 worker 先生成了，沿用其密钥
+        logger.info(f"[SSH] 已生成后端密钥 {path}")
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+
+def private_key() -> paramiko.PKey:
+    global _key
+    if _key is None:
+        with _key_lock:
+            if _key is None:
+                if not os.path.exists(SSH_KEY_FILE): _generate(SSH_KEY_FILE)
+                for cls in KEY_CLASSES:
+                    try:
+                        _key = cls.from_private_key_file(SSH_KEY_FILE)
+                        break
+                    except paramiko.SSHException:
+                        continue
+                else:
+                    raise paramiko.SSHException(f"无法加载后端密钥 {SSH_KEY_FILE}")
+    return _key
+
+def fingerprint(key: paramiko.PKey = None) -> str:
+    """与 ssh-keygen -lf 一致的 SHA256 指纹"""
+    digest = hashlib.sha256((key or private_key()).asbytes()).digest()
+    return "SHA256:" + base64.b64encode(digest).decode().rstrip("=")
+
+def public_key_line() -> str:
+    """authorized_keys 中的一行"""
+    key = private_key()
+    return f"{key.get_name()} {key.get_base64()} {SSH_KEY_COMMENT}"
+
+# --- 2. 主机公钥 ---
+_known = {}  # host -> "类型 base64" (进程内缓存，核对一致时不访问存储)
+
+def host_id(ip: str) -> str:
+    """与 paramiko 回调中的主机名一致 (非 22 端口时为 [ip]:port)"""
+    return ip if SSH_PORT == 22 else f"[{ip}]:{SSH_PORT}"
+
+def check_host_key(host: str, key: paramiko.PKey):
+    entry = f"{key.get_name()} {key.get_base64()}"
+    if _known.get(host) == entry: return
+    known = db.get_host_key(host)
+    if known and known != entry:
+        if SSH_HOST_KEY_CHANGED == "reject":
+            raise paramiko.SSHException(f"{host} 主机公钥已变化 ({fingerprint(key)})，确认重装后请清除记录再连接")
+        logger.warning(f"[SSH] {host} 主机公钥已变化 (可能重装了系统)，记录新公钥 {fingerprint(key)}")
+    if known != entry:
+        db.save_host_key(host, entry)
+        if not known: logger.info(f"[SSH] 记录 {host} 主机公钥 {fingerprint(key)}")
+    _known[host] = entry
+
+def forget_host_key(host: str):
+    _known.pop(host, None)
+    db.delete_host_key(host)
+
+class StoreHostKeyPolicy(paramiko.MissingHostKeyPolicy):
+    """客户端不加载任何本地 known_hosts，每次握手都经这里与存储中的记录核对"""
+    def missing_host_key(self, client, hostname, key):
+        check_host_key(hostname, key)
@@ -0,0 +1,377 @@
+# storage.py
+# 存储后端抽象：Database 只依赖下面这组键值/列表/有序集合原语
+#   RedisStore  - 生产环境，连接池 + 管道批量
+#   MemoryStore - 单进程内嵌存储 (小型实验室 / 测试)，定期快照到 DB_FILE
+import base64
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config import *
+from metrics import REDIS_OP_SECONDS
+from logger import logger
+
+# 版本化键：每次写入/删除从全局计数器取一个递增版本号，并在变更频道广播 "版本 set|del key"
+VERSION_KEY = "fleet:version"
+VER_PREFIX = "ver:"
+CHANGE_CHANNEL = "fleet:changes"
+
+def _s(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+# --- 1. 接口 ---
+# 普通键值/列表为 str；版本化键的值为 bytes (服务器记录的紧凑编码，见 codec.py)
+class Store:
+    def get(self, key: str) -> Optional[str]: raise NotImplementedError
+    def set(self, key: str, value: str): raise NotImplementedError
+    def mget(self, keys: List[str]) -> List[Optional[str]]: raise NotImplementedError
+    def mset(self, mapping: Dict[str, str]): raise NotImplementedError
+    def keys(self, prefix: str) -> List[str]: raise NotImplementedError
+    def delete(self, *keys: str): raise NotImplementedError
+    def list_push(self, key: str, values: List[str], keep: int):
+        """依次 LPUSH (最新在前) 并截断到 keep 条"""
+        raise NotImplementedError
+    def list_range(self, key: str, start: int, end: int) -> List[str]: raise NotImplementedError
+    # 有序集合 (二级索引：成员按分数排序，如按开始时间索引的运行记录)
+    def zadd(self, key: str, mapping: Dict[str, float]): raise NotImplementedError
+    def zrem(self, key: str, *members: str): raise NotImplementedError
+    def zrange_by_score(self, key: str, low: float, high: float, limit: int = None, desc: bool = True) -> List[str]:
+        """分数在 [low, high] 内的成员，默认按分数从高到低"""
+        raise NotImplementedError
+    # 版本化键 (写入与版本号、变更通知原子完成)
+    def versioned_set(self, key: str, value: bytes) -> int: raise NotImplementedError
+    def versioned_mset(self, mapping: Dict[str, bytes]) -> Dict[str, int]:
+        """批量版本化写入 (每个键各取一个版本号并各自通知)，返回 {键: 版本号}"""
+        raise NotImplementedError
+    def versioned_delete(self, key: str) -> int: raise NotImplementedError
+    def versioned_mget(self, keys: List[str]) -> List[Tuple[Optional[bytes], int]]: raise NotImplementedError
+    def current_version(self) -> int:
+        """最近一次版本化写入/删除的版本号"""
+        return int(self.get(VERSION_KEY) or 0)
+    def subscribe_changes(self, on_change, on_reset):
+        """
+        订阅变更：on_change(version, key, deleted) 在任意进程写入/删除后调用；
+        on_reset(connected) 在订阅建立 (True) 或断开 (False) 时调用，此时本地缓存须整体失效。
+        """
+        raise NotImplementedError
+    # 带过期的互斥锁：token 标识持有者，只有持有者能续期/释放 (见 coordination.py)
+    def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool: raise NotImplementedError
+    def extend_lock(self, key: str, token: str, ttl_ms: int) -> bool: raise NotImplementedError
+    def release_lock(self, key: str, token: str) -> bool: raise NotImplementedError
+    def ping(self) -> bool: return True
+    def snapshot(self): pass
+    def close(self): pass
+
+# --- 2. Redis 实现 ---
+# 脚本内顺序执行 INCR / SET / PUBLISH，保证版本号、数据与通知一致
+_LUA_VERSIONED_SET = """
+local v = redis.call('INCR', KEYS[3])
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], v)
+redis.call('PUBLISH', ARGV[2], v .. ' set ' .. KEYS[1])
+return v
+"""
+_LUA_VERSIONED_DEL = """
+local v = redis.call('INCR', KEYS[3])
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('PUBLISH', ARGV[1], v .. ' del ' .. KEYS[1])
+return v
+"""
+# 校验持有者后再续期/释放，避免误删已过期后被他人重新获取的锁
+_LUA_LOCK_EXTEND = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+_LUA_LOCK_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+class RedisStore(Store):
+    def __init__(self, host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, db=REDIS_DB,
+                 max_connections=REDIS_MAX_CONNECTIONS):
+        import redis  # 仅 Redis 后端需要
+
+        # 带耗时统计的客户端：每条命令按命令名记录延迟
+        class TimedRedis(redis.Redis):
+            def execute_command(self, *args, **options):
+                with REDIS_OP_SECONDS.time(op=str(args[0]).upper()):
+                    return super().execute_command(*args, **options)
+
+        # 阻塞式连接池：并发超过上限时排队等待而不是报错
+        # 不开启 decode_responses：版本化键存二进制，文本值在各方法中自行解码
+        pool = redis.BlockingConnectionPool(
+            host=host, port=port, password=password, db=db, max_connections=max_connections,
+            timeout=10, socket_timeout=5, socket_connect_timeout=3, health_check_interval=30,
+        )
+        self.r = TimedRedis(connection_pool=pool)
+        self._set_script = self.r.register_script(_LUA_VERSIONED_SET)
+        self._del_script = self.r.register_script(_LUA_VERSIONED_DEL)
+        self._extend_script = self.r.register_script(_LUA_LOCK_EXTEND)
+        self._release_script = self.r.register_script(_LUA_LOCK_RELEASE)
+
+    def _pipeline(self, fill):
+        pipe = self.r.pipeline(transaction=False)
+        fill(pipe)
+        with REDIS_OP_SECONDS.time(op="PIPELINE"):
+            return pipe.execute()
+
+    def get(self, key): return _s(self.r.get(key))
+    def set(self, key, value): self.r.set(key, value)
+
+    def mget(self, keys):
+        return [_s(v) for v in self.r.mget(keys)] if keys else []
+
+    def mset(self, mapping):
+        if mapping: self.r.mset(mapping)
+
+    def keys(self, prefix):
+        # SCAN 分批遍历，避免 KEYS 在大键空间上阻塞 Redis
+        return [_s(k) for k in self.r.scan_iter(match=f"{prefix}*", count=1000)]
+
+    def delete(self, *keys):
+        if keys: self.r.delete(*keys)
+
+    def list_push(self, key, values, keep):
+        if not values: return
+        self._pipeline(lambda p: (p.lpush(key, *values), p.ltrim(key, 0, keep - 1)))
+
+    def list_range(self, key, start, end):
+        return [_s(v) for v in self.r.lrange(key, start, end)]
+
+    def zadd(self, key, mapping):
+        if mapping: self.r.zadd(key, mapping)
+
+    def zrem(self, key, *members):
+        if members: self.r.zrem(key, *members)
+
+    def zrange_by_score(self, key, low, high, limit=None, desc=True):
+        page = {"start": 0, "num": limit} if limit else {}
+        if desc: return [_s(m) for m in self.r.zrevrangebyscore(key, high, low, **page)]
+        return [_s(m) for m in self.r.zrangebyscore(key, low, high, **page)]
+
+    def versioned_set(self, key, value):
+        return int(self._set_script(keys=[key, VER_PREFIX + key, VERSION_KEY], args=[value, CHANGE_CHANNEL]))
+
+    def versioned_mset(self, mapping):
+        # 同一管道内批量执行写入脚本，一次往返完成整批
+        keys = list(mapping)
+        versions = self._pipeline(lambda p: [self._set_script(keys=[k, VER_PREFIX + k, VERSION_KEY],
+                                                               args=[mapping[k], CHANGE_CHANNEL], client=p) for k in keys])
+        return {k: int(v) for k, v in zip(keys, versions)}
+
+    def versioned_delete(self, key):
+        return int(self._del_script(keys=[key, VER_PREFIX + key, VERSION_KEY], args=[CHANGE_CHANNEL]))
+
+    def versioned_mget(self, keys):
+        if not keys: return []
+        values = self.r.mget(list(keys) + [VER_PREFIX + k for k in keys])
+        return [(values[i], int(values[i + len(keys)] or 0)) for i in range(len(keys))]
+
+    def acquire_lock(self, key, token, ttl_ms):
+        return bool(self.r.set(key, token, nx=True, px=ttl_ms))
+
+    def extend_lock(self, key, token, ttl_ms):
+        return bool(self._extend_script(keys=[key], args=[token, ttl_ms]))
+
+    def release_lock(self, key, token):
+        return bool(self._release_script(keys=[key], args=[token]))
+
+    def subscribe_changes(self, on_change, on_reset):
+        threading.Thread(target=self._listen, args=(on_change, on_reset), name="store-changes", daemon=True).start()
+
+    def _listen(self, on_change, on_reset):
+        while True:
+            pubsub = self.r.pubsub()
+            try:
+                pubsub.subscribe(CHANGE_CHANNEL)
+                while True:
+                    msg = pubsub.get_message(timeout=1.0)
+                    if not msg: continue
+                    if msg["type"] == "subscribe":
+                        on_reset(True)
+                    elif msg["type"] == "message":
+                        version, op, key = _s(msg["data"]).split(" ", 2)
+                        on_change(int(version), key, op == "del")
+            except Exception as e:
+                logger.warning(f"[Storage] 变更订阅中断，本地缓存停用: {e}")
+            finally:
+                on_reset(False)
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(3)
+
+    def ping(self):
+        try:
+            return bool(self.r.ping())
+        except Exception:
+            return False
+
+    def close(self):
+        self.r.connection_pool.disconnect()
+
+# --- 3. 内嵌实现 (单进程，多 worker 部署请使用 Redis) ---
+class MemoryStore(Store):
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self._data: Dict[str, str] = {}
+        self._lists: Dict[str, List[str]] = {}
+        self._zsets: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._subscribers = []
+        self._locks: Dict[str, Tuple[str, float]] = {}  # 锁不进快照
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._data = data.get("kv", {})
+            self._data.update({k: base64.b64decode(v) for k, v in data.get("bin", {}).items()})
+            self._lists = data.get("lists", {})
+            self._zsets = data.get("zsets", {})
+            logger.info(f"[Storage] 已从快照加载 {len(self._data)} 个键: {self.path}")
+        except (OSError, ValueError) as e:
+            logger.error(f"[Storage] 快照加载失败，使用空库: {e}")
+
+    def get(self, key):
+        with self._lock: return self._data.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._dirty = True
+
+    def mget(self, keys):
+        with self._lock: return [self._data.get(k) for k in keys]
+
+    def mset(self, mapping):
+        with self._lock:
+            self._data.update(mapping)
+            self._dirty = True
+
+    def keys(self, prefix):
+        with self._lock: return [k for k in self._data if k.startswith(prefix)]
+
+    def delete(self, *keys):
+        with self._lock:
+            for k in keys:
+                self._data.pop(k, None)
+                self._lists.pop(k, None)
+                self._zsets.pop(k, None)
+            self._dirty = True
+
+    def list_push(self, key, values, keep):
+        if not values: return
+        with self._lock:
+            items = self._lists.get(key, [])
+            self._lists[key] = (list(reversed(values)) + items)[:keep]
+            self._dirty = True
+
+    def list_range(self, key, start, end):
+        with self._lock:
+            items = self._lists.get(key, [])
+            return items[start:None if end == -1 else end + 1]
+
+    def zadd(self, key, mapping):
+        if not mapping: return
+        with self._lock:
+            self._zsets.setdefault(key, {}).update(mapping)
+            self._dirty = True
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._zsets.get(key, {})
+            for m in members: zset.pop(m, None)
+            self._dirty = True
+
+    def zrange_by_score(self, key, low, high, limit=None, desc=True):
+        with self._lock:
+            items = [(score, m) for m, score in self._zsets.get(key, {}).items() if low <= score <= high]
+        items.sort(reverse=desc)
+        return [m for _, m in items[:limit]]
+
+    def _versioned_write(self, key, value):
+        with self._lock:
+            version = int(self._data.get(VERSION_KEY, 0)) + 1
+            self._data[VERSION_KEY] = str(version)
+            if value is None:
+                self._data.pop(key, None)
+                self._data.pop(VER_PREFIX + key, None)
+            else:
+                self._data[key] = value
+                self._data[VER_PREFIX + key] = str(version)
+            self._dirty = True
+            # 单进程内同步通知，持锁调用保证通知顺序与写入顺序一致
+            for on_change, _ in self._subscribers: on_change(version, key, value is None)
+        return version
+
+    def versioned_set(self, key, value): return self._versioned_write(key, value)
+    def versioned_mset(self, mapping): return {k: self._versioned_write(k, v) for k, v in mapping.items()}
+    def versioned_delete(self, key): return self._versioned_write(key, None)
+
+    def versioned_mget(self, keys):
+        with self._lock:
+            return [(self._data.get(k), int(self._data.get(VER_PREFIX + k, 0))) for k in keys]
+
+    def _lock_holder(self, key):
+        holder = self._locks.get(key)
+        if holder and holder[1] <= time.monotonic():
+            del self._locks[key]
+            return None
+        return holder
+
+    def acquire_lock(self, key, token, ttl_ms):
+        with self._lock:
+            if self._lock_holder(key): return False
+            self._locks[key] = (token, time.monotonic() + ttl_ms / 1000)
+            return True
+
+    def extend_lock(self, key, token, ttl_ms):
+        with self._lock:
+            holder = self._lock_holder(key)
+            if not holder or holder[0] != token: return False
+            self._locks[key] = (token, time.monotonic() + ttl_ms / 1000)
+            return True
+
+    def release_lock(self, key, token):
+        with self._lock:
+            holder = self._lock_holder(key)
+            if not holder or holder[0] != token: return False
+            del self._locks[key]
+            return True
+
+    def subscribe_changes(self, on_change, on_reset):
+        with self._lock: self._subscribers.append((on_change, on_reset))
+        on_reset(True)
+
+    def snapshot(self):
+        """写临时文件后原子替换，进程崩溃时最多丢失一个快照周期的数据"""
+        with self._lock:
+            if not self._dirty or not self.path: return
+            kv = {k: v for k, v in self._data.items() if isinstance(v, str)}
+            binary = {k: base64.b64encode(v).decode() for k, v in self._data.items() if isinstance(v, bytes)}
+            payload = json.dumps({"kv": kv, "bin": binary, "lists": self._lists, "zsets": self._zsets}, ensure_ascii=False)
+            self._dirty = False
+        tmp = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self._dirty = True
+            logger.error(f"[Storage] 快照写入失败: {e}")
+
+    def close(self):
+        self.snapshot()
+
+def create_store(backend: str = STORAGE_BACKEND) -> Store:
+    if backend == "memory": return MemoryStore()
+    if backend == "redis": return RedisStore()
+    raise ValueError(f"未知存储后端: {backend}")
@@ -0,0 +1,35 @@
+# tests/conftest.py
+# 在 backend 目录下运行: python -m pytest -q
+#   - 未部署 config.py 时按 config.example.py 加载 (默认配置即可)
+#   - 每个测试使用独立的内存存储 (不落快照)，不连接 Redis
+#   - 测试期间不写 logs/backend.log
+import importlib.util
+import logging
+import os
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location("config", os.path.join(BACKEND_DIR, "config.example.py"))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules["config"] = config
+
+import logger as logger_module
+logger_module.file_handler.setLevel(logging.CRITICAL + 1)
+
+from database import db as _db, ServerCache
+from storage import MemoryStore
+
+@pytest.fixture
+def db(monkeypatch):
+    """全局 db 换成全新的内存存储 (含空缓存)，测试结束后恢复"""
+    monkeypatch.setattr(_db, "_store", None)
+    monkeypatch.setattr(_db, "_pending_store", MemoryStore(path=""))
+    monkeypatch.setattr(_db, "cache", ServerCache())
+    return _db
@@ -0,0 +1,53 @@
+# tests/test_artifacts.py
+# 产物存储 (artifacts.py)：有序集合索引查询、同一运行内按内容沿用记录、旧记录补建索引
+import json
+import pytest
+import artifacts
+
+@pytest.fixture
+def store_dir(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(artifacts, "TMP_DIR", str(tmp_path / "tmp"))
+    return tmp_path
+
+def put(server_id: str, test_type: str, run_id: str, data: bytes, name: str = "a.txt") -> dict:
+    with artifacts.ArtifactWriter(server_id, test_type, run_id, name) as writer:
+        writer.write(data)
+        return writer.commit()
+
+def test_query_uses_indexes(store_dir):
+    a = put("S01", "reboot", "r1", b"one")
+    b = put("S01", "meminfo", "m1", b"two")
+    c = put("S02", "reboot", "r2", b"three")
+    ids = lambda items: [x["artifact_id"] for x in items]
+    assert ids(artifacts.query()) == ids([c, b, a])  # 新的在前
+    assert ids(artifacts.query("S01")) == ids([b, a])
+    assert ids(artifacts.query(test_type="reboot")) == ids([c, a])
+    assert ids(artifacts.query("S01", "reboot")) == ids([a])
+    assert ids(artifacts.query(run_id="r2")) == ids([c])
+    assert artifacts.query("S02", run_id="r1") == []
+
+def test_same_content_in_same_run_reuses_record(store_dir):
+    first = put("S01", "meminfo", "m1", b"result")
+    again = put("S01", "meminfo", "m1", b"result", name="copy.txt")
+    assert again["artifact_id"] == first["artifact_id"]
+    assert len(artifacts.query("S01")) == 1
+    # 其它运行引用同一内容：新记录，内容块共用
+    other = put("S01", "meminfo", "m2", b"result")
+    assert other["artifact_id"] != first["artifact_id"] and other["dedup"]
+    assert other["path"] == first["path"]
+    assert len(artifacts.query("S01")) == 2
+
+def test_delete_removes_from_indexes(store_dir):
+    a = put("S01", "reboot", "r1", b"one")
+    b = put("S01", "reboot", "r1", b"two")
+    assert artifacts.delete("S01", a["artifact_id"])
+    for items in (artifacts.query(), artifacts.query("S01"), artifacts.query(test_type="reboot"), artifacts.query(run_id="r1")):
+        assert [x["artifact_id"] for x in items] == [b["artifact_id"]]
+    assert not artifacts.delete("S01", a["artifact_id"])
+
+def test_records_without_index_are_backfilled(db):
+    legacy = {"artifact_id": "old1", "server_id": "S01", "test_type": "reboot", "run_id": "r0", "name": "x.tar",
+              "size": 1, "sha256": "ab" * 32, "created": "2026-01-02 03:04:05"}
+    db.store.set("artifact:S01:old1", json.dumps(legacy))
+    assert [a["artifact_id"] for a in artifacts.query("S01", run_id="r0")] == ["old1"]
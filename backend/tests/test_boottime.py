@@ -0,0 +1,91 @@
+# tests/test_boottime.py
+# 重启耗时异常检测 (services/boottime.py)：轮次锚点、Welford 基线、尖峰与 CUSUM 漂移
+import statistics
+from models import BootStats
+from services import boottime
+
+class Loop:
+    """按轮次 +1 依次汇报，durations 为各轮耗时 (秒)"""
+    def __init__(self, stats: BootStats = None):
+        self.stats = stats or BootStats()
+        self.loop, self.ts = 0, 1_000_000.0
+        boottime.update_boot_stats("S01", self.stats, "0", self.ts)
+
+    def feed(self, *durations) -> list:
+        fired = []
+        for d in durations:
+            self.loop += 1
+            self.ts += d
+            fired.append(boottime.update_boot_stats("S01", self.stats, str(self.loop), self.ts))
+        return fired
+
+BASELINE = [60.0, 62.0, 61.0, 59.0, 60.5, 61.5, 60.0, 62.0]
+
+def test_first_report_only_sets_anchor():
+    stats = BootStats()
+    assert not boottime.update_boot_stats("S01", stats, "5", 100.0)
+    assert (stats.anchor_loop, stats.anchor_ts, stats.samples) == (5, 100.0, 0)
+
+def test_repeated_jumped_or_invalid_loops_add_no_sample():
+    run = Loop()
+    run.feed(60.0)
+    assert run.stats.samples == 1
+    assert not boottime.update_boot_stats("S01", run.stats, "1", run.ts + 30)   # 同轮重复汇报
+    assert not boottime.update_boot_stats("S01", run.stats, "5", run.ts + 600)  # 跳变：只重置锚点
+    assert not boottime.update_boot_stats("S01", run.stats, "2", run.ts + 700)  # 回退 (重新部署)
+    assert not boottime.update_boot_stats("S01", run.stats, "-", run.ts + 800)
+    assert run.stats.samples == 1 and run.stats.anchor_loop == 2
+
+def test_baseline_matches_sample_mean_and_std():
+    run = Loop()
+    assert run.feed(*BASELINE) == [False] * len(BASELINE)
+    assert run.stats.samples == len(BASELINE)
+    assert abs(run.stats.mean - statistics.mean(BASELINE)) < 1e-9
+    assert abs(boottime.boot_std(run.stats) - statistics.stdev(BASELINE)) < 1e-9
+    assert run.stats.last == BASELINE[-1] and run.stats.anomaly == ""
+
+def test_no_judgement_before_min_samples():
+    run = Loop()
+    assert run.feed(*BASELINE[:boottime.BOOT_MIN_SAMPLES - 1], 600.0) == [False] * boottime.BOOT_MIN_SAMPLES
+
+def test_spike_is_reported_once_and_kept_out_of_baseline():
+    run = Loop()
+    run.feed(*BASELINE)
+    mean, samples = run.stats.mean, run.stats.samples
+    assert run.feed(120.0) == [True]
+    assert run.stats.anomaly == "spike" and run.stats.anomaly_loop == str(run.loop)
+    assert (run.stats.mean, run.stats.samples) == (mean, samples)
+    # 同类告警不重复上报，但记录最近一次的轮次
+    assert run.feed(10.0) == [False]
+    assert run.stats.anomaly == "spike" and run.stats.anomaly_loop == str(run.loop)
+
+def test_repeated_spikes_escalate_to_drift():
+    run = Loop()
+    run.feed(*BASELINE)
+    assert run.feed(120.0, 125.0) == [True, True]
+    assert run.stats.anomaly == "drift_up"
+
+def feed_until_fired(run: Loop, duration: float, limit: int = 20) -> int:
+    for i in range(1, limit + 1):
+        if run.feed(duration) == [True]: return i
+    return 0
+
+def test_sustained_shift_is_reported_as_drift_and_rebaselines():
+    run = Loop()
+    run.feed(*BASELINE)
+    # 每轮只高 2 个标准差：不算尖峰，累积后判定为向上漂移
+    high = run.stats.mean + 2 * boottime.boot_std(run.stats)
+    assert 0 < feed_until_fired(run, high) <= 10
+    assert run.stats.anomaly == "drift_up"
+    # 基线清空后在新水平上重建
+    assert run.stats.samples == 0
+    shifted = [b + 10 for b in BASELINE]
+    assert run.feed(*shifted) == [False] * len(shifted)
+    assert abs(run.stats.mean - statistics.mean(shifted)) < 1e-9
+
+def test_downward_drift():
+    run = Loop()
+    run.feed(*BASELINE)
+    low = run.stats.mean - 2 * boottime.boot_std(run.stats)
+    assert 0 < feed_until_fired(run, low) <= 10
+    assert run.stats.anomaly == "drift_down"
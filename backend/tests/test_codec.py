@@ -0,0 +1,65 @@
+# tests/test_codec.py
+# 服务器紧凑编码 (codec.py)：存储编码往返、旧格式兼容、码表、接口响应不含凭据
+import json
+import pytest
+import codec
+from models import ServerSchema, BootStats
+
+def sample_server(**kwargs) -> ServerSchema:
+    fields = dict(server_id="S01", bmc_ip="10.0.0.1", os_ip="10.1.0.1", ssh_password="pw", bmc_password="bpw",
+                  reboot_status="Running", reboot_phase="阶段2: 热重启 (Warm)", memtest_phase="自定义阶段",
+                  memtest_patterns={"Stuck Address": [3, 1]}, boot_stats=BootStats(samples=4, mean=61.5))
+    return ServerSchema(**{**fields, **kwargs})
+
+@pytest.fixture(params=["msgpack", "json"])
+def storage_format(request, monkeypatch):
+    if request.param == "json": monkeypatch.setattr(codec, "msgpack", None)
+    elif codec.msgpack is None: pytest.skip("未安装 msgpack")
+    return request.param
+
+def test_round_trip(storage_format):
+    srv = sample_server()
+    raw = codec.encode_server(srv)
+    assert raw[:1] == (codec.MSGPACK_MAGIC if storage_format == "msgpack" else b"{")
+    decoded = codec.decode_server(raw)
+    assert decoded.model_dump(exclude={"version"}) == srv.model_dump(exclude={"version"})
+
+def test_defaults_are_omitted_and_codes_used(monkeypatch):
+    monkeypatch.setattr(codec, "msgpack", None)
+    data = json.loads(codec.encode_server(sample_server()))
+    assert data["reboot_status"] == codec.STATUS_CODES.index("Running")
+    assert data["reboot_phase"] == codec.PHASE_CODES.index("阶段2: 热重启 (Warm)")
+    assert data["memtest_phase"] == "自定义阶段"  # 码表外原样保留
+    assert "memtest_status" not in data and "version" not in data
+    assert json.loads(codec.encode_server(ServerSchema(server_id="S02", bmc_ip="10.0.0.2"))) == {"server_id": "S02", "bmc_ip": "10.0.0.2"}
+
+def test_decodes_legacy_full_json():
+    srv = sample_server()
+    assert codec.decode_server(srv.model_dump_json()).model_dump() == srv.model_dump()
+    assert codec.decode_server(srv.model_dump_json().encode()).reboot_status == "Running"
+
+def test_msgpack_value_without_msgpack_is_an_error(monkeypatch):
+    if codec.msgpack is None: pytest.skip("未安装 msgpack")
+    raw = codec.encode_server(sample_server())
+    monkeypatch.setattr(codec, "msgpack", None)
+    with pytest.raises(ValueError):
+        codec.decode_server(raw)
+
+def test_code_tables_are_append_only():
+    # 已存储的数据按下标解码：已有码值不能改序
+    assert codec.STATUS_CODES[:6] == ("Idle", "Deployed", "Running", "Stopped", "Finished", "Error")
+    assert codec.PHASE_CODES[:3] == ("未部署", "已部署", "正在启动...")
+    assert codec.decode_fields({"reboot_status": 99, "ac_phase": 1}) == {"reboot_status": 99, "ac_phase": "已部署"}
+
+@pytest.mark.parametrize("fmt, include", [("full", None), ("compact", None), ("full", {"server_id", "ssh_password", "os_ip"})])
+def test_dump_server_never_returns_secrets(fmt, include):
+    data = codec.dump_server(sample_server(), fmt, include)
+    assert not codec.SECRET_FIELDS & set(data)
+    assert data["server_id"] == "S01"
+
+def test_compact_dump_decodes_to_full():
+    srv = sample_server()
+    compact = codec.dump_server(srv, "compact")
+    assert compact["reboot_status"] == codec.STATUS_CODES.index("Running")
+    restored = ServerSchema.model_validate(codec.decode_fields(dict(compact)))
+    assert restored.model_dump(exclude=codec.SECRET_FIELDS) == codec.dump_server(srv)
@@ -0,0 +1,150 @@
+# tests/test_inventory.py
+# 机群清单导入 / 导出 (services/inventory.py)，内存存储后端
+import io
+import json
+import pytest
+from models import ServerSchema
+from services import inventory
+
+HEADER = "server_id,bmc_ip,os_ip,ssh_user,description,ac_ip,ac_socket\n"
+
+def run_import(text: str, fmt: str = "csv", **kwargs) -> dict:
+    return inventory.import_servers(fmt, io.StringIO(text), **kwargs)
+
+def errors_by_line(result: dict) -> dict:
+    return {e["line"]: e["error"] for e in result["errors"]}
+
+# --- 1. 行校验 ---
+@pytest.mark.parametrize("row, expected", [
+    ({"server_id": "a b", "bmc_ip": "10.0.0.1"}, "server_id 无效"),
+    ({"server_id": "a/b", "bmc_ip": "10.0.0.1"}, "server_id 无效"),
+    ({"bmc_ip": "10.0.0.1"}, "server_id 无效"),
+    ({"server_id": "S01", "bmc_ip": "999.1.1.1"}, "bmc_ip 无效"),
+    ({"server_id": "S01", "bmc_ip": "10.0.0.1", "os_ip": "bad host!"}, "os_ip 无效"),
+    ({"server_id": "S01", "bmc_ip": "10.0.0.1", "memtest_mode": "fast"}, "memtest_mode 无效"),
+    ({"server_id": "S01", "bmc_ip": "10.0.0.1", "ac_socket": "two"}, "ac_socket 应为整数"),
+    ({"server_id": "S01", "bmc_ip": "10.0.0.1", "memtest_runtime_configured": "1h"}, "memtest_runtime_configured 应为整数"),
+])
+def test_validate_row_rejects(row, expected):
+    _, err = inventory.validate_row(row)
+    assert expected in err
+
+def test_validate_row_accepts_hostnames_and_ignores_unknown_columns():
+    fields, err = inventory.validate_row({"server_id": "S01", "bmc_ip": "bmc-s01.lab", "os_ip": "10.0.0.2",
+                                          "reboot_status": "Running", "rack": "R3"})
+    assert err == ""
+    assert fields == {"server_id": "S01", "bmc_ip": "bmc-s01.lab", "os_ip": "10.0.0.2"}
+
+# --- 2. 解析 ---
+def test_bad_rows_are_skipped_with_line_numbers(db):
+    result = run_import(HEADER +
+                        "S01,10.0.0.1,10.1.0.1,root,ok,,\n"
+                        "S 02,10.0.0.2,,,,,\n"
+                        "S03,,10.1.0.3,,,,\n"
+                        "S04,10.0.0.4,,,,,,extra\n"
+                        "S05,10.0.0.5,,,,,\n")
+    assert result["created"] == ["S01", "S05"]
+    assert result["skipped"] == 3 and not result["success"]
+    errors = errors_by_line(result)
+    assert "server_id 无效" in errors[3]
+    assert errors[4] == "新服务器缺少 bmc_ip"
+    assert errors[5] == "列数多于表头"
+    assert db.get_server("S01").os_ip == "10.1.0.1"
+    assert db.get_server("S03") is None
+
+def test_jsonl_parse_errors(db):
+    text = "\n".join([
+        "# 注释行",
+        json.dumps({"server_id": "S01", "bmc_ip": "10.0.0.1", "ac_socket": 2}),
+        "{not json",
+        "[1, 2]",
+        "",
+        json.dumps({"server_id": "S02", "bmc_ip": "10.0.0.2", "os_ip": None}),
+    ])
+    result = run_import(text, fmt="jsonl")
+    assert result["created"] == ["S01", "S02"]
+    errors = errors_by_line(result)
+    assert errors[3].startswith("JSON 解析失败")
+    assert errors[4] == "每行应为一个 JSON 对象"
+    assert db.get_server("S01").ac_socket == "2"
+
+# --- 3. 文件内重复 ---
+def test_duplicate_server_id_in_file(db):
+    result = run_import(HEADER + "S01,10.0.0.1,,,first,,\nS01,10.0.0.9,,,second,,\n")
+    assert result["created"] == ["S01"]
+    assert errors_by_line(result) == {3: "与第 2 行的 server_id 重复"}
+    assert db.get_server("S01").description == "first"
+
+def test_duplicate_identity_in_file(db):
+    result = run_import(HEADER +
+                        "S01,10.0.0.1,10.1.0.1,,,10.2.0.1,1\n"
+                        "S02,10.0.0.1,,,,,\n"
+                        "S03,10.0.0.3,10.1.0.1,,,,\n"
+                        "S04,10.0.0.4,,,,10.2.0.1,1\n"
+                        "S05,10.0.0.5,,,,10.2.0.1,2\n")
+    assert result["created"] == ["S01", "S05"]
+    errors = errors_by_line(result)
+    assert errors[3] == "BMC IP 10.0.0.1 与本文件中的 S01 重复"
+    assert errors[4] == "OS IP 10.1.0.1 与本文件中的 S01 重复"
+    assert errors[5] == "AC 10.2.0.1 插座 1 与本文件中的 S01 重复"
+
+# --- 4. 与已登记服务器冲突 (身份索引) ---
+def test_conflict_with_registered_server(db):
+    # 直接写入、未登记身份：首次查询时从全部服务器重建索引
+    db.upsert_server(ServerSchema(server_id="OLD", bmc_ip="10.0.0.1", os_ip="10.1.0.1"))
+    result = run_import(HEADER + "S01,10.0.0.1,,,,,\nS02,10.0.0.2,10.1.0.1,,,,\nS03,10.0.0.3,,,,,\n")
+    assert result["created"] == ["S03"]
+    errors = errors_by_line(result)
+    assert errors[2] == "BMC IP 10.0.0.1 已被 OLD 使用"
+    assert errors[3] == "OS IP 10.1.0.1 已被 OLD 使用"
+    # 导入的服务器已登记，再次导入同一身份也会冲突
+    assert db.identity_conflicts(ServerSchema(server_id="S04", bmc_ip="10.0.0.3")) == ["BMC IP 10.0.0.3 已被 S03 使用"]
+
+def test_identity_released_when_changed(db):
+    run_import(HEADER + "S01,10.0.0.1,10.1.0.1,,,,\n")
+    assert run_import(HEADER + "S01,,10.1.0.9,,,,\n")["updated"] == ["S01"]
+    result = run_import(HEADER + "S02,10.0.0.2,10.1.0.1,,,,\nS03,10.0.0.3,10.1.0.9,,,,\n")
+    assert result["created"] == ["S02"]
+    assert errors_by_line(result) == {3: "OS IP 10.1.0.9 已被 S01 使用"}
+    assert db.get_server("S02").os_ip == "10.1.0.1"
+
+# --- 5. 合并到已有服务器 ---
+def test_upsert_merges_only_provided_fields(db):
+    srv = ServerSchema(server_id="S01", bmc_ip="10.0.0.1", os_ip="10.1.0.1", ssh_user="admin", ssh_password="pw",
+                       description="old", reboot_status="Running", memtest_fail_count=3)
+    db.upsert_server(srv)
+    result = run_import(HEADER + "S01,,,,new desc,,\n")
+    assert result["updated"] == ["S01"] and result["success"]
+    latest = db.get_server("S01")
+    assert latest.description == "new desc"
+    # 空单元格保留原值，测试状态不受影响
+    assert (latest.bmc_ip, latest.os_ip, latest.ssh_user, latest.ssh_password) == ("10.0.0.1", "10.1.0.1", "admin", "pw")
+    assert latest.reboot_status == "Running" and latest.memtest_fail_count == 3
+
+def test_export_then_import_round_trip(db):
+    run_import(HEADER + "S01,10.0.0.1,10.1.0.1,root,a,10.2.0.1,1\nS02,10.0.0.2,,,b,,\n")
+    db.upsert_server(db.get_server("S01").model_copy(update={"ssh_password": "secret"}))
+    exported = "".join(inventory.export_servers("csv"))
+    assert "secret" not in exported
+    result = run_import(exported)
+    assert result["success"] and result["updated"] == ["S01", "S02"]
+    assert db.get_server("S01").ssh_password == "secret"
+
+# --- 6. 模式 ---
+def test_create_mode_rejects_existing(db):
+    db.upsert_server(ServerSchema(server_id="S01", bmc_ip="10.0.0.1", description="keep"))
+    result = run_import(HEADER + "S01,10.0.0.1,,,changed,,\nS02,10.0.0.2,,,,,\n", mode="create")
+    assert result["created"] == ["S02"] and result["updated"] == []
+    assert errors_by_line(result) == {2: "服务器已存在"}
+    assert db.get_server("S01").description == "keep"
+
+def test_dry_run_writes_nothing(db):
+    db.upsert_server(ServerSchema(server_id="S01", bmc_ip="10.0.0.1", description="keep"))
+    result = run_import(HEADER + "S01,,,,changed,,\nS02,10.0.0.2,10.1.0.2,,,,\nS03,10.0.0.2,,,,,\n", dry_run=True)
+    assert result["dry_run"]
+    assert result["updated"] == ["S01"] and result["created"] == ["S02"]
+    assert errors_by_line(result) == {4: "BMC IP 10.0.0.2 与本文件中的 S02 重复"}
+    assert result["message"].startswith("校验通过 2 台")
+    assert db.get_server("S01").description == "keep"
+    assert db.get_server("S02") is None
+    assert db.identity_owners(["bmc_ip:10.0.0.2", "os_ip:10.1.0.2"]) == {}
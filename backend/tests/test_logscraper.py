@@ -0,0 +1,84 @@
+# tests/test_logscraper.py
+# 远程日志增量抓取 (services/logscraper.py)：偏移量推进、半行、rotate 改名、截断、并发抓取互斥
+# DUT 用内存中的假文件系统代替 (find 列表 + SFTP 读取)
+import contextlib
+import io
+import threading
+import time
+import pytest
+from models import ServerSchema
+from services import logscraper
+
+STRESS = "/root/Test_Logs/Reboot/stressapptest.log"
+
+class FakeDUT:
+    def __init__(self):
+        self.files = {}  # path -> [inode, bytes]
+        self.read_delay = 0
+
+    def write(self, path: str, data: bytes, inode: int = None):
+        entry = self.files.setdefault(path, [inode or len(self.files) + 100, b""])
+        entry[1] += data
+
+    def exec_command(self, cmd, timeout=None):
+        listing = "".join(f"{inode} {len(data)} {path}\n" for path, (inode, data) in self.files.items())
+        return None, io.BytesIO(listing.encode()), None
+
+    def open(self, path, mode="rb"):
+        time.sleep(self.read_delay)
+        return io.BytesIO(self.files[path][1])
+
+@pytest.fixture
+def dut(db, monkeypatch):
+    fake = FakeDUT()
+    monkeypatch.setattr(logscraper.ssh_pool, "session", contextlib.contextmanager(lambda *a: (yield fake, fake)))
+    db.upsert_server(ServerSchema(server_id="S01", bmc_ip="10.0.0.1", os_ip="10.1.0.1"))
+    return fake
+
+def scrape(wait: float = 0) -> list:
+    return [e["signature"] for e in logscraper.scrape_and_record(logscraper.db.get_server("S01"), wait)]
+
+def test_only_new_complete_lines_are_parsed(dut, db):
+    dut.write(STRESS, b"ok\nStatus: FAIL\nmiscom")
+    assert scrape() == ["stressapptest FAIL"]
+    assert scrape() == []  # 无新增
+    dut.write(STRESS, b"pare at 0x1\n")
+    assert scrape() == ["stressapptest miscompare"]
+    assert db.get_server("S01").log_error_count == 2
+    assert db.get_scrape_state("S01")["files"][STRESS]["offset"] == len(dut.files[STRESS][1])
+
+def test_rotated_file_is_finished_before_new_one(dut):
+    dut.write(STRESS, b"Status: FAIL\n", inode=7)
+    assert scrape() == ["stressapptest FAIL"]
+    # rotate_log 改名 (inode 不变)，改名前又写入了一行；新文件从头读
+    dut.write(STRESS, b"miscompare 1\n")
+    dut.files[STRESS + ".bak"] = dut.files.pop(STRESS)
+    dut.write(STRESS, b"miscompare 2\n", inode=8)
+    assert scrape() == ["stressapptest miscompare", "stressapptest miscompare"]
+    assert scrape() == []
+
+def test_truncated_file_is_read_from_start(dut):
+    dut.write(STRESS, b"padding line\nStatus: FAIL\n", inode=7)
+    assert scrape() == ["stressapptest FAIL"]
+    dut.files[STRESS] = [7, b"Status: FAIL\n"]
+    assert scrape() == ["stressapptest FAIL"]
+
+def test_concurrent_scrapes_do_not_double_count(dut, db):
+    dut.write(STRESS, b"Status: FAIL\n")
+    dut.read_delay = 0.3
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scrape(wait=5))) for _ in range(2)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert sorted(results) == [[], ["stressapptest FAIL"]]
+    assert db.get_server("S01").log_error_count == 1
+
+def test_busy_scrape_raises_without_wait(dut):
+    lock = logscraper.DistributedLock("scrape:S01")
+    assert lock.acquire()
+    try:
+        with pytest.raises(logscraper.LockBusyError):
+            scrape()
+        assert logscraper._scheduled_scrape(logscraper.db.get_server("S01")) == []
+    finally:
+        lock.release()
@@ -0,0 +1,63 @@
+# tests/test_runs.py
+# 测试运行 (services/runs.py)：生命周期、Webhook 归属、按索引查询
+from models import ServerSchema, WebhookSchema
+from services import runs
+
+def server(db, sid: str = "S01") -> ServerSchema:
+    srv = ServerSchema(server_id=sid, bmc_ip=f"10.0.0.{len(sid)}")
+    db.upsert_server(srv)
+    return srv
+
+def start(db, srv: ServerSchema, test_type: str, ts: float):
+    run = runs.start_run(srv, test_type)
+    run.started_ts = ts  # 固定开始时间，便于按时间范围查询
+    db.save_run(run)
+    return run
+
+def test_new_run_aborts_unfinished_one(db):
+    srv = server(db)
+    first = runs.start_run(srv, "reboot")
+    second = runs.start_run(srv, "reboot")
+    assert srv.active_runs == {"reboot": second.run_id}
+    old = db.get_run(first.run_id)
+    assert (old.status, old.outcome) == ("Aborted", "aborted") and old.ended_ts
+
+def test_finish_outcome_and_idempotence(db):
+    srv = server(db)
+    run = runs.start_run(srv, "memtest")
+    runs.attribute_errors(srv, [{"time": "t", "signature": "memtester FAILURE"}])
+    done = runs.finish_run(srv, "memtest", "Finished")
+    assert (done.status, done.outcome, done.errors) == ("Finished", "fail", 1)
+    assert runs.finish_run(srv, "memtest", "Finished") is None
+    assert db.get_run(run.run_id).ended == done.ended
+
+def test_webhook_updates_and_closes_run(db):
+    srv = server(db)
+    run = runs.start_run(srv, "reboot")
+    report = dict(server_id="S01", task_type="reboot", phase="阶段1: 冷重启 (Cold)")
+    runs.attribute_report(srv, WebhookSchema(status="Running", loop="3", **report))
+    assert (db.get_run(run.run_id).loop, db.get_run(run.run_id).reports) == ("3", 1)
+    runs.attribute_report(srv, WebhookSchema(status="Finished", loop="4", **report))
+    closed = db.get_run(run.run_id)
+    assert (closed.status, closed.outcome, closed.reports) == ("Finished", "pass", 2)
+    assert "reboot" not in srv.active_runs
+    # 其它服务器的 run_id 不归属
+    other = server(db, "S02")
+    runs.attribute_report(other, WebhookSchema(status="Running", loop="9", run_id=run.run_id, **report))
+    assert db.get_run(run.run_id).reports == 2
+
+def test_query_by_index_and_time_range(db):
+    a, b = server(db, "A"), server(db, "B")
+    r1 = start(db, a, "reboot", 100)
+    r2 = start(db, a, "memtest", 200)
+    r3 = start(db, b, "reboot", 300)
+    runs.finish_run(a, "reboot", "Error")
+    ids = lambda items: [r.run_id for r in items]
+    assert ids(runs.query_runs()) == [r3.run_id, r2.run_id, r1.run_id]  # 新的在前
+    assert ids(runs.query_runs(server_id="A")) == [r2.run_id, r1.run_id]
+    assert ids(runs.query_runs(test_type="reboot")) == [r3.run_id, r1.run_id]
+    assert ids(runs.query_runs(server_id="A", test_type="reboot")) == [r1.run_id]
+    assert ids(runs.query_runs(outcome="fail")) == [r1.run_id]
+    assert ids(runs.query_runs(status="Running", limit=1)) == [r3.run_id]
+    assert ids(runs.query_runs(since=150, until=300)) == [r3.run_id, r2.run_id]
+    assert runs.run_id_for(a, "reboot") == r1.run_id  # 已结束：取最近一次同类型运行
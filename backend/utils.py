@@ -1,55 +1,226 @@
 import subprocess
 import platform
 import paramiko
+import threading
+import io
+import uuid
 import time
+import os
+import tempfile
+from contextlib import contextmanager
+from metrics import SSH_PHASE_SECONDS, PING_SECONDS
+from logger import logger
+from config import SSH_PORT, TEMP_SCRIPT_DIR
+import sshkeys
 
 def ping_ip(ip: str) -> bool:
     if not ip or ip.lower() in ["string", "null", "none"]: return False
     param = '-n' if platform.system().lower() == 'windows' else '-c'
     timeout_param = '-w' if platform.system().lower() == 'windows' else '-W'
     timeout_val = '500' if platform.system().lower() == 'windows' else '1'
+    start = time.perf_counter()
     try:
-        return subprocess.call(['ping', param, '1', timeout_param, timeout_val, ip], 
-                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+        alive = subprocess.call(['ping', param, '1', timeout_param, timeout_val, ip], 
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
     except:
-        return False
+        alive = False
+    PING_SECONDS.observe(time.perf_counter() - start, result="up" if alive else "down")
+    return alive
+
+# --- 带耗时统计的 SSH/SFTP 客户端 (connect / exec 下发 / sftp 传输) ---
+class MonitoredSFTPClient(paramiko.SFTPClient):
+    def putfo(self, *args, **kwargs):  # put() 内部也经由 putfo
+        with SSH_PHASE_SECONDS.time(phase="sftp_put"):
+            return super().putfo(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        with SSH_PHASE_SECONDS.time(phase="sftp_get"):
+            return super().get(*args, **kwargs)
+
+class MonitoredSSHClient(paramiko.SSHClient):
+    def connect(self, *args, **kwargs):
+        with SSH_PHASE_SECONDS.time(phase="connect"):
+            return super().connect(*args, **kwargs)
+
+    def exec_command(self, *args, **kwargs):
+        with SSH_PHASE_SECONDS.time(phase="exec_send"):
+            return super().exec_command(*args, **kwargs)
+
+    def open_sftp(self):
+        with SSH_PHASE_SECONDS.time(phase="sftp_open"):
+            return MonitoredSFTPClient.from_transport(self.get_transport())
 
 def get_ssh_client(ip, user, pwd):
-    print(f"   [SSH-Debug] Connecting to {ip} as {user}...") # 调试打印
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(ip, username=user, password=pwd, timeout=10) # 延长超时到10秒
-    print(f"   [SSH-Debug] Connected!") 
+    """优先用后端密钥登录 (见 services/credentials.py 下发)，未部署密钥的主机回退到密码；pwd 为空时只用密钥"""
+    logger.debug(f"[SSH] 连接 {user}@{ip}")
+    ssh = MonitoredSSHClient()
+    ssh.set_missing_host_key_policy(sshkeys.StoreHostKeyPolicy())  # 主机公钥与存储中的记录核对
+    ssh.connect(ip, port=SSH_PORT, username=user, password=pwd or None, pkey=sshkeys.private_key(),
+                look_for_keys=False, allow_agent=False, timeout=10) # 延长超时到10秒
     return ssh
 
+# --- SSH 连接池 (长连接 + 复用 SFTP 会话，供定时任务使用) ---
+class SSHPool:
+    def __init__(self, idle_timeout: int = 300):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = {}  # (ip, user) -> {"ssh", "sftp", "last_used", "lock"}
+
+    def _entry(self, ip, user):
+        with self._lock:
+            return self._entries.setdefault((ip, user), {"ssh": None, "sftp": None, "last_used": 0, "lock": threading.Lock()})
+
+    @staticmethod
+    def _close_entry(entry):
+        for k in ("sftp", "ssh"):
+            try:
+                if entry[k]: entry[k].close()
+            except Exception:
+                pass
+            entry[k] = None
+
+    @contextmanager
+    def session(self, ip, user, pwd):
+        """独占一台主机的连接，返回 (ssh, sftp)；连接断开时自动重连，异常时丢弃连接"""
+        entry = self._entry(ip, user)
+        with entry["lock"]:
+            transport = entry["ssh"].get_transport() if entry["ssh"] else None
+            if not transport or not transport.is_active():
+                self._close_entry(entry)
+                entry["ssh"] = get_ssh_client(ip, user, pwd)
+                entry["sftp"] = entry["ssh"].open_sftp()
+            try:
+                yield entry["ssh"], entry["sftp"]
+            except Exception:
+                self._close_entry(entry)
+                raise
+            finally:
+                entry["last_used"] = time.time()
+
+    def prune(self):
+        """关闭空闲超时的连接"""
+        now = time.time()
+        with self._lock:
+            idle = [k for k, e in self._entries.items() if now - e["last_used"] > self.idle_timeout]
+        for key in idle:
+            entry = self._entries[key]
+            if entry["lock"].acquire(blocking=False):
+                try:
+                    if now - entry["last_used"] > self.idle_timeout: self._close_entry(entry)
+                finally:
+                    entry["lock"].release()
+
+ssh_pool = SSHPool()
+
 def run_ssh_command(ip, user, pwd, command):
-    print(f"--- [SSH-CMD-START] Target: {ip} ---")
-    # 只打印命令的前100个字符，防止刷屏，但也足够确认是否发送了
-    print(f"Command Preview: {command.strip()[:100]}...") 
-    
+    # 只记录命令的前100个字符，防止刷屏，但也足够确认是否发送了 (DEBUG 级别只进内存环形缓冲)
+    logger.debug(f"[SSH] {ip} 执行: {command.strip()[:100]}")
+
     try:
         ssh = get_ssh_client(ip, user, pwd)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        
-        # 实时获取退出状态，判定是否执行完毕
-        exit_status = stdout.channel.recv_exit_status()
+        with SSH_PHASE_SECONDS.time(phase="exec"):
+            stdin, stdout, stderr = ssh.exec_command(command)
+            
+            # 实时获取退出状态，判定是否执行完毕
+            exit_status = stdout.channel.recv_exit_status()
         
         result = stdout.read().decode().strip()
         error = stderr.read().decode().strip()
         
         ssh.close()
         
-        print(f"   [SSH-Debug] Exit Code: {exit_status}")
-        if result: print(f"   [SSH-Debug] STDOUT: {result[:200]}...") # 打印部分输出
-        if error:  print(f"   [SSH-Debug] STDERR: {error}")
-        print(f"--- [SSH-CMD-END] ---")
-        
+        logger.debug(f"[SSH] {ip} 退出码 {exit_status}"
+                     + (f", STDOUT: {result[:200]}" if result else "")
+                     + (f", STDERR: {error[:200]}" if error else ""))
+
         # 只要没有严重的连接错误，我们都返回 True，让上层去判断 stdout 内容
         return True, result if result else (error if error else "Command executed (No output)")
         
     except Exception as e:
-        print(f"!!! [SSH-ERROR] {str(e)}")
+        logger.warning(f"[SSH] {ip} 执行失败: {e}")
         return False, f"SSH Connection Error: {str(e)}"
 
+# --- 批量远程事务：一次 SFTP 上传 + 一次 exec 执行全部步骤，每步退出码结构化返回 ---
+STEP_MARK = "@@STEP"
+
+def build_step_script(steps) -> str:
+    """
+    steps: [(步骤名, 命令, 是否必需)]
+    每步在子 shell 中执行 (cd 等不影响后续步骤)，结束后输出 '@@STEP 步骤名 退出码'；
+    必需步骤失败时以其退出码中止，后续步骤不再执行
+    """
+    lines = []
+    for name, cmd, required in steps:
+        lines.append(f"(\n{cmd}\n) 2>&1 < /dev/null")
+        lines.append(f'rc=$?; echo "{STEP_MARK} {name} $rc"')
+        if required: lines.append('[ $rc -eq 0 ] || exit $rc')
+    lines.append("exit 0")
+    return "\n".join(lines)
+
+def parse_step_output(output: str, steps) -> list:
+    results, buf = [], []
+    for line in output.splitlines():
+        if line.startswith(STEP_MARK + " "):
+            _, name, rc = line.split(" ", 2)
+            results.append({"step": name, "rc": int(rc), "output": "\n".join(buf).strip()})
+            buf = []
+        else:
+            buf.append(line)
+    # 前序必需步骤失败而未执行的步骤，rc 为 None
+    done = {r["step"] for r in results}
+    return results + [{"step": name, "rc": None, "output": ""} for name, _, _ in steps if name not in done]
+
+def run_remote_transaction(ip, user, pwd, steps, uploads: dict = None):
+    """
+    uploads: {文件名: 内容}，先经同一连接的一个 SFTP 会话写入远端暂存目录，步骤中以 "$STAGE/文件名" 引用，
+    脚本退出时自动删除暂存目录。返回 (success, results)：success 表示所有必需步骤成功，
+    results 为 [{"step", "rc", "output"}]
+    """
+    logger.debug(f"[SSH] {ip} 远程事务: {', '.join(name for name, _, _ in steps)}")
+    ssh = None
+    try:
+        ssh = get_ssh_client(ip, user, pwd)
+        header = ""
+        if uploads:
+            stage = f"/tmp/.monitor_stage_{uuid.uuid4().hex[:12]}"
+            sftp = ssh.open_sftp()
+            try:
+                sftp.mkdir(stage, 0o700)
+                for name, content in uploads.items():
+                    sftp.putfo(io.BytesIO(convert_to_unix_format(content).encode()), f"{stage}/{name}")
+            finally:
+                sftp.close()
+            header = f"STAGE='{stage}'\ntrap 'rm -rf \"$STAGE\"' EXIT\n"
+
+        # 脚本经 stdin 交给 bash，不受命令行长度限制，也不依赖登录 shell 类型
+        with SSH_PHASE_SECONDS.time(phase="exec"):
+            stdin, stdout, stderr = ssh.exec_command("bash -s")
+            stdin.write(header + build_step_script(steps) + "\n")
+            stdin.channel.shutdown_write()
+            output = stdout.read().decode(errors="replace")
+            exit_status = stdout.channel.recv_exit_status()
+
+        results = parse_step_output(output, steps)
+        logger.debug(f"[SSH] {ip} 远程事务退出码 {exit_status}: "
+                     + ", ".join(f"{r['step']}={r['rc']}" for r in results))
+        return exit_status == 0, results
+    except Exception as e:
+        logger.warning(f"[SSH] {ip} 远程事务失败: {e}")
+        return False, [{"step": "connect", "rc": None, "output": f"SSH Connection Error: {e}"}]
+    finally:
+        if ssh: ssh.close()
+
+def summarize_steps(success: bool, results: list, ok_message: str) -> str:
+    """成功时返回 ok_message，失败时指出中止事务的步骤 (最后一个非零退出码) 及其最后一行输出"""
+    if success: return ok_message
+    failed = next((r for r in reversed(results) if r["rc"] not in (0, None)), results[0])
+    detail = failed["output"].splitlines()[-1] if failed["output"] else "无输出"
+    return f"步骤 {failed['step']} 失败 (rc={failed['rc']}): {detail}"
+
 def convert_to_unix_format(content: str) -> str:
-    return content.replace('\r\n', '\n')
\ No newline at end of file
+    return content.replace('\r\n', '\n')
+
+def make_temp_script_dir(tag: str) -> str:
+    """在 TEMP_SCRIPT_DIR 下创建本次调用独享的临时目录 (由调用方负责删除)"""
+    os.makedirs(TEMP_SCRIPT_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{tag}-", dir=TEMP_SCRIPT_DIR)
@@ -15,6 +15,10 @@ export default defineConfig({
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,
       },
+      '/ssh': {
+        target: 'http://127.0.0.1:8000',
+        changeOrigin: true,
+      },
       '/report': {
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,